@@ -1,19 +1,39 @@
 """
 Servicio de IA para análisis de inventario usando Google Gemini.
 Lee el inventario desde la base de datos (Supabase).
-Si la API falla, devuelve un consejo por defecto basado en reglas simples.
+Primero se evalúan las reglas de reglas.py sobre estadísticas agregadas; Gemini solo
+se consulta para los estados que las reglas no describen. Si la API falla, se
+devuelve el consejo combinado de las reglas.
 """
 
+import json
 import os
-from typing import TypedDict, List
+from typing import Literal, TypedDict, List, Optional
 from dotenv import load_dotenv
 from pathlib import Path
 
 # --- CORRECCIÓN CLAVE: Usamos la librería estándar instalada ---
 import google.generativeai as genai
 
-from database import get_session
+from sqlalchemy import false, func, select
+from sqlalchemy.exc import InterfaceError, OperationalError
+
+from database import (
+    DEFAULT_STORE,
+    ERRORES_DE_PLAZO,
+    PlazoAgotado,
+    calcular_estadisticas_inventario,
+    get_read_session,
+    leer_estadisticas,
+    segundos_restantes,
+    version_tienda,
+)
 from models import Product
+import metricas
+import reglas
+from single_flight import SingleFlight
+import trazas
+from reglas import UMBRAL_STOCK_BAJO, EstadisticasInventario
 
 load_dotenv(dotenv_path=Path(__file__).resolve().parent / ".env")
 
@@ -24,8 +44,13 @@ MODELOS_GEMINI = [
     "gemini-1.5-flash"
 ]
 
-# Umbral bajo para considerar "poco stock"
-UMBRAL_STOCK_BAJO = 10
+# Resumen de reposición precalculado por forecast.py (python forecast.py ventas.log inventory.csv <ruta>).
+# Con varias tiendas la ruta lleva el marcador {store_id} (p. ej. pronostico-{store_id}.json) y cada
+# tienda lee el suyo; sin el marcador el archivo es el de una sola tienda y solo se usa para DEFAULT_STORE.
+PRONOSTICO_PATH = os.getenv("PRONOSTICO_PATH", "")
+MAX_PRONOSTICO = 10
+
+metricas.registrar("analisis_inventario_total", "Análisis de inventario por fuente (reglas, ia, respaldo)")
 
 class ProductoDict(TypedDict):
     """Representa un producto del inventario como diccionario."""
@@ -33,13 +58,66 @@ class ProductoDict(TypedDict):
     product_name: str
     quantity: int
 
-def _obtener_productos_desde_db() -> List[ProductoDict]:
+class ResultadoAnalisis(TypedDict):
+    """Consejo y qué lo generó: las reglas, el modelo, o las reglas como respaldo del modelo."""
+    consejo: str
+    fuente: Literal["reglas", "ia", "respaldo"]
+    regla: str
+
+# Ruta del resumen -> (mtime, texto para el prompt): se relee solo cuando el archivo cambia
+_pronostico_cache: dict[str, tuple] = {}
+
+# Estadísticas del último análisis por tienda, para las reglas de tendencia
+_estadisticas_previas: dict[str, EstadisticasInventario] = {}
+
+# Varias pestañas del dashboard piden el mismo análisis a la vez: una sola lectura y
+# una sola llamada al modelo por (tienda, versión del catálogo) atienden a todas
+_analisis_en_vuelo = SingleFlight()
+
+def _obtener_estadisticas(store_id: str = DEFAULT_STORE,
+                          min_version: Optional[int] = None) -> EstadisticasInventario:
     """
-    Abre una sesión nueva, consulta la tabla products y devuelve los datos actuales.
+    Estadísticas por bandas de stock desde inventory_stats (O(1); se recalculan solo si la
+    tienda aún no tiene fila) y los primeros nombres en cero y con poco stock (solo si hay).
     """
-    session = get_session()
+    cantidad = func.coalesce(Product.quantity, 0)
+    vivos = (Product.store_id == store_id, Product.deleted == false())
+    session = get_read_session(store_id, min_version)
     try:
-        rows = session.query(Product).order_by(Product.product_id).all()
+        valores = leer_estadisticas(session, store_id) or calcular_estadisticas_inventario(session, store_id)
+        valores.pop("updated_at", None)
+        stats = EstadisticasInventario(**valores)
+        def nombres(condicion):
+            return list(session.scalars(
+                select(Product.name).where(*vivos, condicion).order_by(Product.product_id).limit(reglas.MAX_NOMBRES)
+            ))
+        if stats.en_cero:
+            stats.nombres_cero = nombres(cantidad <= 0)
+        if stats.bajos:
+            stats.nombres_bajos = nombres((cantidad > 0) & (cantidad <= UMBRAL_STOCK_BAJO))
+    finally:
+        session.close()
+    previas = _estadisticas_previas.get(store_id)
+    if previas is not None:
+        stats.unidades_previas = previas.total_unidades
+        stats.en_cero_previos = previas.en_cero
+    return stats
+
+def _obtener_productos_desde_db(store_id: str = DEFAULT_STORE,
+                                min_version: Optional[int] = None) -> List[ProductoDict]:
+    """
+    Abre una sesión nueva (en la réplica de lectura si está al día), consulta los
+    productos de la tienda y devuelve los datos actuales. Si la base no está disponible
+    devuelve []; el plazo agotado y el pool lleno se propagan para responder 503.
+    """
+    session = get_read_session(store_id, min_version)
+    try:
+        rows = (
+            session.query(Product)
+            .filter(Product.store_id == store_id, Product.deleted == false())
+            .order_by(Product.product_id)
+            .all()
+        )
         productos = [
             {
                 "product_id": p.product_id,
@@ -49,7 +127,9 @@ def _obtener_productos_desde_db() -> List[ProductoDict]:
             for p in rows
         ]
         return productos
-    except Exception as e:
+    except ERRORES_DE_PLAZO:
+        raise
+    except (OperationalError, InterfaceError) as e:
         print(f"[DB Error] Al leer productos: {e}")
         return []
     finally:
@@ -59,27 +139,11 @@ def _consejo_por_defecto(productos: List[ProductoDict]) -> str:
     """
     Genera un consejo simple basado en reglas (sin IA) para no romper la app.
     """
-    if not productos:
-        return "No hay productos registrados en la base de datos para analizar."
-
-    en_cero = [p for p in productos if p["quantity"] == 0]
-    bajos = [p for p in productos if 0 < p["quantity"] <= UMBRAL_STOCK_BAJO]
-
-    partes: List[str] = []
-    if en_cero:
-        nombres = ", ".join(p["product_name"] for p in en_cero[:3])
-        if len(en_cero) > 3: nombres += "..."
-        partes.append(f"URGENTE: {nombres} están en cero.")
-    
-    if bajos:
-        nombres = ", ".join(p["product_name"] for p in bajos[:3])
-        partes.append(f"Poco stock: {nombres}.")
-        
-    if not partes:
-        return "El inventario se ve saludable. ¡Buen trabajo manteniendo el stock!"
-
-    return " ".join(partes) + " Revisa tu inventario completo."
+    return reglas.consejo_combinado(
+        reglas.calcular_estadisticas((p["product_name"], p["quantity"]) for p in productos)
+    )
 
+@trazas.trazar("formatear_inventario")
 def _formatear_inventario(productos: List[ProductoDict]) -> str:
     """Formatea la lista de productos para el prompt de Gemini."""
     return "\n".join(
@@ -87,23 +151,44 @@ def _formatear_inventario(productos: List[ProductoDict]) -> str:
         for p in productos
     )
 
-def generar_consejo_inventario() -> str:
+def generar_consejo_inventario(store_id: str = DEFAULT_STORE, min_version: Optional[int] = None) -> str:
+    """
+    Analiza el inventario de la tienda (reglas y, si hace falta, Gemini) y devuelve el consejo.
+    """
+    return analizar_inventario(store_id, min_version)["consejo"]
+
+def analizar_inventario(store_id: str = DEFAULT_STORE, min_version: Optional[int] = None) -> ResultadoAnalisis:
     """
-    Analiza el inventario con Gemini.
+    Evalúa las reglas sobre las estadísticas de la tienda y solo consulta Gemini si
+    ninguna regla describe el estado. Informa qué camino respondió.
+    Las llamadas concurrentes sobre la misma versión del inventario comparten un único análisis.
     """
+    clave = (store_id, version_tienda(store_id, min_version))
+    try:
+        return _analisis_en_vuelo.hacer(clave, _analizar, store_id, min_version, timeout=segundos_restantes())
+    except TimeoutError:
+        raise PlazoAgotado("Plazo agotado esperando el análisis en curso") from None
+
+def _analizar(store_id: str, min_version: Optional[int]) -> ResultadoAnalisis:
+    # 1. Estadísticas agregadas y reglas (microsegundos una vez leídas)
+    stats = _obtener_estadisticas(store_id, min_version)
+    _estadisticas_previas[store_id] = stats
+    with trazas.span("reglas"):
+        regla, consejo = reglas.resolver(stats)
+    if consejo is not None:
+        return _resultado(consejo, "reglas", regla)
+
     api_key = os.getenv("GEMINI_API_KEY")
     if not api_key:
         print("[Error] Falta GEMINI_API_KEY")
-        # Devolvemos fallback, pero necesitamos leer la DB primero para que tenga sentido
-        productos = _obtener_productos_desde_db()
-        return _consejo_por_defecto(productos)
+        return _resultado(reglas.consejo_combinado(stats), "respaldo", regla)
 
-    # 1. Obtener datos frescos
-    productos = _obtener_productos_desde_db()
+    # 2. Obtener datos frescos
+    productos = _obtener_productos_desde_db(store_id, min_version)
     if not productos:
-        return "El inventario está vacío, agrega productos primero."
+        return _resultado(reglas.TEXTO_VACIO, "reglas", "vacio")
 
-    # 2. Preparar Prompt
+    # 3. Preparar Prompt
     texto_inventario = _formatear_inventario(productos)
     prompt = f"""
     Actúa como un experto en logística de tiendas minoristas.
@@ -113,25 +198,70 @@ def generar_consejo_inventario() -> str:
     
     INVENTARIO:
     {texto_inventario}
+    {_contexto_pronostico(store_id)}
     """
 
-    # 3. Configurar IA (Sintaxis de librería Estable)
+    # 4. Configurar IA (Sintaxis de librería Estable)
     genai.configure(api_key=api_key)
 
-    # 4. Intentar generar respuesta
+    # 5. Intentar generar respuesta
     for modelo in MODELOS_GEMINI:
         try:
             print(f"[IA] Intentando con modelo: {modelo}")
-            model_instance = genai.GenerativeModel(modelo)
-            response = model_instance.generate_content(prompt)
-            
-            if response.text:
-                return response.text.strip()
+            with trazas.span("gemini", modelo):
+                model_instance = genai.GenerativeModel(modelo)
+                response = model_instance.generate_content(prompt)
+                texto = response.text
+
+            if texto:
+                return _resultado(texto.strip(), "ia", regla)
                 
         except Exception as e:
             print(f"[IA Error] Falló {modelo}: {e}")
             continue # Intenta el siguiente modelo
 
-    # 5. Si todo falla, usar fallback
+    # 6. Si todo falla, usar fallback
     print("[IA] Todos los modelos fallaron, usando reglas manuales.")
-    return _consejo_por_defecto(productos)
\ No newline at end of file
+    return _resultado(_consejo_por_defecto(productos), "respaldo", regla)
+
+def _ruta_pronostico(store_id: str) -> str:
+    """Resumen de la tienda según PRONOSTICO_PATH ("" si la tienda no tiene uno)."""
+    if not PRONOSTICO_PATH:
+        return ""
+    if "{store_id}" in PRONOSTICO_PATH:
+        # store_id llega de la petición: no se permite que salga del directorio
+        if not store_id.replace("-", "").replace("_", "").isalnum():
+            return ""
+        return PRONOSTICO_PATH.replace("{store_id}", store_id)
+    return PRONOSTICO_PATH if store_id == DEFAULT_STORE else ""
+
+def _contexto_pronostico(store_id: str = DEFAULT_STORE) -> str:
+    """Productos de la tienda que se agotarán antes según forecast.py, como texto para el prompt ("" si no hay resumen)."""
+    ruta = _ruta_pronostico(store_id)
+    if not ruta:
+        return ""
+    try:
+        mtime = os.stat(ruta).st_mtime_ns
+        guardado = _pronostico_cache.get(ruta)
+        if guardado is not None and guardado[0] == mtime:
+            return guardado[1]
+        with open(ruta, encoding="utf-8") as archivo:
+            productos = json.load(archivo).get("products", [])[:MAX_PRONOSTICO]
+        lineas = [
+            f"- {p['product_name']}: {p['days_of_cover']} días de cobertura, "
+            f"vende {p['velocity']}/día, pedir {p['suggested_order']}"
+            for p in productos
+        ]
+    except FileNotFoundError:
+        return ""   # tienda sin resumen
+    except (OSError, ValueError, AttributeError, KeyError, TypeError) as e:
+        # Un resumen mal formado no debe tumbar el análisis: se responde sin pronóstico
+        print(f"[IA] No se pudo leer el pronóstico {ruta}: {e}")
+        return ""
+    texto = "PRONÓSTICO DE REPOSICIÓN (según ventas recientes):\n    " + "\n    ".join(lineas) if lineas else ""
+    _pronostico_cache[ruta] = (mtime, texto)
+    return texto
+
+def _resultado(consejo: str, fuente: str, regla: str) -> ResultadoAnalisis:
+    metricas.incrementar("analisis_inventario_total", fuente=fuente)
+    return {"consejo": consejo, "fuente": fuente, "regla": regla}
@@ -0,0 +1,490 @@
+"""
+Benchmarks de rendimiento del backend de inventario.
+Uso: python benchmark.py <escenario> [<escenario> ...]   (sin argumentos lista los escenarios)
+
+Cada ejecución usa una base SQLite temporal: DB_URL se fija antes de importar
+database.py para no tocar nunca la base configurada en .env.
+"""
+
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+_TMP_DIR = tempfile.mkdtemp(prefix="bench_inventario_")
+os.environ["DB_URL"] = f"sqlite:///{_TMP_DIR}/bench.db"
+
+import database  # noqa: E402  (debe importarse después de fijar DB_URL)
+
+ESCENARIOS = {}
+
+
+def escenario(func):
+    """Registra una función como escenario ejecutable desde la línea de comandos."""
+    ESCENARIOS[func.__name__] = func
+    return func
+
+
+def _sembrar(cantidad_productos: int, stock: int):
+    """Vacía la tabla products y crea cantidad_productos filas con el stock indicado."""
+    session = database.get_session()
+    try:
+        session.query(database.Product).delete()
+        session.add_all(
+            database.Product(product_id=f"P{i:03d}", name=f"Producto {i}", quantity=stock)
+            for i in range(1, cantidad_productos + 1)
+        )
+        session.commit()
+        return [p.id for p in session.query(database.Product).order_by(database.Product.id)]
+    finally:
+        session.close()
+
+
+def _en_hilos(hilos: int, trabajo):
+    """Ejecuta trabajo(indice_hilo) en paralelo y devuelve los segundos transcurridos."""
+    workers = [threading.Thread(target=trabajo, args=(i,)) for i in range(hilos)]
+    inicio = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return time.perf_counter() - inicio
+
+
+@escenario
+def pos(hilos: int = 64, ventas_por_hilo: int = 50, productos: int = 5):
+    """Ráfaga sintética del punto de venta: muchos decrementos de 1 sobre pocos productos."""
+    from write_buffer import StockWriteBuffer
+
+    total = hilos * ventas_por_hilo
+
+    def rafaga(ajustar):
+        ids = _sembrar(productos, stock=total)
+        errores = []
+
+        def trabajo(semilla):
+            rnd = random.Random(semilla)
+            for _ in range(ventas_por_hilo):
+                try:
+                    ajustar(rnd.choice(ids), -1)
+                except Exception as e:
+                    errores.append(e)
+
+        segundos = _en_hilos(hilos, trabajo)
+        session = database.get_session()
+        try:
+            restante = sum(p.quantity for p in session.query(database.Product))
+        finally:
+            session.close()
+        assert restante == productos * total - (total - len(errores)), "stock inconsistente"
+        return segundos, len(errores)
+
+    def directo(id_interno, delta):
+        session = database.get_session()
+        try:
+            database.adjust_stock(session, id_interno, delta)
+        finally:
+            session.close()
+
+    seg_directo, err_directo = rafaga(directo)
+    buffer = StockWriteBuffer(ventana_ms=20, max_ops=256)
+    try:
+        seg_buffer, err_buffer = rafaga(buffer.ajustar)
+    finally:
+        buffer.cerrar()
+
+    print(f"{total} ajustes, {hilos} hilos, {productos} productos")
+    print(f"  directo : {total / seg_directo:10.0f} ajustes/s  ({err_directo} errores)")
+    print(f"  buffer  : {total / seg_buffer:10.0f} ajustes/s  ({err_buffer} errores)")
+    print(f"  mejora  : x{seg_directo / seg_buffer:.1f}")
+
+
+@escenario
+def sqlite(hilos: int = 8, operaciones_por_hilo: int = 500, productos: int = 1000):
+    """Lecturas y escrituras por segundo: SQLite por defecto vs perfil ajustado de database.py."""
+    from sqlalchemy import bindparam, select, update
+    from contextlib import nullcontext
+
+    tabla = database.Product.__table__
+    leer = select(tabla.c.quantity).where(tabla.c.id == bindparam("b_id"))
+    escribir = update(tabla).where(tabla.c.id == bindparam("b_id")).values(quantity=tabla.c.quantity + 1)
+
+    def medir(nombre, motor, serializar):
+        database.Base.metadata.create_all(bind=motor)
+        with motor.begin() as conn:
+            conn.execute(tabla.delete())
+            conn.execute(tabla.insert(), [
+                {"id": i, "product_id": f"P{i:05d}", "name": f"Producto {i}", "quantity": 0}
+                for i in range(1, productos + 1)
+            ])
+        errores = []
+
+        def lecturas(semilla):
+            rnd = random.Random(semilla)
+            with motor.connect() as conn:
+                for _ in range(operaciones_por_hilo):
+                    conn.execute(leer, {"b_id": rnd.randint(1, productos)}).scalar()
+                conn.rollback()
+
+        def escrituras(semilla):
+            rnd = random.Random(semilla)
+            for _ in range(operaciones_por_hilo):
+                try:
+                    with database.escritor() if serializar else nullcontext():
+                        with motor.connect() as conn:
+                            if serializar:
+                                conn.exec_driver_sql("BEGIN IMMEDIATE")
+                            conn.execute(escribir, {"b_id": rnd.randint(1, productos)})
+                            conn.commit()
+                except Exception as e:
+                    errores.append(e)
+
+        total = hilos * operaciones_por_hilo
+        seg_lect = _en_hilos(hilos, lecturas)
+        seg_escr = _en_hilos(hilos, escrituras)
+        print(f"  {nombre:9}: {total / seg_lect:9.0f} lecturas/s  {total / seg_escr:8.0f} escrituras/s"
+              f"  ({len(errores)} 'database is locked')")
+        motor.dispose()
+
+    print(f"{hilos} hilos x {operaciones_por_hilo} operaciones, {productos} productos")
+    medir("defecto", database.crear_engine(f"sqlite:///{_TMP_DIR}/defecto.db", perfil_sqlite=False), False)
+    medir("ajustado", database.crear_engine(f"sqlite:///{_TMP_DIR}/ajustado.db", perfil_sqlite=True), True)
+
+
+@escenario
+def exportar(filas: int = 200_000):
+    """Tiempo al primer byte, total y memoria pico de exportador.exportar_csv con filas productos."""
+    import tracemalloc
+    import exportador
+
+    session = database.get_session()
+    try:
+        session.query(database.Product).delete()
+        session.commit()
+        for inicio in range(0, filas, 10_000):
+            database.upsert_products(session, [
+                (f"P{i:07d}", f"Producto {i}", i % 100) for i in range(inicio, min(inicio + 10_000, filas))
+            ])
+    finally:
+        session.close()
+
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    generador = exportador.exportar_csv()
+    total = len(next(generador))
+    primer_byte = time.perf_counter() - inicio
+    for bloque in generador:
+        total += len(bloque)
+    segundos = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{filas} filas, {total / 1e6:.1f} MB de CSV")
+    print(f"  primer byte: {primer_byte * 1000:.1f} ms   total: {segundos:.2f} s   memoria pico: {pico / 1e6:.1f} MB")
+
+
+@escenario
+def tiendas(productos_por_tienda: int = 100, consultas: int = 2000):
+    """Costo de listar/buscar en una tienda con 10 vs 1000 tiendas en la misma tabla."""
+    from sqlalchemy import text
+    from models import Product
+
+    def medir(cantidad_tiendas):
+        session = database.get_session()
+        try:
+            session.query(database.Product).delete()
+            session.commit()
+            for t in range(cantidad_tiendas):
+                database.upsert_products(session, [
+                    (f"P{i:03d}", f"Producto {i}", i) for i in range(1, productos_por_tienda + 1)
+                ], store_id=f"tienda{t}")
+            rnd = random.Random(cantidad_tiendas)
+            inicio = time.perf_counter()
+            for _ in range(consultas):
+                tienda = f"tienda{rnd.randrange(cantidad_tiendas)}"
+                session.query(Product).filter(Product.store_id == tienda).order_by(Product.id).all()
+            seg_listar = time.perf_counter() - inicio
+            inicio = time.perf_counter()
+            for _ in range(consultas):
+                tienda = f"tienda{rnd.randrange(cantidad_tiendas)}"
+                session.query(Product).filter(
+                    Product.store_id == tienda, Product.product_id == "P050"
+                ).first()
+            seg_buscar = time.perf_counter() - inicio
+            plan = session.execute(text(
+                "EXPLAIN QUERY PLAN SELECT * FROM products WHERE store_id = 'tienda1' ORDER BY id"
+            )).all()
+        finally:
+            session.close()
+        print(f"  {cantidad_tiendas:5} tiendas ({cantidad_tiendas * productos_por_tienda:7} filas): "
+              f"listar {seg_listar / consultas * 1000:.2f} ms   buscar {seg_buscar / consultas * 1000:.3f} ms")
+        return plan
+
+    print(f"{productos_por_tienda} productos por tienda, {consultas} consultas por medición")
+    medir(10)
+    plan = medir(1000)
+    print("  plan:", "; ".join(fila[-1] for fila in plan))
+
+
+@escenario
+def campos(filas: int = 50_000, repeticiones: int = 5):
+    """Tamaño y latencia de /productos completo vs ?fields= vs ?ids= (multi-get)."""
+    from fastapi.testclient import TestClient
+    import server
+
+    session = database.get_session()
+    try:
+        session.query(database.Product).delete()
+        session.commit()
+        database.upsert_products(session, [(f"P{i:06d}", f"Producto {i}", i % 100) for i in range(filas)])
+    finally:
+        session.close()
+
+    cliente = TestClient(server.app)
+    ids = ",".join(f"P{i:06d}" for i in range(0, filas, filas // 10))
+    for nombre, url in [
+        ("completo", "/productos"),
+        ("fields", "/productos?fields=product_id,quantity"),
+        ("ids", f"/productos?fields=product_id,quantity&ids={ids}"),
+    ]:
+        inicio = time.perf_counter()
+        for _ in range(repeticiones):
+            respuesta = cliente.get(url)
+        ms = (time.perf_counter() - inicio) / repeticiones * 1000
+        print(f"  {nombre:9}: {len(respuesta.content) / 1024:9.1f} KB  {ms:8.1f} ms")
+
+
+@escenario
+def sentencias(operaciones: int = 2000, productos: int = 50):
+    """CPU por operación: Query ORM construido en cada llamada vs sentencias precompiladas."""
+    from sqlalchemy import false
+    from server import _consulta_listado
+
+    Product = database.Product
+    tienda = database.DEFAULT_STORE
+
+    # Implementaciones anteriores (un Query ORM nuevo en cada llamada), como referencia
+    def update_orm(session, id_interno, quantity):
+        product = session.query(Product).filter(
+            Product.store_id == tienda, Product.id == id_interno, Product.deleted == false()
+        ).first()
+        product.quantity = quantity
+        product.version = database.siguiente_version(session, tienda)
+        session.commit()
+        session.refresh(product)
+
+    def delete_orm(session, id_interno):
+        product = session.query(Product).filter(
+            Product.store_id == tienda, Product.id == id_interno, Product.deleted == false()
+        ).first()
+        product.deleted = True
+        product.version = database.siguiente_version(session, tienda)
+        session.commit()
+
+    def listar_orm(session):
+        rows = session.query(Product).filter(
+            Product.store_id == tienda, Product.deleted == false()
+        ).order_by(Product.id).all()
+        return [(p.id, p.product_id, p.name, p.quantity) for p in rows]
+
+    campos = ("id", "product_id", "name", "quantity")
+
+    def listar_compilado(session):
+        return session.execute(_consulta_listado(campos, False), {"b_store": tienda}).all()
+
+    def cpu_por_op(trabajo):
+        session = database.get_session()
+        try:
+            inicio = time.process_time()
+            for i in range(operaciones):
+                trabajo(session, i)
+            return (time.process_time() - inicio) / operaciones * 1e6
+        finally:
+            session.close()
+
+    print(f"{operaciones} operaciones por caso (µs de CPU por operación)")
+    casos = [
+        ("update", lambda s, i: update_orm(s, ids[i % productos], i),
+                   lambda s, i: database.update_product(s, ids[i % productos], quantity=i)),
+        ("delete", lambda s, i: delete_orm(s, ids[i]),
+                   lambda s, i: database.delete_product(s, ids[i])),
+        ("listar", lambda s, i: listar_orm(s), lambda s, i: listar_compilado(s)),
+    ]
+    for nombre, antes, despues in casos:
+        filas = operaciones if nombre == "delete" else productos
+        ids = _sembrar(filas, stock=0)
+        cpu_antes = cpu_por_op(antes)
+        ids = _sembrar(filas, stock=0)
+        cpu_despues = cpu_por_op(despues)
+        print(f"  {nombre:7}: ORM {cpu_antes:8.0f} µs   precompilada {cpu_despues:8.0f} µs"
+              f"   (-{(1 - cpu_despues / cpu_antes) * 100:.0f}%)")
+
+
+def _medir_inventario(fabrica, n: int, consultas: int, resultado):
+    """Construye fabrica() con n SKUs y envía (bytes, segundos de carga, ns por búsqueda)."""
+    try:
+        import resource
+    except ImportError:  # Windows: sin resource, se mide con tracemalloc (más lento)
+        resource = None
+    import tracemalloc
+
+    def rss_pico():
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    claves = [f"P{random.randrange(n):08d}" for _ in range(consultas)]
+    if resource is None:
+        tracemalloc.start()
+    base = rss_pico() if resource else 0
+    inicio = time.perf_counter()
+    contenedor = fabrica()
+    for i in range(n):
+        contenedor[f"P{i:08d}"] = [f"Producto {i}", i % 500]
+    segundos = time.perf_counter() - inicio
+    memoria = rss_pico() - base if resource else tracemalloc.get_traced_memory()[0]
+    inicio = time.perf_counter()
+    for clave in claves:
+        contenedor[clave]
+    resultado.put((memoria, segundos, (time.perf_counter() - inicio) / consultas * 1e9))
+
+
+@escenario
+def inventario(skus: str = os.getenv("BENCH_SKUS", "1000000,10000000"), consultas: int = 1_000_000):
+    """Memoria y búsquedas de core.Inventory vs dict de listas con 1M y 10M SKUs (BENCH_SKUS)."""
+    import multiprocessing
+    from core import Inventory
+
+    # Cada medición en un proceso propio: la memoria de una no contamina a la otra
+    contexto = multiprocessing.get_context("fork" if hasattr(os, "fork") else "spawn")
+    for n in (int(x) for x in skus.split(",")):
+        print(f"{n:,} SKUs")
+        for nombre, fabrica in (("dict", dict), ("Inventory", Inventory)):
+            cola = contexto.Queue()
+            proceso = contexto.Process(target=_medir_inventario, args=(fabrica, n, consultas, cola))
+            proceso.start()
+            memoria, segundos, busqueda = cola.get()
+            proceso.join()
+            print(f"  {nombre:9}: {memoria / 2**20:8.0f} MB  {memoria / n:5.0f} B/SKU"
+                  f"   carga {segundos:6.1f} s   búsqueda {busqueda:5.0f} ns")
+
+
+def _cargar_con_dictreader(ruta):
+    """load_inventory anterior (csv.DictReader), como referencia."""
+    import csv
+    from core import Inventory
+
+    inventario = Inventory()
+    with open(ruta, newline="", encoding="utf-8") as archivo:
+        for fila in csv.DictReader(archivo):
+            product_id = fila.get("product_id", "").strip()
+            if not product_id:
+                continue
+            try:
+                cantidad = int(fila.get("quantity", 0))
+            except (ValueError, TypeError):
+                cantidad = 0
+            inventario[product_id] = [fila.get("product_name", "").strip(), cantidad]
+    return inventario
+
+
+@escenario
+def carga_csv(filas: int = int(os.getenv("BENCH_FILAS", "5000000"))):
+    """core.load_inventory: DictReader vs lector posicional vs procesos en paralelo (BENCH_FILAS)."""
+    import csv
+    import hashlib
+    from core import load_inventory
+
+    ruta = os.path.join(_TMP_DIR, "inventory.csv")
+    with open(ruta, "w", newline="", encoding="utf-8") as archivo:
+        escritor = csv.writer(archivo)
+        escritor.writerow(("product_id", "product_name", "quantity"))
+        for i in range(filas):
+            # Algunas filas sin id y cantidades inválidas para ejercitar las reglas de carga
+            product_id = "" if i % 1000 == 999 else f"P{i:08d}"
+            cantidad = "n/a" if i % 997 == 0 else i % 500
+            escritor.writerow((product_id, f" Producto {i}, talla {i % 7} ", cantidad))
+    print(f"{filas:,} filas, {os.path.getsize(ruta) / 2**20:.0f} MB, {os.cpu_count()} CPU")
+
+    procesos = max(os.cpu_count() or 1, 4)
+    referencia = None
+    for nombre, cargar in (("DictReader", _cargar_con_dictreader),
+                           ("posicional", lambda r: load_inventory(r, workers=1)),
+                           (f"{procesos} procesos", lambda r: load_inventory(r, workers=procesos))):
+        inicio = time.perf_counter()
+        inventario = cargar(ruta)
+        segundos = time.perf_counter() - inicio
+        # Huella de las filas en orden: compararlas en listas no entra en memoria con 5M filas
+        huella = hashlib.blake2b()
+        for fila in inventario.rows():
+            huella.update(repr(fila).encode())
+        del inventario
+        iguales = referencia is None or huella.digest() == referencia
+        referencia = referencia or huella.digest()
+        print(f"  {nombre:12}: {segundos:6.1f} s   {filas / segundos / 1e6:5.2f} M filas/s"
+              f"   {'idéntico' if iguales else 'DISTINTO'}")
+
+
+@escenario
+def arranque(filas: int = int(os.getenv("BENCH_FILAS", "5000000")), consultas: int = 10_000):
+    """Arranque de la app local: parsear inventory.csv vs mapear el snapshot binario (BENCH_FILAS)."""
+    from core import load_inventory, save_inventory, Inventory
+    from snapshot import build_snapshot, open_snapshot
+
+    ruta = os.path.join(_TMP_DIR, "arranque.csv")
+    inventario = Inventory()
+    for i in range(filas):
+        inventario[f"P{i:08d}"] = [f"Producto {i}", i % 500]
+    save_inventory(ruta, inventario)
+    del inventario
+    inicio = time.perf_counter()
+    build_snapshot(ruta)
+    print(f"{filas:,} filas; snapshot de {os.path.getsize(ruta + '.snap') / 2**20:.0f} MB "
+          f"construido en {time.perf_counter() - inicio:.1f} s (en segundo plano en la app)")
+    claves = [f"P{random.randrange(filas):08d}" for _ in range(consultas)]
+
+    inicio = time.perf_counter()
+    csv_cargado = load_inventory(ruta)
+    print(f"  CSV     : listo en {(time.perf_counter() - inicio) * 1000:9.1f} ms")
+    del csv_cargado
+    inicio = time.perf_counter()
+    snapshot = open_snapshot(ruta)
+    listo = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    for clave in claves:
+        snapshot[clave]
+    busqueda = (time.perf_counter() - inicio) / consultas * 1e6
+    print(f"  snapshot: listo en {listo * 1000:9.1f} ms   búsqueda {busqueda:.1f} µs")
+    snapshot.close()
+
+
+@escenario
+def pronostico(skus: int = int(os.getenv("BENCH_SKUS_PRONOSTICO", "1000000")), dias: int = 365):
+    """forecast.forecast sobre una matriz densa de ventas diarias de skus x días (BENCH_SKUS_PRONOSTICO)."""
+    import numpy as np
+    import forecast
+
+    generador = np.random.default_rng(0)
+    diarias = np.empty((skus, dias), dtype=np.int32)
+    for inicio in range(0, skus, 100_000):
+        diarias[inicio:inicio + 100_000] = generador.poisson(0.8, size=(min(100_000, skus - inicio), dias))
+    stock = generador.integers(0, 200, skus)
+    inicio = time.perf_counter()
+    resultado = forecast.forecast(diarias, stock)
+    segundos = time.perf_counter() - inicio
+    a_pedir = int((resultado.suggested_order > 0).sum())
+    print(f"{skus:,} SKUs x {dias} días ({diarias.nbytes / 2**20:.0f} MB): {segundos:.2f} s, "
+          f"{a_pedir:,} SKUs bajo el punto de pedido")
+
+
+def main(argv):
+    if not argv:
+        for nombre, func in ESCENARIOS.items():
+            print(f"{nombre:12} {func.__doc__}")
+        return
+    for nombre in argv:
+        print(f"== {nombre} ==")
+        ESCENARIOS[nombre]()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
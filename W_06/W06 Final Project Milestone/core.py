@@ -1,38 +1,292 @@
 """Business logic - inventory and CSV handling."""
 
 import csv
+import heapq
+import io
+import multiprocessing
+import os
+import sys
+from array import array
+from collections import Counter, deque, namedtuple
+from collections.abc import MutableMapping
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date
+from operator import itemgetter
 
 HEADERS = ("product_id", "product_name", "quantity")
 
 
-def load_inventory(filename):
+class Inventory(MutableMapping):
     """
-    Read a CSV file and return a dictionary where the key is product_id
+    Compact mapping of product_id -> [product_name, quantity] for large catalogs.
+
+    Quantities live in one array('q'), names are UTF-8 bytes in one shared
+    bytearray (offset and length per row) and a dict maps each product_id to its
+    row number. Reading an item builds a fresh [name, quantity] list, so changing
+    the returned list does not change the inventory; assign it back instead, as
+    update_stock does. Rows freed by deletions are reused by new products. The ids
+    of products with quantity 0 are kept in a set, updated on every write.
+    """
+
+    __slots__ = ("_index", "_qty", "_name_start", "_name_len", "_names", "_free", "_garbage", "_zero")
+
+    # Rewrite the names buffer once at least this many bytes and half of it are unused
+    COMPACT_MIN_GARBAGE = 1 << 20
+
+    def __init__(self, items=None):
+        self._index = {}
+        self._qty = array("q")
+        self._name_start = array("q")
+        self._name_len = array("I")
+        self._names = bytearray()
+        self._free = []
+        self._garbage = 0
+        self._zero = set()
+        if items:
+            self.update(items)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __contains__(self, product_id):
+        return product_id in self._index
+
+    def __getitem__(self, product_id):
+        row = self._index[product_id]
+        start = self._name_start[row]
+        return [self._names[start:start + self._name_len[row]].decode("utf-8"), self._qty[row]]
+
+    def __setitem__(self, product_id, value):
+        name, quantity = value
+        if quantity == 0:
+            self._zero.add(product_id)
+        else:
+            self._zero.discard(product_id)
+        row = self._index.get(product_id)
+        if row is None:
+            encoded = name.encode("utf-8")
+            start = len(self._names)
+            self._names += encoded
+            if self._free:
+                row = self._free.pop()
+                self._qty[row] = quantity
+                self._name_start[row] = start
+                self._name_len[row] = len(encoded)
+            else:
+                row = len(self._qty)
+                self._qty.append(quantity)
+                self._name_start.append(start)
+                self._name_len.append(len(encoded))
+            self._index[product_id] = row
+            return
+        self._qty[row] = quantity
+        if name != self._name(row):
+            self._set_name(row, name)
+
+    def __delitem__(self, product_id):
+        row = self._index.pop(product_id)
+        self._zero.discard(product_id)
+        self._garbage += self._name_len[row]
+        self._name_len[row] = 0
+        self._free.append(row)
+        self._maybe_compact()
+
+    def __repr__(self):
+        return f"Inventory({len(self)} products)"
+
+    def _name(self, row):
+        start = self._name_start[row]
+        return self._names[start:start + self._name_len[row]].decode("utf-8")
+
+    def _set_name(self, row, name):
+        encoded = name.encode("utf-8")
+        self._garbage += self._name_len[row]
+        self._name_start[row] = len(self._names)
+        self._name_len[row] = len(encoded)
+        self._names += encoded
+        self._maybe_compact()
+
+    def _maybe_compact(self):
+        if self._garbage >= self.COMPACT_MIN_GARBAGE and self._garbage * 2 >= len(self._names):
+            self.compact()
+
+    def compact(self):
+        """Rewrite the names buffer keeping only the names of current products."""
+        names = bytearray()
+        for row in self._index.values():
+            start = self._name_start[row]
+            self._name_start[row] = len(names)
+            names += self._names[start:start + self._name_len[row]]
+        self._names = names
+        self._garbage = 0
+
+    def _absorb(self, other):
+        """Add every row of other after this inventory's rows (used to merge loaded chunks)."""
+        if self._free or other._free or not self._index.keys().isdisjoint(other._index):
+            for product_id, name, quantity in other.rows():
+                self[product_id] = [name, quantity]
+            return
+        base_row = len(self._qty)
+        base_name = len(self._names)
+        self._qty += other._qty
+        self._name_len += other._name_len
+        self._name_start.extend([start + base_name for start in other._name_start])
+        self._names += other._names
+        self._garbage += other._garbage
+        self._zero |= other._zero
+        self._index.update({product_id: row + base_row for product_id, row in other._index.items()})
+
+    def quantity(self, product_id):
+        """Quantity of product_id without building the [name, quantity] list."""
+        return self._qty[self._index[product_id]]
+
+    def name(self, product_id):
+        """Name of product_id."""
+        return self._name(self._index[product_id])
+
+    def set_quantity(self, product_id, quantity):
+        """Set the quantity of an existing product (KeyError if it does not exist)."""
+        self._qty[self._index[product_id]] = quantity
+        if quantity == 0:
+            self._zero.add(product_id)
+        else:
+            self._zero.discard(product_id)
+
+    def zero_stock(self):
+        """Set of product_ids with quantity 0. It is the live index: do not modify it."""
+        return self._zero
+
+    def rows(self):
+        """Yield (product_id, product_name, quantity) tuples in insertion order."""
+        qty = self._qty
+        for product_id, row in self._index.items():
+            yield product_id, self._name(row), qty[row]
+
+    def nbytes(self):
+        """Approximate bytes held by the storage arrays, names buffer and index (not the id strings)."""
+        return (sys.getsizeof(self._index) + self._qty.itemsize * len(self._qty)
+                + self._name_start.itemsize * len(self._name_start)
+                + self._name_len.itemsize * len(self._name_len) + len(self._names))
+
+
+def load_inventory(filename, workers=None):
+    """
+    Read a CSV file and return an Inventory where the key is product_id
     and the value is a list [product_name, quantity] with quantity as integer.
 
+    Rows are read positionally (the header is mapped to column numbers once).
+    Files of at least LOAD_PARALLEL_MIN_BYTES are split into chunks on line
+    boundaries and parsed by worker processes, then merged in file order, so the
+    result is the same as a sequential read.
+
     Args:
         filename: Path to the CSV file.
+        workers: Number of worker processes (default: os.cpu_count()). 1 reads sequentially.
 
     Returns:
-        Dictionary mapping product_id to [product_name, quantity].
-        Returns empty dict if file is empty or on read error.
+        Inventory mapping product_id to [product_name, quantity].
+        Returns an empty Inventory if file is empty or on read error.
     """
-    inventory = {}
     try:
         with open(filename, newline="", encoding="utf-8") as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                product_id = row.get("product_id", "").strip()
-                if not product_id:
-                    continue
-                name = row.get("product_name", "").strip()
-                try:
-                    qty = int(row.get("quantity", 0))
-                except (ValueError, TypeError):
-                    qty = 0
-                inventory[product_id] = [name, qty]
+            reader = csv.reader(csvfile)
+            columns = _header_columns(next(reader, None))
+            if columns is None:
+                return Inventory()
+            workers = workers or os.cpu_count() or 1
+            if workers > 1 and os.fstat(csvfile.fileno()).st_size >= LOAD_PARALLEL_MIN_BYTES:
+                inventory = _load_parallel(filename, columns, workers)
+                if inventory is not None:
+                    return inventory
+            inventory = Inventory()
+            _parse_rows(reader, columns, inventory)
     except (FileNotFoundError, OSError):
-        return {}
+        return Inventory()
+    return inventory
+
+
+# Below this many bytes of rows a sequential read beats starting worker processes
+LOAD_PARALLEL_MIN_BYTES = 64 << 20
+
+
+def _header_columns(fields):
+    """Column numbers of product_id, product_name and quantity, or None without a header row."""
+    if fields is None:
+        return None
+    # Like DictReader, a repeated column name refers to its last occurrence
+    position = {field: i for i, field in enumerate(fields)}
+    # A missing column reads as empty: sys.maxsize is never a valid row index
+    return tuple(position.get(field, sys.maxsize) for field in HEADERS)
+
+
+def _parse_rows(rows, columns, inventory):
+    """Add parsed csv rows to inventory, skipping rows without product_id; bad quantities read as 0."""
+    id_col, name_col, qty_col = columns
+    for row in rows:
+        try:
+            product_id = row[id_col].strip()
+        except IndexError:
+            continue
+        if not product_id:
+            continue
+        try:
+            name = row[name_col].strip()
+        except IndexError:
+            name = ""
+        try:
+            qty = int(row[qty_col])
+        except (ValueError, IndexError):
+            qty = 0
+        inventory[product_id] = [name, qty]
+
+
+def _load_chunk(filename, start, end, columns):
+    """Parse bytes [start, end) of filename; returns the chunk's Inventory and its quote count."""
+    with open(filename, "rb") as csvfile:
+        csvfile.seek(start)
+        data = csvfile.read(end - start)
+    inventory = Inventory()
+    _parse_rows(csv.reader(io.StringIO(data.decode("utf-8"), newline="")), columns, inventory)
+    return inventory, data.count(b'"')
+
+
+def _load_parallel(filename, columns, workers):
+    """Parse the rows in worker processes; None if a quoted field spans a chunk boundary or the workers fail."""
+    with open(filename, "rb") as csvfile:
+        header = csvfile.readline()
+        # Chunks start after a "\n" header: a quote or a bare "\r" could make the header longer
+        if b'"' in header or b"\r" in header.rstrip(b"\r\n"):
+            return None
+        data_start = csvfile.tell()
+        size = os.fstat(csvfile.fileno()).st_size
+        chunk = -(-(size - data_start) // workers)
+        bounds = [data_start]
+        while bounds[-1] < size:
+            csvfile.seek(min(bounds[-1] + chunk, size))
+            # Move to the end of the current line (a "\n" byte never sits inside a UTF-8 character)
+            csvfile.readline()
+            bounds.append(min(csvfile.tell(), size))
+    # spawn, not fork: callers include background threads (journal compaction), and forking a
+    # multi-threaded process can copy locks held by other threads into the children
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            parts = list(pool.map(_load_chunk, [filename] * (len(bounds) - 1), bounds[:-1], bounds[1:],
+                                  [columns] * (len(bounds) - 1)))
+    except BrokenProcessPool:
+        # A spawned worker could not start (e.g. __main__ cannot be re-imported): read sequentially
+        return None
+    quotes = 0
+    for _, count in parts[:-1]:
+        quotes += count
+        if quotes % 2:
+            return None
+    inventory, _ = parts[0]
+    for part, _ in parts[1:]:
+        inventory._absorb(part)
     return inventory
 
 
@@ -58,6 +312,125 @@ def update_stock(inventory_dict, product_id, change_amount):
     inventory_dict[product_id] = [name, new_qty]
 
 
+class BatchResult(namedtuple("BatchResult", ["applied", "errors", "changed", "lines"])):
+    """
+    Outcome of apply_batch.
+
+    applied: True if every change was applied, False if none was.
+    errors: Dict mapping a line number (0-based, in input order) to its error message;
+        lines not in it are valid.
+    changed: Dict mapping each product_id whose quantity changed to its new quantity
+        (empty if not applied).
+    lines: Number of lines in the batch.
+
+    status(line) and statuses() give the outcome of every line, including the valid
+    lines of a rejected batch, without storing anything per line.
+    """
+
+    __slots__ = ()
+
+    APPLIED = "Applied"
+    NOT_APPLIED = "Not applied: another line of the batch failed"
+
+    def status(self, line):
+        """Outcome of one line (0-based): APPLIED, its error message, or NOT_APPLIED."""
+        if not 0 <= line < self.lines:
+            raise IndexError(f"Line {line} is not in a batch of {self.lines} lines")
+        if self.applied:
+            return self.APPLIED
+        return self.errors.get(line, self.NOT_APPLIED)
+
+    def statuses(self):
+        """List with the status of every line, in input order."""
+        return [self.status(line) for line in range(self.lines)]
+
+
+def apply_batch(inventory_dict, changes):
+    """
+    Apply a batch of stock changes atomically: all of them or none.
+
+    Changes to the same product are added up and validated once against its current
+    stock, so a delivery note and an order for the same product in one batch only
+    fail if the net result is negative. Runs in one pass over the lines plus one
+    per product.
+
+    Args:
+        inventory_dict: Dictionary mapping product_id to [product_name, quantity].
+        changes: Iterable of (product_id, change_amount) pairs; change_amount may be a
+            numeric string, as read from a CSV.
+
+    Returns:
+        BatchResult with the errors by line, the new quantities, and a status for
+        every line (BatchResult.status / statuses).
+    """
+    errors = {}
+    line_ids = []
+    totals = {}
+    for line, (product_id, change_amount) in enumerate(changes):
+        line_ids.append(product_id)
+        try:
+            change_amount = int(change_amount)
+        except (ValueError, TypeError):
+            errors[line] = f"Invalid change: {change_amount!r}"
+            continue
+        totals[product_id] = totals.get(product_id, 0) + change_amount
+
+    failed = {}
+    updates = {}
+    for product_id, total in totals.items():
+        if product_id not in inventory_dict:
+            failed[product_id] = f"Product not found: {product_id}"
+            continue
+        name, current_qty = inventory_dict[product_id]
+        if current_qty + total < 0:
+            failed[product_id] = "Insufficient stock"
+        elif total:
+            updates[product_id] = (name, current_qty + total)
+    if failed:
+        for line, product_id in enumerate(line_ids):
+            if line not in errors and product_id in failed:
+                errors[line] = failed[product_id]
+    if errors:
+        return BatchResult(False, errors, {}, len(line_ids))
+
+    set_quantity = getattr(inventory_dict, "set_quantity", None)
+    changed = {}
+    for product_id, (name, new_qty) in updates.items():
+        if set_quantity is not None:
+            set_quantity(product_id, new_qty)
+        else:
+            inventory_dict[product_id] = [name, new_qty]
+        changed[product_id] = new_qty
+    return BatchResult(True, {}, changed, len(line_ids))
+
+
+def load_delivery_note(filename):
+    """
+    Read a delivery note CSV with product_id and quantity columns (extra columns are ignored).
+
+    Args:
+        filename: Path to the CSV file.
+
+    Returns:
+        List of (product_id, quantity) pairs in file order, with quantity as read
+        (apply_batch validates it). Rows without product_id are skipped.
+    """
+    with open(filename, newline="", encoding="utf-8") as csvfile:
+        reader = csv.reader(csvfile)
+        header = next(reader, None)
+        if header is None:
+            return []
+        position = {field.strip(): i for i, field in enumerate(header)}
+        id_col = position.get("product_id", sys.maxsize)
+        qty_col = position.get("quantity", sys.maxsize)
+        lines = []
+        for row in reader:
+            product_id = row[id_col].strip() if id_col < len(row) else ""
+            if product_id:
+                lines.append((product_id, row[qty_col].strip() if qty_col < len(row) else ""))
+        return lines
+
+
 def add_product(inventory_dict, product_id, name, quantity):
     """
     Add a new product to the inventory. Raises ValueError if product_id already exists.
@@ -116,21 +489,58 @@ def get_out_of_stock_requested(inventory_dict, requested_list):
     """
     Return names of products that are out of stock (quantity 0) and were requested by customers.
 
+    With an Inventory (which keeps a zero-stock index) and a set-like requested_list,
+    such as the dict returned by load_request_list, only the smaller of the two is scanned.
+
     Args:
         inventory_dict: Dictionary mapping product_id to [product_name, quantity].
         requested_list: List of product IDs that customers have asked about.
 
     Returns:
-        List of product names that are out of stock and in requested_list (urgent to purchase).
+        List of product names that are out of stock and in requested_list (urgent to purchase),
+        in request order.
     """
-    result = []
-    for product_id in requested_list:
-        if product_id not in inventory_dict:
-            continue
-        name, quantity = inventory_dict[product_id]
-        if quantity == 0:
-            result.append(name)
-    return result
+    zero_stock = getattr(inventory_dict, "zero_stock", None)
+    if zero_stock is None:
+        result = []
+        for product_id in requested_list:
+            if product_id not in inventory_dict:
+                continue
+            name, quantity = inventory_dict[product_id]
+            if quantity == 0:
+                result.append(name)
+        return result
+    zero = zero_stock()
+    if isinstance(requested_list, (dict, set, frozenset)) and len(zero) < len(requested_list):
+        matches = [product_id for product_id in zero if product_id in requested_list]
+        # load_request_list maps each id to its position in the file
+        matches.sort(key=requested_list.get if isinstance(requested_list, dict) else None)
+    else:
+        matches = [product_id for product_id in requested_list if product_id in zero]
+    return [inventory_dict[product_id][0] for product_id in matches]
+
+
+def load_request_list(filename):
+    """
+    Read customer requests, one product ID per line ('#' starts a comment).
+
+    Args:
+        filename: Path to the request list file.
+
+    Returns:
+        Dict mapping each product ID to its position in the file (first occurrence),
+        usable as an ordered set. Returns an empty dict if the file cannot be read.
+    """
+    requests = {}
+    try:
+        with open(filename, encoding="utf-8") as request_file:
+            for line in request_file:
+                product_id = line.split("#", 1)[0].strip()
+                if product_id:
+                    requests.setdefault(product_id, len(requests))
+    except (FileNotFoundError, OSError):
+        return {}
+    return requests
 
 
 def get_high_rotation_products(sales_data_list, threshold):
@@ -138,13 +548,120 @@ def get_high_rotation_products(sales_data_list, threshold):
     Return product IDs that have been sold more times than the threshold.
 
     Args:
-        sales_data_list: List of product IDs (one per sale event).
+        sales_data_list: Iterable of product IDs (one per sale event), e.g. a list or
+            (pid for _, pid in read_sales_log(path)); it is consumed once, as a stream.
         threshold: Minimum number of sales; products with strictly more sales are returned.
 
     Returns:
-        List of product IDs whose sale count is greater than threshold.
+        List of product IDs whose sale count is greater than threshold, in order of first sale.
+    """
+    return [pid for pid, count in Counter(sales_data_list).items() if count > threshold]
+
+
+def top_selling_products(sales_data_list, k):
+    """
+    Return the k most sold products as (product_id, sales) pairs, most sold first.
+
+    Args:
+        sales_data_list: Iterable of product IDs (one per sale event).
+        k: Number of products to return.
+    """
+    return heapq.nlargest(k, Counter(sales_data_list).items(), key=itemgetter(1))
+
+
+def read_sales_log(filename):
+    """
+    Stream a sales log, one sale per line, without loading the file.
+
+    Lines are "YYYY-MM-DD,product_id" (any ISO date or datetime before the comma)
+    or just "product_id". Blank lines and lines whose date is not a valid ISO date
+    are skipped.
+
+    Args:
+        filename: Path to the sales log.
+
+    Yields:
+        (sold_on, product_id) with sold_on a datetime.date, or None for lines without a date.
+    """
+    day_text, sold_on, bad_day = "", None, False
+    with open(filename, encoding="utf-8") as log:
+        for line in log:
+            sold_at, _, product_id = line.strip().rpartition(",")
+            if not product_id:
+                continue
+            # Consecutive sales usually share a day: parse each date once
+            if sold_at[:10] != day_text:
+                day_text = sold_at[:10]
+                try:
+                    sold_on, bad_day = (date.fromisoformat(day_text) if day_text else None), False
+                except ValueError:
+                    bad_day = True
+            if bad_day:
+                continue
+            yield sold_on, product_id
+
+
+class RotationWindow:
+    """
+    Sales counts over the last `days` days, kept as one Counter per day.
+
+    Adding a sale from a newer day drops the days that left the window and
+    subtracts them from the running totals, so memory depends on the products
+    sold in the window, not on the length of the sales history.
     """
-    counts = {}
-    for product_id in sales_data_list:
-        counts[product_id] = counts.get(product_id, 0) + 1
-    return [pid for pid, count in counts.items() if count > threshold]
+
+    def __init__(self, days):
+        self.days = days
+        self._buckets = deque()   # (day ordinal, Counter), oldest first
+        self._totals = Counter()
+
+    def add(self, product_id, sold_on, quantity=1):
+        """Count a sale of product_id on sold_on (a date or datetime). Sales older than the window are ignored."""
+        day = sold_on.toordinal()
+        if self._buckets and day <= self._buckets[-1][0] - self.days:
+            return
+        self.advance(sold_on)
+        bucket = self._bucket(day)
+        bucket[product_id] += quantity
+        self._totals[product_id] += quantity
+
+    def add_all(self, sales):
+        """Add (sold_on, product_id) pairs, e.g. from read_sales_log. Undated sales are skipped."""
+        for sold_on, product_id in sales:
+            if sold_on is not None:
+                self.add(product_id, sold_on)
+
+    def _bucket(self, day):
+        # Logs are mostly in order: the day is usually the last bucket or goes after it
+        position = len(self._buckets)
+        while position and self._buckets[position - 1][0] > day:
+            position -= 1
+        if position and self._buckets[position - 1][0] == day:
+            return self._buckets[position - 1][1]
+        bucket = Counter()
+        self._buckets.insert(position, (day, bucket))
+        return bucket
+
+    def advance(self, today):
+        """Move the window so it ends on today, dropping the days before it."""
+        oldest = today.toordinal() - self.days
+        while self._buckets and self._buckets[0][0] <= oldest:
+            _, bucket = self._buckets.popleft()
+            for product_id, sold in bucket.items():
+                left = self._totals[product_id] - sold
+                if left:
+                    self._totals[product_id] = left
+                else:
+                    del self._totals[product_id]
+
+    def counts(self):
+        """Counter of sales per product inside the window."""
+        return Counter(self._totals)
+
+    def high_rotation(self, threshold):
+        """Product IDs with strictly more than threshold sales in the window."""
+        return [pid for pid, count in self._totals.items() if count > threshold]
+
+    def top(self, k):
+        """The k most sold products in the window as (product_id, sales) pairs."""
+        return heapq.nlargest(k, self._totals.items(), key=itemgetter(1))
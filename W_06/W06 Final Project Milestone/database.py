@@ -4,12 +4,27 @@ Requiere DATABASE_URL en el entorno (cargar .env antes de importar).
 Incluye validación de JWT de Supabase Auth para proteger endpoints.
 """
 import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone
+from functools import wraps
 import jwt
 from jwt import PyJWKClient
 from dotenv import load_dotenv
 from pathlib import Path
-from sqlalchemy import create_engine, Column, Integer, String
+from sqlalchemy import (
+    and_, bindparam, create_engine, event, false, func, or_, text, true, BigInteger, Boolean, Column,
+    DateTime, Index, Integer, String, UniqueConstraint, case, delete, select, update,
+)
+from sqlalchemy.exc import SQLAlchemyError, TimeoutError as PoolTimeoutError
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import QueuePool
+
+import metricas
+import trazas
+from reglas import UMBRAL_STOCK_BAJO, UMBRAL_STOCK_MEDIO, banda
 
 # Cargar variables de entorno
 load_dotenv(dotenv_path=Path(__file__).resolve().parent / ".env")
@@ -23,24 +38,244 @@ if not DB_URL:
 if DB_URL.startswith("postgres://"):
     DB_URL = DB_URL.replace("postgres://", "postgresql://", 1)
 
-engine = create_engine(DB_URL)
+# --- PERFIL SQLITE ---
+# Tiendas pequeñas usan el modo SQLite en producción; SQLITE_TUNING=0 vuelve a la configuración por defecto.
+ES_SQLITE = DB_URL.startswith("sqlite")
+SQLITE_TUNING = os.getenv("SQLITE_TUNING", "1") != "0"
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+# Conexiones abiertas como máximo (cada una con su caché de páginas); 40 = hilos de uvicorn por defecto
+SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "40"))
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",            # lectores y escritor no se bloquean entre sí
+    "synchronous": "NORMAL",          # fsync solo en checkpoints (seguro con WAL)
+    "mmap_size": 256 * 1024 * 1024,   # lecturas por memoria mapeada
+    "cache_size": -16384,             # 16 MB de caché de páginas por conexión
+    "temp_store": "MEMORY",
+    "busy_timeout": SQLITE_BUSY_TIMEOUT_MS,
+}
+
+# --- SENTENCIAS PREPARADAS (PostgreSQL) ---
+# Requiere el driver psycopg 3; psycopg2 no soporta sentencias preparadas del lado del servidor.
+# No activar detrás de PgBouncer en modo transacción (p. ej. el pooler de Supabase en el puerto 6543).
+PG_PREPARED_STATEMENTS = os.getenv("PG_PREPARED_STATEMENTS", "0") == "1"
+PG_PREPARE_THRESHOLD = int(os.getenv("PG_PREPARE_THRESHOLD", "5"))
+
+# --- PLAZOS POR PETICIÓN ---
+# server.py fija el plazo (time.monotonic() límite) de cada petición; las sentencias que lo
+# superan se cancelan (statement_timeout en PostgreSQL, progress handler en SQLite).
+DB_POOL_TIMEOUT_S = float(os.getenv("DB_POOL_TIMEOUT_S", "2"))
+plazo_actual: ContextVar[float | None] = ContextVar("plazo_actual", default=None)
+
+metricas.registrar("db_statement_timeouts_total", "Sentencias canceladas por superar el plazo de la petición")
+metricas.registrar("db_pool_timeouts_total", "Esperas de conexión (pool o escritor SQLite) que agotaron el tiempo")
+metricas.registrar("request_deadline_exceeded_total", "Peticiones respondidas con 503 por plazo agotado")
+
+class PlazoAgotado(Exception):
+    """La petición superó su plazo mientras esperaba o ejecutaba una sentencia."""
+
+# Errores que server.py convierte en 503 en lugar de 500
+ERRORES_DE_PLAZO = (PlazoAgotado, PoolTimeoutError)
+
+def segundos_restantes() -> float | None:
+    """Segundos hasta el plazo de la petición actual, o None si no hay plazo."""
+    limite = plazo_actual.get()
+    return None if limite is None else limite - time.monotonic()
+
+def _plazo_al_obtener_conexion(dbapi_connection, connection_record, connection_proxy):
+    restante = segundos_restantes()
+    if restante is None or restante <= 0:
+        return
+    if connection_record.info.get("sqlite"):
+        limite = plazo_actual.get()
+        # Cada 10.000 instrucciones de la VM; devolver True interrumpe la sentencia
+        dbapi_connection.set_progress_handler(lambda: time.monotonic() > limite, 10_000)
+    else:
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"SET statement_timeout = {max(1, int(restante * 1000))}")
+        cursor.close()
+        dbapi_connection.commit()
+    connection_record.info["con_plazo"] = True
+
+def _plazo_al_devolver_conexion(dbapi_connection, connection_record):
+    if not connection_record.info.pop("con_plazo", False) or dbapi_connection is None:
+        return
+    if connection_record.info.get("sqlite"):
+        dbapi_connection.set_progress_handler(None, 0)
+    else:
+        cursor = dbapi_connection.cursor()
+        cursor.execute("SET statement_timeout = DEFAULT")
+        cursor.close()
+        dbapi_connection.commit()
+
+def _verificar_plazo(conn, cursor, statement, parameters, context, executemany):
+    restante = segundos_restantes()
+    if restante is not None and restante <= 0:
+        metricas.incrementar("db_statement_timeouts_total")
+        raise PlazoAgotado("Plazo de la petición agotado antes de ejecutar la consulta")
+
+def _traducir_cancelacion(contexto):
+    """Convierte la cancelación por plazo del driver en PlazoAgotado y la cuenta."""
+    original = contexto.original_exception
+    cancelada = (
+        getattr(original, "pgcode", None) == "57014"            # psycopg2 QueryCanceled
+        or getattr(original, "sqlstate", None) == "57014"       # psycopg 3
+        or str(original) == "interrupted"                        # SQLite progress handler
+    )
+    if cancelada:
+        metricas.incrementar("db_statement_timeouts_total")
+        raise PlazoAgotado("La consulta superó el plazo de la petición") from original
+
+def _instalar_plazos(motor, es_sqlite: bool):
+    if es_sqlite:
+        event.listen(motor, "connect", lambda conexion, registro: registro.info.update(sqlite=True))
+    event.listen(motor, "checkout", _plazo_al_obtener_conexion)
+    event.listen(motor, "checkin", _plazo_al_devolver_conexion)
+    event.listen(motor, "before_cursor_execute", _verificar_plazo)
+    event.listen(motor, "handle_error", _traducir_cancelacion)
+
+def _aplicar_pragmas_sqlite(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma, valor in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {pragma}={valor}")
+    cursor.close()
+
+def crear_engine(url: str, perfil_sqlite: bool = SQLITE_TUNING):
+    """
+    Crea el engine. En SQLite el esquema "public" de models.py se traduce al esquema
+    por defecto y, con perfil_sqlite, se usan WAL, mmap, caché grande, busy_timeout
+    y un QueuePool de hasta SQLITE_POOL_SIZE conexiones compartidas entre hilos.
+    """
+    es_sqlite = url.startswith("sqlite")
+    if es_sqlite:
+        opciones = {"execution_options": {"schema_translate_map": {"public": None}}}
+        en_memoria = url in ("sqlite://", "sqlite:///:memory:") or "mode=memory" in url
+        if perfil_sqlite:
+            opciones["connect_args"] = {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}
+        if perfil_sqlite and not en_memoria:
+            # Las conexiones vuelven al pool al cerrar la sesión y las usa cualquier hilo
+            # (check_same_thread=False); las escrituras las serializan _lock_escritor y
+            # BEGIN IMMEDIATE. Una base en memoria conserva el pool por defecto: cada
+            # conexión nueva sería una base vacía.
+            opciones.update(
+                poolclass=QueuePool,
+                pool_size=SQLITE_POOL_SIZE,
+                max_overflow=0,
+                pool_timeout=DB_POOL_TIMEOUT_S,
+            )
+    else:
+        # Sin conexiones libres se espera como máximo DB_POOL_TIMEOUT_S (503) en vez de 30 s
+        opciones = {"pool_timeout": DB_POOL_TIMEOUT_S}
+        if url.startswith("postgresql") and PG_PREPARED_STATEMENTS:
+            # psycopg prepara en el servidor cada sentencia ejecutada PG_PREPARE_THRESHOLD veces
+            url = "postgresql+psycopg://" + url.split("://", 1)[1]
+            opciones["connect_args"] = {"prepare_threshold": PG_PREPARE_THRESHOLD}
+    nuevo = create_engine(url, **opciones)
+    if es_sqlite and perfil_sqlite:
+        event.listen(nuevo, "connect", _aplicar_pragmas_sqlite)
+    _instalar_plazos(nuevo, es_sqlite)
+    trazas.instrumentar_engine(nuevo)
+    return nuevo
+
+# SQLite admite un solo escritor: serializamos las escrituras del proceso con un lock
+# y las abrimos con BEGIN IMMEDIATE para que nunca fallen con "database is locked".
+_lock_escritor = threading.Lock()
+
+@contextmanager
+def escritor():
+    """
+    Context manager que serializa una transacción de escritura (no-op fuera de SQLite).
+    Dentro de una petición la espera del lock dura como máximo DB_POOL_TIMEOUT_S (igual que
+    la del pool en PostgreSQL) y nunca más que el plazo restante; al agotarse se lanza
+    PlazoAgotado (503). Fuera de una petición (importaciones, purga, buffer) se espera el turno.
+    """
+    if not (ES_SQLITE and SQLITE_TUNING):
+        yield
+        return
+    restante = segundos_restantes()
+    espera = -1 if restante is None else max(min(restante, DB_POOL_TIMEOUT_S), 0)
+    if not _lock_escritor.acquire(timeout=espera):
+        metricas.incrementar("db_pool_timeouts_total")
+        raise PlazoAgotado("Plazo agotado esperando el turno de escritura")
+    try:
+        yield
+    finally:
+        _lock_escritor.release()
+
+def _escritura(func):
+    """Decorador para funciones CRUD de escritura cuyo primer argumento es la sesión."""
+    @wraps(func)
+    def envoltura(session, *args, **kwargs):
+        with escritor():
+            if ES_SQLITE and SQLITE_TUNING:
+                session.execute(text("BEGIN IMMEDIATE"))
+            try:
+                return func(session, *args, **kwargs)
+            except Exception:
+                session.rollback()
+                raise
+    return envoltura
+
+engine = crear_engine(DB_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Tienda usada cuando la petición no indica ninguna (despliegues de una sola tienda)
+DEFAULT_STORE = os.getenv("DEFAULT_STORE", "principal")
+
 class Product(Base):
     __tablename__ = "products"
+    # Todas las consultas filtran por store_id primero: el costo depende del catálogo
+    # de una tienda y no del total (ver migrate_multistore.py para bases existentes)
+    __table_args__ = (
+        UniqueConstraint("store_id", "product_id", name="uq_products_store_product"),
+        Index("ix_products_store_id_id", "store_id", "id"),
+        Index("ix_products_store_version", "store_id", "version"),
+    )
     id = Column(Integer, primary_key=True, index=True)
-    product_id = Column(String, unique=True, index=True)
+    store_id = Column(String(50), nullable=False, default=DEFAULT_STORE, server_default=DEFAULT_STORE)
+    product_id = Column(String, nullable=False)
     name = Column(String, index=True)
     quantity = Column(Integer, default=0)
+    # Versión de fila (contador por tienda) y tombstone para el feed de cambios
+    version = Column(BigInteger, nullable=False, default=0, server_default="0")
+    deleted = Column(Boolean, nullable=False, default=False, server_default=false())
+    updated_at = Column(DateTime, nullable=False, default=lambda: ahora_utc(), onupdate=lambda: ahora_utc(),
+                        server_default=func.now())
+
+class StoreVersion(Base):
+    """Última versión asignada por tienda y hasta qué versión se purgaron los tombstones."""
+    __tablename__ = "store_versions"
+    store_id = Column(String(50), primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+    purged_version = Column(BigInteger, nullable=False, default=0)
+
+class InventoryStats(Base):
+    """
+    Resumen por tienda (SKUs, unidades y productos por banda de stock) que las escrituras
+    mantienen en la misma transacción; se lee en O(1). Ver verificar_estadisticas.
+    """
+    __tablename__ = "inventory_stats"
+    store_id = Column(String(50), primary_key=True)
+    total_skus = Column(BigInteger, nullable=False, default=0)
+    total_unidades = Column(BigInteger, nullable=False, default=0)
+    en_cero = Column(BigInteger, nullable=False, default=0)
+    bajos = Column(BigInteger, nullable=False, default=0)
+    medios = Column(BigInteger, nullable=False, default=0)
+    altos = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False, default=lambda: ahora_utc(), onupdate=lambda: ahora_utc())
 
 Base.metadata.create_all(bind=engine)
 
+def ahora_utc():
+    """Hora UTC sin zona (SQLite no guarda la zona horaria)."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
 # --- VALIDACIÓN DE TOKENS ---
 
 def get_session():
     return SessionLocal()
 
+@trazas.trazar("validate_jwt")
 def validate_jwt(token: str):
     """
     Valida el token usando JWKS (llaves públicas de Supabase).
@@ -84,9 +319,266 @@ def validate_jwt(token: str):
         print(f"[AUTH CRITICAL] Error inesperado: {e}")
         return None
 
+# --- VERSIONES (feed de cambios) ---
+
+class HistorialPurgado(Exception):
+    """El cliente pide cambios desde una versión cuyos tombstones ya se purgaron."""
+
+def _insert_dialecto(session):
+    """insert() con soporte de ON CONFLICT para el dialecto de la sesión."""
+    if session.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+# --- RÉPLICA DE LECTURA (opcional) ---
+# Con DB_READ_URL, los listados, exportaciones y lecturas de la IA van a la réplica.
+# Se vuelve al primario si la réplica atrasa más de REPLICA_MAX_LAG versiones de la tienda
+# (se revisa cada REPLICA_CHECK_S segundos) o si no alcanza la versión que pide el cliente.
+DB_READ_URL = os.getenv("DB_READ_URL")
+REPLICA_MAX_LAG = int(os.getenv("REPLICA_MAX_LAG", "0"))
+REPLICA_CHECK_S = float(os.getenv("REPLICA_CHECK_S", "1"))
+engine_lectura = crear_engine(DB_READ_URL) if DB_READ_URL else engine
+
+metricas.registrar("db_replica_fallbacks_total", "Lecturas enviadas al primario por atraso o falla de la réplica")
+
+_versiones_escritas: dict[str, int] = {}
+# store_id -> (revisado_en, versión en la réplica, versión en el primario)
+_revisiones_replica: dict[str, tuple[float, int, int]] = {}
+_STMT_VERSION_TIENDA = select(StoreVersion.version).where(StoreVersion.store_id == bindparam("b_store"))
+
+def _version_tienda(motor, store_id: str) -> int:
+    with motor.connect() as conn:
+        return conn.execute(_STMT_VERSION_TIENDA, {"b_store": store_id}).scalar() or 0
+
+def motor_lectura(store_id: str = DEFAULT_STORE, min_version: int | None = None):
+    """
+    Engine para una lectura de la tienda: la réplica si está al día, si no el primario.
+    min_version es la última versión que el cliente escribió o vio (read-your-writes).
+    """
+    if engine_lectura is engine:
+        return engine
+    revision = _revisiones_replica.get(store_id)
+    if revision is None or time.monotonic() - revision[0] > REPLICA_CHECK_S:
+        try:
+            v_replica = _version_tienda(engine_lectura, store_id)
+        except ERRORES_DE_PLAZO:
+            raise
+        except SQLAlchemyError as e:
+            print(f"[Réplica] No disponible, se lee del primario: {e}")
+            metricas.incrementar("db_replica_fallbacks_total", motivo="error")
+            return engine
+        revision = (time.monotonic(), v_replica, _version_tienda(engine, store_id))
+        _revisiones_replica[store_id] = revision
+    _, v_replica, v_primario = revision
+    if v_primario - v_replica > REPLICA_MAX_LAG:
+        metricas.incrementar("db_replica_fallbacks_total", motivo="atraso")
+        return engine
+    if min_version is not None and v_replica < min_version:
+        # La versión revisada puede haber quedado vieja; leer del primario siempre es correcto
+        metricas.incrementar("db_replica_fallbacks_total", motivo="version_cliente")
+        return engine
+    return engine_lectura
+
+def version_tienda(store_id: str = DEFAULT_STORE, min_version: int | None = None) -> int:
+    """Versión actual de la tienda según motor_lectura: cambia con cada escritura del catálogo."""
+    return _version_tienda(motor_lectura(store_id, min_version), store_id)
+
+def get_read_session(store_id: str = DEFAULT_STORE, min_version: int | None = None):
+    """Sesión de solo lectura sobre motor_lectura(store_id, min_version)."""
+    return SessionLocal(bind=motor_lectura(store_id, min_version))
+
+# --- SENTENCIAS PRECOMPILADAS ---
+# Las sentencias calientes se construyen una sola vez con bindparam(): SQLAlchemy memoiza
+# su clave de caché y reutiliza el SQL compilado, sin armar un Query nuevo por petición.
+_productos = Product.__table__
+_versiones = StoreVersion.__table__
+_VIVO = and_(
+    _productos.c.store_id == bindparam("b_store"),
+    _productos.c.id == bindparam("b_id"),
+    _productos.c.deleted == false(),
+)
+_STMT_INCREMENTAR_VERSION = (
+    update(_versiones)
+    .where(_versiones.c.store_id == bindparam("b_store"))
+    .values(version=_versiones.c.version + 1)
+    .returning(_versiones.c.version)
+)
+_STMT_EXISTE = select(_productos.c.id).where(_VIVO)
+# coalesce(NULL, columna) deja la columna igual: una sola forma de sentencia para
+# actualizar el nombre, la cantidad o ambos
+_STMT_ACTUALIZAR = (
+    update(_productos)
+    .where(_VIVO)
+    .values(
+        name=func.coalesce(bindparam("b_name", type_=String), _productos.c.name),
+        quantity=func.coalesce(bindparam("b_quantity", type_=Integer), _productos.c.quantity),
+        version=bindparam("b_version"),
+    )
+    .returning(_productos.c.id, _productos.c.product_id, _productos.c.name,
+               _productos.c.quantity, _productos.c.version)
+)
+_STMT_ELIMINAR = (
+    update(_productos).where(_VIVO)
+    .values(deleted=true(), version=bindparam("b_version"))
+    .returning(_productos.c.id, _productos.c.quantity)
+)
+_STMT_CANTIDAD = select(_productos.c.quantity).where(_VIVO)
+_STMT_AJUSTAR = (
+    update(_productos)
+    .where(_VIVO, _productos.c.quantity + bindparam("b_delta") >= 0)
+    .values(quantity=_productos.c.quantity + bindparam("b_delta"), version=bindparam("b_version"))
+    .returning(_productos.c.quantity)
+)
+
+# --- ESTADÍSTICAS DE INVENTARIO ---
+# Cada escritura suma su diferencia a inventory_stats antes del commit. Las escrituras de una
+# tienda se serializan en su fila de store_versions, así que la fila de estadísticas no agrega
+# esperas. Por eso siguiente_version se llama ANTES de leer la cantidad anterior: leída antes
+# del bloqueo, dos escritores concurrentes calcularían la diferencia sobre el mismo valor.
+CAMPOS_ESTADISTICAS = ("total_skus", "total_unidades", "en_cero", "bajos", "medios", "altos")
+_COLUMNA_BANDA = {"cero": "en_cero", "bajo": "bajos", "medio": "medios", "alto": "altos"}
+_estadisticas = InventoryStats.__table__
+_STMT_SUMAR_ESTADISTICAS = (
+    update(_estadisticas)
+    .where(_estadisticas.c.store_id == bindparam("b_store"))
+    .values(**{c: _estadisticas.c[c] + bindparam(f"d_{c}") for c in CAMPOS_ESTADISTICAS})
+)
+
+def _sumar_fila(delta: dict, anterior: int | None, nueva: int | None):
+    """Acumula en delta el cambio de un producto: anterior/nueva son su cantidad viva antes y después (None = no existe)."""
+    for cantidad, signo in ((anterior, -1), (nueva, 1)):
+        if cantidad is None:
+            continue
+        delta["total_skus"] = delta.get("total_skus", 0) + signo
+        delta["total_unidades"] = delta.get("total_unidades", 0) + signo * cantidad
+        columna = _COLUMNA_BANDA[banda(cantidad)]
+        delta[columna] = delta.get(columna, 0) + signo
+
+def _agregado_estadisticas(session, store_id: str | None = None) -> dict[str, dict]:
+    """Estadísticas recalculadas desde products (filas vivas): {store_id: {campo: valor}}."""
+    cantidad = func.coalesce(_productos.c.quantity, 0)
+    def contar(condicion):
+        return func.coalesce(func.sum(case((condicion, 1), else_=0)), 0)
+    consulta = (
+        select(
+            _productos.c.store_id, func.count(), func.coalesce(func.sum(cantidad), 0),
+            contar(cantidad <= 0),
+            contar((cantidad > 0) & (cantidad <= UMBRAL_STOCK_BAJO)),
+            contar((cantidad > UMBRAL_STOCK_BAJO) & (cantidad <= UMBRAL_STOCK_MEDIO)),
+            contar(cantidad > UMBRAL_STOCK_MEDIO),
+        )
+        .where(_productos.c.deleted == false())
+        .group_by(_productos.c.store_id)
+    )
+    if store_id is not None:
+        consulta = consulta.where(_productos.c.store_id == store_id)
+    return {fila[0]: dict(zip(CAMPOS_ESTADISTICAS, fila[1:])) for fila in session.execute(consulta)}
+
+def _actualizar_estadisticas(session, store_id: str, delta: dict):
+    """
+    Suma delta a la fila de la tienda. Si la fila aún no existe (tienda nueva o base anterior
+    a esta tabla) se crea recalculando desde products, lo que ya incluye la escritura actual.
+    """
+    if not any(delta.values()):
+        return
+    params = {"b_store": store_id, **{f"d_{c}": delta.get(c, 0) for c in CAMPOS_ESTADISTICAS}}
+    if session.execute(_STMT_SUMAR_ESTADISTICAS, params).rowcount:
+        return
+    session.flush()
+    valores = _agregado_estadisticas(session, store_id).get(store_id, dict.fromkeys(CAMPOS_ESTADISTICAS, 0))
+    insert = _insert_dialecto(session)
+    creada = session.execute(
+        insert(_estadisticas).values(store_id=store_id, updated_at=ahora_utc(), **valores).on_conflict_do_nothing()
+    ).rowcount
+    if not creada:
+        # Otra transacción la creó sin ver esta escritura: se suma la diferencia
+        session.execute(_STMT_SUMAR_ESTADISTICAS, params)
+
+def leer_estadisticas(session, store_id: str = DEFAULT_STORE) -> dict | None:
+    """Estadísticas mantenidas de la tienda ({campo: valor, "updated_at": ...}), o None si no hay fila."""
+    fila = session.execute(select(_estadisticas).where(_estadisticas.c.store_id == store_id)).first()
+    return None if fila is None else {c: fila._mapping[c] for c in (*CAMPOS_ESTADISTICAS, "updated_at")}
+
+def calcular_estadisticas_inventario(session, store_id: str = DEFAULT_STORE) -> dict:
+    """Estadísticas de la tienda recalculadas desde cero (recorre sus productos)."""
+    return _agregado_estadisticas(session, store_id).get(store_id, dict.fromkeys(CAMPOS_ESTADISTICAS, 0))
+
+def verificar_estadisticas(session, store_id: str | None = None) -> list[dict]:
+    """
+    Recalcula las estadísticas desde products y las compara con inventory_stats.
+    Devuelve una entrada por tienda con deriva: {"store_id", "diferencias": {campo: (guardado, real)}}.
+    Con escrituras concurrentes puede aparecer una diferencia transitoria: repetir antes de corregir.
+    """
+    reales = _agregado_estadisticas(session, store_id)
+    consulta = select(_estadisticas)
+    if store_id is not None:
+        consulta = consulta.where(_estadisticas.c.store_id == store_id)
+    guardadas = {fila.store_id: fila._mapping for fila in session.execute(consulta)}
+    derivas = []
+    for tienda in sorted(reales.keys() | guardadas.keys()):
+        real = reales.get(tienda, dict.fromkeys(CAMPOS_ESTADISTICAS, 0))
+        guardada = guardadas.get(tienda)
+        diferencias = {
+            c: (None if guardada is None else guardada[c], real[c])
+            for c in CAMPOS_ESTADISTICAS
+            if guardada is None or guardada[c] != real[c]
+        }
+        if diferencias:
+            derivas.append({"store_id": tienda, "diferencias": diferencias})
+    return derivas
+
+@_escritura
+def reconstruir_estadisticas(session, store_id: str | None = None) -> int:
+    """Reescribe inventory_stats desde products (una tienda o todas). Devuelve las filas escritas."""
+    reales = _agregado_estadisticas(session, store_id)
+    if store_id is not None:
+        reales.setdefault(store_id, dict.fromkeys(CAMPOS_ESTADISTICAS, 0))
+    sentencia = _insert_dialecto(session)(_estadisticas)
+    ahora = ahora_utc()
+    for tienda, valores in reales.items():
+        session.execute(
+            sentencia.values(store_id=tienda, updated_at=ahora, **valores)
+            .on_conflict_do_update(index_elements=[_estadisticas.c.store_id],
+                                   set_={**valores, "updated_at": ahora})
+        )
+    session.commit()
+    return len(reales)
+
+def siguiente_version(session, store_id: str) -> int:
+    """
+    Incrementa y devuelve el contador de versión de la tienda dentro de la transacción actual.
+    La fila del contador queda bloqueada hasta el commit, así las versiones de una tienda
+    se hacen visibles en orden y el feed nunca salta cambios aún no confirmados.
+    """
+    version = session.execute(_STMT_INCREMENTAR_VERSION, {"b_store": store_id}).scalar()
+    if version is None:
+        insert = _insert_dialecto(session)
+        session.execute(
+            insert(_versiones).values(store_id=store_id, version=0, purged_version=0).on_conflict_do_nothing()
+        )
+        version = session.execute(_STMT_INCREMENTAR_VERSION, {"b_store": store_id}).scalar()
+    # Si la transacción se revierte la marca queda adelantada: solo hace leer del primario de más
+    if version > _versiones_escritas.get(store_id, 0):
+        _versiones_escritas[store_id] = version
+    return version
+
+def ultima_version_escrita(store_id: str) -> int:
+    """
+    Versión más alta asignada por este proceso a la tienda. Las escrituras la devuelven
+    al cliente (cabecera X-Version) para que sus lecturas siguientes la exijan a la réplica.
+    """
+    return _versiones_escritas.get(store_id, 0)
+
 # --- FUNCIONES CRUD ---
-def create_product(session, name: str, quantity: int):
-    last_product = session.query(Product).order_by(Product.id.desc()).first()
+# Los productos eliminados quedan como tombstone (deleted=True) hasta purgar_eliminados.
+@_escritura
+def create_product(session, name: str, quantity: int, store_id: str = DEFAULT_STORE):
+    # Incluye tombstones para no reutilizar el código de un producto eliminado
+    last_product = (
+        session.query(Product).filter(Product.store_id == store_id).order_by(Product.id.desc()).first()
+    )
     if last_product and last_product.product_id.startswith("P"):
         try:
             last_num = int(last_product.product_id[1:])
@@ -95,24 +587,231 @@ def create_product(session, name: str, quantity: int):
             new_id_str = "P001"
     else:
         new_id_str = "P001"
-    new_product = Product(product_id=new_id_str, name=name, quantity=quantity)
+    new_product = Product(
+        store_id=store_id, product_id=new_id_str, name=name, quantity=quantity,
+        version=siguiente_version(session, store_id),
+    )
     session.add(new_product)
+    delta = {}
+    _sumar_fila(delta, None, quantity)
+    _actualizar_estadisticas(session, store_id, delta)
     session.commit()
     session.refresh(new_product)
     return new_product
 
-def update_product(session, id_interno: int, name: str = None, quantity: int = None):
-    product = session.query(Product).filter(Product.id == id_interno).first()
-    if not product: return None
-    if name is not None: product.name = name
-    if quantity is not None: product.quantity = quantity
+@_escritura
+def update_product(session, id_interno: int, name: str = None, quantity: int = None,
+                   store_id: str = DEFAULT_STORE):
+    """Devuelve la fila actualizada (id, product_id, name, quantity, version) o None."""
+    clave = {"b_store": store_id, "b_id": id_interno}
+    version = siguiente_version(session, store_id)
+    # Solo un cambio de cantidad mueve las estadísticas: se lee la anterior con la tienda ya bloqueada
+    anterior = session.execute(_STMT_CANTIDAD, clave).scalar() if quantity is not None else None
+    product = session.execute(_STMT_ACTUALIZAR, {
+        **clave, "b_name": name, "b_quantity": quantity, "b_version": version,
+    }).first()
+    if not product:
+        session.rollback()
+        return None
+    if quantity is not None:
+        delta = {}
+        _sumar_fila(delta, anterior or 0, product.quantity)
+        _actualizar_estadisticas(session, store_id, delta)
     session.commit()
-    session.refresh(product)
     return product
 
-def delete_product(session, id_interno: int):
-    product = session.query(Product).filter(Product.id == id_interno).first()
-    if not product: return False
-    session.delete(product)
+@_escritura
+def delete_product(session, id_interno: int, store_id: str = DEFAULT_STORE):
+    eliminado = session.execute(_STMT_ELIMINAR, {
+        "b_store": store_id, "b_id": id_interno, "b_version": siguiente_version(session, store_id),
+    }).first()
+    if not eliminado:
+        session.rollback()
+        return False
+    delta = {}
+    _sumar_fila(delta, eliminado.quantity or 0, None)
+    _actualizar_estadisticas(session, store_id, delta)
+    session.commit()
+    return True
+
+@_escritura
+def adjust_stock(session, id_interno: int, delta: int, store_id: str = DEFAULT_STORE):
+    """
+    Suma delta (positivo o negativo) al stock en un único UPDATE atómico.
+    Devuelve la nueva cantidad, None si el producto no existe,
+    o lanza ValueError si el stock quedaría negativo.
+    """
+    clave = {"b_store": store_id, "b_id": id_interno}
+    nueva = session.execute(_STMT_AJUSTAR, {
+        **clave, "b_delta": delta, "b_version": siguiente_version(session, store_id),
+    }).scalar()
+    if nueva is None:
+        existe = session.execute(_STMT_EXISTE, clave).first()
+        session.rollback()
+        if not existe: return None
+        raise ValueError("Stock insuficiente")
+    delta_estadisticas = {}
+    _sumar_fila(delta_estadisticas, nueva - delta, nueva)
+    _actualizar_estadisticas(session, store_id, delta_estadisticas)
+    session.commit()
+    return nueva
+
+@_escritura
+def apply_stock_deltas(session, ajustes):
+    """
+    Aplica una lista de ajustes [(store_id, id_interno, delta), ...] en una sola transacción.
+    Cada delta se valida en orden contra el stock acumulado de su producto
+    (el stock nunca baja de 0); los deltas rechazados no afectan a los demás.
+    Todos los cambios se escriben con un único UPDATE ... CASE.
+
+    Returns:
+        Lista paralela a ajustes con la nueva cantidad (int), None si el
+        producto no existe, o un ValueError si el delta dejaba stock negativo.
+    """
+    tabla = Product.__table__
+    ids = {id_interno for _, id_interno, _ in ajustes}
+    # Mismo orden de bloqueo que las demás escrituras (contador de la tienda, luego productos)
+    versiones = {s: siguiente_version(session, s) for s in sorted({s for s, _, _ in ajustes})}
+    filas = session.execute(
+        select(tabla.c.store_id, tabla.c.id, tabla.c.quantity)
+        .where(tabla.c.id.in_(ids), tabla.c.deleted == false())
+        .with_for_update()
+    ).all()
+    # Clave (tienda, id): un ajuste con la tienda equivocada cuenta como producto inexistente
+    actual = {(store_id, id_interno): cantidad or 0 for store_id, id_interno, cantidad in filas}
+    original = dict(actual)
+    cambiados = set()
+    resultados = []
+    for store_id, id_interno, delta in ajustes:
+        clave = (store_id, id_interno)
+        if clave not in actual:
+            resultados.append(None)
+        elif actual[clave] + delta < 0:
+            resultados.append(ValueError("Stock insuficiente"))
+        else:
+            actual[clave] += delta
+            cambiados.add(clave)
+            resultados.append(actual[clave])
+    if cambiados:
+        session.execute(
+            update(tabla)
+            .where(tabla.c.id.in_([i for _, i in cambiados]))
+            .values(
+                quantity=case({i: actual[(s, i)] for s, i in cambiados}, value=tabla.c.id),
+                version=case({i: versiones[s] for s, i in cambiados}, value=tabla.c.id),
+            )
+        )
+        deltas = {s: {} for s, _ in cambiados}
+        for clave in cambiados:
+            _sumar_fila(deltas[clave[0]], original[clave], actual[clave])
+        for store_id, delta in deltas.items():
+            _actualizar_estadisticas(session, store_id, delta)
+    session.commit()
+    return resultados
+
+@_escritura
+def upsert_products(session, filas, store_id: str = DEFAULT_STORE):
+    """
+    Inserta o actualiza en bloque una lista de (product_id, name, quantity) de una tienda
+    con un solo INSERT ... ON CONFLICT (store_id, product_id) DO UPDATE. Si un product_id
+    se repite en el bloque gana la última fila, igual que en core.load_inventory.
+    Un tombstone con el mismo product_id vuelve a quedar activo.
+
+    Returns:
+        (insertados, actualizados)
+    """
+    por_id = {product_id: (name, quantity) for product_id, name, quantity in filas}
+    if not por_id:
+        session.rollback()
+        return 0, 0
+    tabla = Product.__table__
+    version = siguiente_version(session, store_id)
+    # Filas previas (incluidos tombstones): cuentan como actualizadas y dan la cantidad anterior
+    previas = {
+        product_id: None if deleted else (cantidad or 0)
+        for product_id, cantidad, deleted in session.execute(
+            select(tabla.c.product_id, tabla.c.quantity, tabla.c.deleted)
+            .where(tabla.c.store_id == store_id, tabla.c.product_id.in_(por_id))
+        )
+    }
+    existentes = len(previas)
+    ahora = ahora_utc()
+    sentencia = _insert_dialecto(session)(tabla)
+    session.execute(
+        sentencia.on_conflict_do_update(
+            index_elements=[tabla.c.store_id, tabla.c.product_id],
+            set_={
+                "name": sentencia.excluded.name,
+                "quantity": sentencia.excluded.quantity,
+                "version": sentencia.excluded.version,
+                "deleted": false(),
+                "updated_at": sentencia.excluded.updated_at,
+            },
+        ),
+        [{"store_id": store_id, "product_id": pid, "name": name, "quantity": qty,
+          "version": version, "deleted": False, "updated_at": ahora}
+         for pid, (name, qty) in por_id.items()],
+    )
+    delta = {}
+    for pid, (_, qty) in por_id.items():
+        _sumar_fila(delta, previas.get(pid), qty)
+    _actualizar_estadisticas(session, store_id, delta)
+    session.commit()
+    return len(por_id) - existentes, existentes
+
+def listar_cambios(session, store_id: str, desde: int, limite: int = 1000, desde_id: int = 0):
+    """
+    Devuelve (version, desde_id, filas) con a lo sumo limite productos creados, modificados
+    o eliminados (tombstones) después del cursor (desde, desde_id), en orden (version, id),
+    usando el índice (store_id, version). El cursor siguiente es (version, desde_id): si la
+    página terminó a mitad de una versión (p. ej. una importación que escribe miles de filas
+    con una sola versión) desde_id es el id de la última fila entregada, si no es 0.
+
+    Raises:
+        HistorialPurgado: si desde es anterior a tombstones ya purgados (hay que
+        descargar el catálogo completo).
+    """
+    contador = session.get(StoreVersion, store_id)
+    if contador is None:
+        return 0, 0, []
+    if desde < contador.purged_version:
+        raise HistorialPurgado(f"Cambios anteriores a la versión {contador.purged_version} ya purgados")
+    # Leemos el contador antes que las filas: toda fila con version <= contador.version ya hizo commit
+    hasta = contador.version
+    # desde_id = 0: la versión desde se entregó completa (los ids empiezan en 1)
+    despues_del_cursor = Product.version > desde
+    if desde_id:
+        despues_del_cursor = or_(despues_del_cursor, and_(Product.version == desde, Product.id > desde_id))
+    filas = session.scalars(
+        select(Product)
+        .where(Product.store_id == store_id, despues_del_cursor, Product.version <= hasta)
+        .order_by(Product.version, Product.id)
+        .limit(limite + 1)
+    ).all()
+    if len(filas) > limite:
+        # Hay más: el cursor queda en la última fila entregada, aunque corte una versión
+        ultima = filas[limite - 1]
+        return ultima.version, ultima.id, filas[:limite]
+    return hasta, 0, filas
+
+@_escritura
+def purgar_eliminados(session, antiguedad: timedelta) -> int:
+    """
+    Borra físicamente los tombstones más viejos que antiguedad y registra por tienda
+    hasta qué versión se purgó. Devuelve la cantidad de filas borradas.
+    """
+    tabla = Product.__table__
+    viejos = (tabla.c.deleted == true(), tabla.c.updated_at < ahora_utc() - antiguedad)
+    por_tienda = session.execute(
+        select(tabla.c.store_id, func.max(tabla.c.version)).where(*viejos).group_by(tabla.c.store_id)
+    ).all()
+    versiones = StoreVersion.__table__
+    for store_id, version in por_tienda:
+        session.execute(
+            update(versiones)
+            .where(versiones.c.store_id == store_id, versiones.c.purged_version < version)
+            .values(purged_version=version)
+        )
+    borradas = session.execute(delete(tabla).where(*viejos)).rowcount
     session.commit()
-    return True
\ No newline at end of file
+    return borradas
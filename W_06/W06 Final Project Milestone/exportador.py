@@ -0,0 +1,90 @@
+"""
+Exportación del catálogo en streaming (CSV o Parquet).
+Las filas se leen con un cursor del lado del servidor (stream_results) en lotes
+de TAMANO_LOTE, así la memoria es constante sin importar el tamaño de la tabla.
+El CSV usa core.HEADERS para que vuelva a cargarse con core.load_inventory.
+"""
+
+import csv
+import io
+import os
+
+from sqlalchemy import false, select
+
+from core import HEADERS
+from database import DEFAULT_STORE, Product, engine
+
+TAMANO_LOTE = int(os.getenv("EXPORT_BATCH_SIZE", "5000"))
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet es opcional
+    pa = None
+
+
+def parquet_disponible() -> bool:
+    return pa is not None
+
+
+def _lotes_productos(store_id, motor=None):
+    """Genera listas de filas (product_id, name, quantity) de una tienda ordenadas por id."""
+    tabla = Product.__table__
+    consulta = (
+        select(tabla.c.product_id, tabla.c.name, tabla.c.quantity)
+        .where(tabla.c.store_id == store_id, tabla.c.deleted == false())
+        .order_by(tabla.c.id)
+    )
+    with (motor or engine).connect() as conn:
+        resultado = conn.execution_options(stream_results=True, yield_per=TAMANO_LOTE).execute(consulta)
+        for lote in resultado.partitions():
+            yield lote
+
+
+def exportar_csv(store_id: str = DEFAULT_STORE, motor=None):
+    """Genera el CSV por bloques de texto (un bloque por lote de filas)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(HEADERS)
+    # El encabezado sale solo para que el primer byte llegue sin esperar a la consulta
+    yield buffer.getvalue()
+    for lote in _lotes_productos(store_id, motor):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(lote)
+        yield buffer.getvalue()
+
+
+class _SalidaParquet(io.RawIOBase):
+    """Archivo de solo escritura que acumula bytes hasta que el generador los recoge."""
+
+    def __init__(self):
+        self._partes = []
+
+    def writable(self):
+        return True
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        return len(datos)
+
+    def recoger(self) -> bytes:
+        datos = b"".join(self._partes)
+        self._partes.clear()
+        return datos
+
+
+def exportar_parquet(store_id: str = DEFAULT_STORE, motor=None):
+    """Genera un archivo Parquet con un row group por lote. Requiere pyarrow."""
+    if pa is None:
+        raise RuntimeError("Exportar Parquet requiere pyarrow instalado")
+    esquema = pa.schema([(HEADERS[0], pa.string()), (HEADERS[1], pa.string()), (HEADERS[2], pa.int64())])
+    salida = _SalidaParquet()
+    with pq.ParquetWriter(salida, esquema) as writer:
+        for lote in _lotes_productos(store_id, motor):
+            ids, nombres, cantidades = zip(*lote)
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(ids), pa.array(nombres), pa.array(cantidades, pa.int64())], schema=esquema
+            ))
+            yield salida.recoger()
+    yield salida.recoger()
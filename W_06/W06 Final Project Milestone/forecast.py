@@ -0,0 +1,249 @@
+"""Reorder forecasting from the sales log, vectorized with NumPy.
+
+Products are integer-coded (row i of every array is the i-th product of the
+inventory). Sales from the log are counted per (product, day) cell, keeping only the
+cells that had sales, and reduced to each product's total and sum of squared daily
+units; memory follows the number of sales, not products x days (a dense 1M x 365
+matrix would take 1.4 GB). Velocity, demand variability, days of cover, reorder points
+and suggested orders are then computed with array operations over those totals.
+
+Usage: python forecast.py <sales log> [inventory.csv] [summary.json]
+writes the most urgent products as JSON; ai_service reads it (PRONOSTICO_PATH)
+as precomputed context for the model.
+"""
+
+import json
+import math
+import sys
+from array import array
+from collections import namedtuple
+from datetime import date
+
+from core import load_inventory, read_sales_log
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional: only forecasting needs it
+    np = None
+
+LEAD_TIME_DAYS = 7      # days between placing an order and receiving it
+REVIEW_DAYS = 7         # days until the next order opportunity
+SERVICE_Z = 1.65        # safety factor for a ~95% service level
+BLOCK_ROWS = 1 << 16    # rows per block: bounds the temporaries of mean/std
+EVENT_BATCH = 1 << 20   # sales buffered before each count of (product, day) cells
+
+Forecast = namedtuple("Forecast", ["velocity", "days_of_cover", "reorder_point", "suggested_order"])
+Forecast.__doc__ = """
+Per-product forecast arrays, aligned with the product codes.
+
+velocity: Average units sold per day over the window.
+days_of_cover: Days the current stock lasts at that velocity (inf if nothing sold).
+reorder_point: Stock level at which to order: lead-time demand plus safety stock.
+suggested_order: Units to order now to cover lead time and review period (0 if above the reorder point).
+"""
+
+
+def numpy_available():
+    return np is not None
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("Forecasting requires NumPy installed")
+
+
+def daily_sales_totals(sales, product_codes, end_day, days=365):
+    """
+    Sum each product's daily sales, and their squares, over the `days` days ending on end_day.
+
+    Args:
+        sales: Iterable of (sold_on, product_id), e.g. core.read_sales_log(path).
+            Sales of unknown products, undated sales and days outside the window are skipped.
+        product_codes: Dict mapping product_id to its row (0..n-1).
+        end_day: Last day of the window (a date).
+        days: Window length in days.
+
+    Returns:
+        (totals, squares) float64 arrays of length len(product_codes): units sold in the
+        window, and the sum over days of (units sold that day) ** 2.
+    """
+    _require_numpy()
+    first = end_day.toordinal() - days + 1
+    cells = array("q")          # row * days + column, one per sale
+    parts = []                  # (sorted cells, sales per cell) still to merge
+    merged = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+    pending = 0
+    last_day, column = None, -1
+
+    def flush():
+        nonlocal merged, pending
+        part = np.unique(np.array(cells, dtype=np.int64), return_counts=True)
+        del cells[:]
+        parts.append(part)
+        pending += len(part[0])
+        # Re-merging only once the parts outgrow the merged cells keeps the sorting amortized
+        if pending >= len(merged[0]):
+            merged = _merge_cells([merged, *parts])
+            parts.clear()
+            pending = 0
+
+    for sold_on, product_id in sales:
+        # read_sales_log reuses the date object for consecutive sales of the same day
+        if sold_on is not last_day:
+            last_day = sold_on
+            column = sold_on.toordinal() - first if sold_on is not None else -1
+        row = product_codes.get(product_id)
+        if row is None or not 0 <= column < days:
+            continue
+        cells.append(row * days + column)
+        if len(cells) >= EVENT_BATCH:
+            flush()
+    if cells:
+        flush()
+    keys, counts = _merge_cells([merged, *parts])
+    rows = keys // days
+    counts = counts.astype(np.float64)
+    totals = np.bincount(rows, weights=counts, minlength=len(product_codes))
+    squares = np.bincount(rows, weights=counts * counts, minlength=len(product_codes))
+    return totals, squares
+
+
+def _merge_cells(parts):
+    """Merge (cells, counts) pairs into one sorted pair with each cell once."""
+    keys = np.concatenate([part[0] for part in parts])
+    counts = np.concatenate([part[1] for part in parts])
+    unique, inverse = np.unique(keys, return_inverse=True)
+    return unique, np.bincount(inverse, weights=counts, minlength=len(unique)).astype(np.int64)
+
+
+def forecast(daily, quantities, **params):
+    """
+    Compute the reorder forecast for every product from a dense daily sales matrix.
+
+    Args:
+        daily: Array (products x days) of units sold per day.
+        quantities: Current stock per product, aligned with the rows of daily.
+        **params: lead_time_days, review_days and service_z for forecast_from_totals().
+
+    Returns:
+        Forecast of float64 arrays (suggested_order is int64).
+    """
+    _require_numpy()
+    count, days = daily.shape
+    totals = np.empty(count)
+    squares = np.empty(count)
+    for start in range(0, count, BLOCK_ROWS):
+        block = daily[start:start + BLOCK_ROWS].astype(np.float64)
+        totals[start:start + BLOCK_ROWS] = block.sum(axis=1)
+        squares[start:start + BLOCK_ROWS] = np.einsum("ij,ij->i", block, block)
+    return forecast_from_totals(totals, squares, days, quantities, **params)
+
+
+def forecast_from_totals(totals, squares, days, quantities, lead_time_days=LEAD_TIME_DAYS,
+                         review_days=REVIEW_DAYS, service_z=SERVICE_Z):
+    """
+    Compute the reorder forecast for every product from its daily sales totals.
+
+    Args:
+        totals: Units sold per product over the window (see daily_sales_totals).
+        squares: Sum over the window's days of the squared daily units, per product.
+        days: Window length in days.
+        quantities: Current stock per product, aligned with totals.
+        lead_time_days: Days from ordering to receiving stock.
+        review_days: Days until the next chance to order.
+        service_z: Safety factor applied to the demand deviation over the lead time.
+
+    Returns:
+        Forecast of float64 arrays (suggested_order is int64).
+    """
+    _require_numpy()
+    velocity = np.asarray(totals, dtype=np.float64) / days
+    # Population variance E[x^2] - E[x]^2; rounding can leave it slightly below zero
+    deviation = np.sqrt(np.clip(np.asarray(squares, dtype=np.float64) / days - velocity * velocity, 0, None))
+    stock = np.asarray(quantities, dtype=np.float64)
+    with np.errstate(divide="ignore"):
+        days_of_cover = np.where(velocity > 0, stock / velocity, np.inf)
+    reorder_point = velocity * lead_time_days + service_z * deviation * math.sqrt(lead_time_days)
+    order_up_to = reorder_point + velocity * review_days
+    suggested = np.where(stock <= reorder_point, np.ceil(order_up_to - stock), 0).clip(min=0).astype(np.int64)
+    return Forecast(velocity, days_of_cover, reorder_point, suggested)
+
+
+def forecast_inventory(inventory, sales, end_day=None, days=365, **params):
+    """
+    Forecast every product of an inventory from a sales stream.
+
+    Args:
+        inventory: Mapping product_id -> [product_name, quantity] (e.g. core.Inventory).
+        sales: Iterable of (sold_on, product_id).
+        end_day: Last day of the window (default: today).
+        days: Window length in days.
+        **params: lead_time_days, review_days and service_z for forecast().
+
+    Returns:
+        (product_ids, names, forecast) with product_ids and names aligned with the arrays.
+    """
+    _require_numpy()
+    product_ids, names, quantities = [], [], array("q")
+    for product_id, (name, quantity) in inventory.items():
+        product_ids.append(product_id)
+        names.append(name)
+        quantities.append(quantity)
+    codes = {product_id: row for row, product_id in enumerate(product_ids)}
+    totals, squares = daily_sales_totals(sales, codes, end_day or date.today(), days)
+    stock = np.frombuffer(quantities, dtype=np.int64)
+    return product_ids, names, forecast_from_totals(totals, squares, days, stock, **params)
+
+
+def most_urgent(result, k):
+    """Rows of the k products with the fewest days of cover among those that need ordering."""
+    _require_numpy()
+    candidates = np.flatnonzero(result.suggested_order > 0)
+    if k <= 0:
+        return candidates[:0]
+    if len(candidates) > k:
+        candidates = candidates[np.argpartition(result.days_of_cover[candidates], k - 1)[:k]]
+    return candidates[np.argsort(result.days_of_cover[candidates], kind="stable")]
+
+
+def urgent_report(product_ids, names, result, k=10):
+    """
+    List of dicts for the k most urgent products: product_id, product_name, velocity,
+    days_of_cover, reorder_point and suggested_order (JSON-ready).
+    """
+    return [
+        {
+            "product_id": product_ids[row],
+            "product_name": names[row],
+            "velocity": round(float(result.velocity[row]), 2),
+            "days_of_cover": round(float(result.days_of_cover[row]), 1),
+            "reorder_point": round(float(result.reorder_point[row]), 1),
+            "suggested_order": int(result.suggested_order[row]),
+        }
+        for row in most_urgent(result, k)
+    ]
+
+
+def write_summary(path, report):
+    """Write an urgent_report as JSON (the precomputed context read by ai_service)."""
+    with open(path, "w", encoding="utf-8") as out:
+        json.dump({"generated_on": date.today().isoformat(), "products": report}, out, ensure_ascii=False, indent=1)
+
+
+def main(argv):
+    if not argv:
+        print(__doc__)
+        return
+    sales_log = argv[0]
+    inventory = load_inventory(argv[1] if len(argv) > 1 else "inventory.csv")
+    product_ids, names, result = forecast_inventory(inventory, read_sales_log(sales_log))
+    report = urgent_report(product_ids, names, result, k=20)
+    if len(argv) > 2:
+        write_summary(argv[2], report)
+    for row in report:
+        print(f"{row['product_id']:10} {row['product_name'][:30]:30} {row['days_of_cover']:8.1f} days"
+              f"   order {row['suggested_order']}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
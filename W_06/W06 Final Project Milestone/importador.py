@@ -0,0 +1,137 @@
+"""
+Importación masiva de catálogos CSV (mismo formato que inventory.csv) en segundo plano.
+El trabajo lee directamente el temporal en que Starlette recibió el upload (sin copiarlo),
+como stream con csv.reader, y lo inserta/actualiza en la base por lotes con
+database.upsert_products.
+El progreso de cada trabajo se consulta por su job_id.
+"""
+
+import csv
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from database import DEFAULT_STORE, get_session, upsert_products
+
+TAMANO_LOTE = int(os.getenv("IMPORT_BATCH_SIZE", "2000"))
+MAX_TRABAJOS_GUARDADOS = 100
+
+# Un solo hilo: las importaciones se encolan y nunca ocupan los workers de las peticiones
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="importador")
+_trabajos: "OrderedDict[str, dict]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def leer_filas_csv(archivo):
+    """
+    Genera (product_id, name, quantity) desde un CSV de texto abierto, sin cargarlo entero.
+    Aplica las mismas reglas que core.load_inventory: se omiten filas sin product_id
+    y una cantidad inválida se toma como 0. Devuelve None para las filas omitidas
+    para que el llamador pueda contarlas.
+    """
+    reader = csv.reader(archivo)
+    encabezado = next(reader, None)
+    if encabezado is None:
+        return
+    columnas = {nombre.strip(): i for i, nombre in enumerate(encabezado)}
+    try:
+        i_id = columnas["product_id"]
+    except KeyError:
+        raise ValueError("El CSV debe tener la columna product_id")
+    i_nombre = columnas.get("product_name")
+    i_cantidad = columnas.get("quantity")
+    for fila in reader:
+        product_id = fila[i_id].strip() if i_id < len(fila) else ""
+        if not product_id:
+            yield None
+            continue
+        name = fila[i_nombre].strip() if i_nombre is not None and i_nombre < len(fila) else ""
+        try:
+            quantity = int(fila[i_cantidad])
+        except (IndexError, TypeError, ValueError):
+            quantity = 0
+        yield product_id, name, quantity
+
+
+def tomar_upload(origen) -> int:
+    """
+    Se queda con el contenido de un archivo subido sin copiarlo. origen es el
+    SpooledTemporaryFile de UploadFile.file: fileno() lo pasa a disco si aún estaba en
+    memoria (hasta 1 MB) y el descriptor duplicado que se devuelve, al inicio del archivo,
+    sigue siendo válido cuando Starlette cierra el suyo al terminar la petición.
+    """
+    origen.flush()
+    fd = os.dup(origen.fileno())
+    os.lseek(fd, 0, os.SEEK_SET)
+    return fd
+
+
+def iniciar_importacion(fd: int, store_id: str = DEFAULT_STORE) -> str:
+    """
+    Registra un trabajo para el CSV del descriptor fd (ver tomar_upload; se cierra al
+    terminar) y devuelve su job_id.
+    """
+    job_id = uuid.uuid4().hex
+    estado = {
+        "job_id": job_id,
+        "store_id": store_id,
+        "estado": "pendiente",
+        "bytes_total": os.fstat(fd).st_size,
+        "bytes_procesados": 0,
+        "filas_leidas": 0,
+        "insertadas": 0,
+        "actualizadas": 0,
+        "omitidas": 0,
+        "error": None,
+    }
+    with _lock:
+        _trabajos[job_id] = estado
+        while len(_trabajos) > MAX_TRABAJOS_GUARDADOS:
+            _trabajos.popitem(last=False)
+    _executor.submit(_ejecutar, fd, estado)
+    return job_id
+
+
+def estado_importacion(job_id: str, store_id: str = DEFAULT_STORE) -> dict | None:
+    """Devuelve una copia del progreso del trabajo, o None si no existe en esa tienda."""
+    with _lock:
+        estado = _trabajos.get(job_id)
+        return dict(estado) if estado and estado["store_id"] == store_id else None
+
+
+def _ejecutar(fd: int, estado: dict):
+    estado["estado"] = "procesando"
+    # open() toma el descriptor y lo cierra al salir del bloque; el temporal se borra solo
+    archivo = open(fd, encoding="utf-8-sig", newline="")
+    session = get_session()
+    try:
+        with archivo:
+            lote = []
+            for fila in leer_filas_csv(archivo):
+                estado["filas_leidas"] += 1
+                if fila is None:
+                    estado["omitidas"] += 1
+                    continue
+                lote.append(fila)
+                if len(lote) >= TAMANO_LOTE:
+                    # Posición aproximada (incluye el búfer de lectura) para el progreso
+                    _escribir_lote(session, lote, estado, os.lseek(archivo.fileno(), 0, os.SEEK_CUR))
+                    lote = []
+            _escribir_lote(session, lote, estado, estado["bytes_total"])
+        estado["estado"] = "completado"
+    except Exception as e:
+        print(f"[Importación] Error en {estado['job_id']}: {e}")
+        session.rollback()
+        estado["estado"] = "error"
+        estado["error"] = str(e)
+    finally:
+        session.close()
+
+
+def _escribir_lote(session, lote, estado, posicion):
+    insertadas, actualizadas = upsert_products(session, lote, estado["store_id"])
+    estado["insertadas"] += insertadas
+    estado["actualizadas"] += actualizadas
+    estado["bytes_procesados"] = posicion
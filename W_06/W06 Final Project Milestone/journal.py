@@ -0,0 +1,419 @@
+"""Write-ahead journal for the local inventory CSV.
+
+Each mutation is appended as one record to ``<csv>.journal`` instead of rewriting
+the whole CSV, so a stock update costs O(1) disk I/O. Records hold the final state
+of a product (set or delete), which makes replaying them idempotent. A background
+thread fsyncs the journal at most every ``fsync_interval`` seconds (group commit).
+When the journal grows past ``compact_bytes`` it is rotated and merged into a new
+snapshot CSV off the caller's thread, written to a temp file and renamed over the
+old one, so a crash never leaves a half-written inventory.csv. With ``binary_snapshot``
+enabled, loading maps ``<csv>.snap`` (see snapshot.py) instead of parsing the CSV,
+and the snapshot is rebuilt in the background after each compaction or when stale.
+"""
+
+import csv
+import io
+import os
+import tempfile
+import threading
+import time
+import zlib
+
+from core import HEADERS, Inventory, load_inventory
+from snapshot import build_snapshot, open_snapshot
+
+SET = "S"
+DELETE = "D"
+
+
+def _encode(op, product_id, name="", quantity=0):
+    """One journal line: op,product_id,name,quantity,crc32 of the first four fields."""
+    buffer = io.StringIO()
+    fields = [op, product_id, name, str(quantity)]
+    writer = csv.writer(buffer, lineterminator="")
+    writer.writerow(fields)
+    body = buffer.getvalue()
+    return f"{body},{zlib.crc32(body.encode('utf-8')):08x}\n"
+
+
+def read_records(path):
+    """
+    Yield (op, product_id, name, quantity) records from a journal file.
+
+    Replay stops at the first record that is incomplete or fails its checksum:
+    that is a write torn by a crash, and nothing after it was acknowledged by fsync.
+    """
+    try:
+        handle = open(path, encoding="utf-8", newline="")
+    except FileNotFoundError:
+        return
+    with handle:
+        for line in handle:
+            if not line.endswith("\n"):
+                return
+            body, _, crc = line[:-1].rpartition(",")
+            if not body or crc != f"{zlib.crc32(body.encode('utf-8')):08x}":
+                return
+            op, product_id, name, quantity = next(csv.reader([body]))
+            yield op, product_id, name, int(quantity)
+
+
+def apply_records(inventory, records):
+    """Apply journal records to an inventory mapping in order."""
+    for op, product_id, name, quantity in records:
+        if op == SET:
+            inventory[product_id] = [name, quantity]
+        else:
+            inventory.pop(product_id, None)
+
+
+class InventoryJournal:
+    """
+    Journal of inventory mutations on top of a snapshot CSV.
+
+    Args:
+        snapshot_path: The inventory CSV (same format as core.load_inventory).
+        fsync_interval: Maximum seconds a record waits before being fsynced.
+        compact_bytes: Journal size that triggers a background compaction.
+        binary_snapshot: Load from and maintain the binary snapshot next to the CSV.
+    """
+
+    # After a failed merge, wait this long before retrying it from the append path
+    COMPACT_RETRY_SECONDS = 5.0
+
+    def __init__(self, snapshot_path, fsync_interval=0.05, compact_bytes=1 << 20, binary_snapshot=True):
+        self.snapshot_path = os.fspath(snapshot_path)
+        self.journal_path = self.snapshot_path + ".journal"
+        self.compacting_path = self.snapshot_path + ".journal.compacting"
+        self.fsync_interval = fsync_interval
+        self.compact_bytes = compact_bytes
+        self.binary_snapshot = binary_snapshot
+        self._lock = threading.Lock()
+        self._pending = threading.Condition(self._lock)
+        self._file = None
+        self._size = 0
+        self._dirty = False
+        self._closing = False
+        self._flusher = None
+        self._compactor = None
+        self._snapshotter = None
+        self._retry_at = 0.0
+        self.compactions = 0
+
+    # --- loading ---
+
+    def load(self):
+        """
+        Load the snapshot, replay any journal left by a crash (including one that was
+        being compacted) and open the journal for appending. Returns an Inventory, or a
+        SnapshotInventory when the binary snapshot is up to date.
+        """
+        inventory = open_snapshot(self.snapshot_path) if self.binary_snapshot else None
+        stale = inventory is None
+        if stale:
+            inventory = load_inventory(self.snapshot_path) if os.path.exists(self.snapshot_path) else Inventory()
+        apply_records(inventory, read_records(self.compacting_path))
+        apply_records(inventory, read_records(self.journal_path))
+        if os.path.exists(self.compacting_path):
+            # A compaction did not finish: run it again before the new journal grows
+            self._start_merge()
+        elif stale and self.binary_snapshot and os.path.exists(self.snapshot_path):
+            self._snapshotter = threading.Thread(target=build_snapshot, args=(self.snapshot_path,),
+                                                 name="journal-snapshot", daemon=True)
+            self._snapshotter.start()
+        self._open_journal()
+        self._flusher = threading.Thread(target=self._flush_loop, name="journal-fsync", daemon=True)
+        self._flusher.start()
+        return inventory
+
+    def _open_journal(self):
+        # A torn tail would hide every record appended after it: keep only the valid prefix
+        valid = b"".join(_encode(*record).encode("utf-8") for record in read_records(self.journal_path))
+        with open(self.journal_path, "ab") as handle:
+            if handle.tell() != len(valid):
+                handle.truncate(len(valid))
+        self._file = open(self.journal_path, "a", encoding="utf-8", newline="")
+        self._size = self._file.tell()
+
+    # --- recording ---
+
+    def record_set(self, product_id, name, quantity):
+        """Record that product_id now has this name and quantity (add or update)."""
+        self._append(_encode(SET, product_id, name, quantity))
+
+    def record_delete(self, product_id):
+        """Record that product_id was deleted."""
+        self._append(_encode(DELETE, product_id))
+
+    def _append(self, line):
+        with self._lock:
+            self._file.write(line)
+            # Out of the process right away; fsync follows within fsync_interval
+            self._file.flush()
+            self._size += len(line.encode("utf-8"))
+            if not self._dirty:
+                self._dirty = True
+                self._pending.notify()
+            if self._size >= self.compact_bytes and self._compactor is None:
+                self._rotate()
+
+    def sync(self):
+        """Fsync every record appended so far."""
+        with self._lock:
+            self._sync_locked()
+
+    def _sync_locked(self):
+        if self._dirty and self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._dirty = False
+
+    def _flush_loop(self):
+        while True:
+            with self._lock:
+                while not self._dirty and not self._closing:
+                    self._pending.wait()
+                if self._closing:
+                    return
+            # Records appended during this pause share the same fsync
+            time.sleep(self.fsync_interval)
+            self.sync()
+
+    # --- compaction ---
+
+    def compact(self, wait=False):
+        """Rotate the journal and merge it into a new snapshot in the background."""
+        with self._lock:
+            running = self._compactor
+        if running is not None:
+            if not wait:
+                return
+            running.join()
+        while True:
+            with self._lock:
+                rotated = None
+                if self._compactor is None and (self._size or os.path.exists(self.compacting_path)):
+                    rotated = self._rotate(retry_now=True)
+                compactor = self._compactor
+            if not wait or compactor is None:
+                return
+            compactor.join()
+            # A retried merge only cleared the way: rotate the live journal next, unless it failed again
+            if rotated or os.path.exists(self.compacting_path):
+                return
+
+    def _rotate(self, retry_now=False):
+        """
+        Called with the lock held: later records go to a fresh journal. Returns False
+        (and only retries the merge) while a previously rotated journal is unmerged,
+        since rotating again would overwrite it and lose its records.
+        """
+        if os.path.exists(self.compacting_path):
+            if retry_now or time.monotonic() >= self._retry_at:
+                self._start_merge()
+            return False
+        self._dirty = True
+        self._sync_locked()
+        self._file.close()
+        os.replace(self.journal_path, self.compacting_path)
+        self._file = open(self.journal_path, "a", encoding="utf-8", newline="")
+        self._size = 0
+        self._start_merge()
+        return True
+
+    def _start_merge(self):
+        compactor = threading.Thread(target=self._merge, name="journal-compact", daemon=True)
+        self._compactor = compactor
+        compactor.start()
+
+    def _merge(self):
+        temp_path = None
+        try:
+            changes = {}
+            for op, product_id, name, quantity in read_records(self.compacting_path):
+                # Re-inserting moves the product to the end, as it does in the in-memory dict
+                changes.pop(product_id, None)
+                changes[product_id] = (name, quantity) if op == SET else None
+            directory = os.path.dirname(os.path.abspath(self.snapshot_path))
+            descriptor, temp_path = tempfile.mkstemp(prefix=".inventory-", suffix=".csv", dir=directory)
+            with os.fdopen(descriptor, "w", encoding="utf-8", newline="") as out:
+                writer = csv.writer(out)
+                writer.writerow(HEADERS)
+                handled = set()
+                for product_id, name, quantity in _snapshot_rows(self.snapshot_path):
+                    if product_id in handled:
+                        continue
+                    if product_id in changes:
+                        handled.add(product_id)
+                        change = changes[product_id]
+                        if change is None:
+                            continue
+                        name, quantity = change
+                    writer.writerow([product_id, name, quantity])
+                for product_id, change in changes.items():
+                    if product_id not in handled and change is not None:
+                        writer.writerow([product_id, *change])
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(temp_path, self.snapshot_path)
+            temp_path = None
+            _fsync_directory(directory)
+            os.remove(self.compacting_path)
+            self.compactions += 1
+            if self.binary_snapshot:
+                build_snapshot(self.snapshot_path)
+        except OSError as e:
+            # The rotated journal stays on disk: it is replayed on load and merged again before
+            # the next rotation (see _rotate)
+            print(f"[Journal] Compaction failed: {e}")
+            with self._lock:
+                self._retry_at = time.monotonic() + self.COMPACT_RETRY_SECONDS
+            if temp_path is not None:
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+        finally:
+            with self._lock:
+                self._compactor = None
+
+    def close(self):
+        """Fsync pending records, wait for background compaction and snapshot work, stop the flusher."""
+        with self._lock:
+            self._closing = True
+            self._sync_locked()
+            self._pending.notify()
+            compactor = self._compactor
+        for worker in (compactor, self._snapshotter, self._flusher):
+            if worker is not None:
+                worker.join()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def _snapshot_rows(path):
+    """Yield (product_id, name, quantity) from a snapshot CSV with core.load_inventory's rules."""
+    try:
+        handle = open(path, newline="", encoding="utf-8")
+    except FileNotFoundError:
+        return
+    with handle:
+        for row in csv.DictReader(handle):
+            product_id = (row.get("product_id") or "").strip()
+            if not product_id:
+                continue
+            try:
+                quantity = int(row.get("quantity", 0))
+            except (ValueError, TypeError):
+                quantity = 0
+            yield product_id, (row.get("product_name") or "").strip(), quantity
+
+
+def _fsync_directory(directory):
+    """Persist a rename on POSIX; directories cannot be opened for fsync on Windows."""
+    if os.name != "posix":
+        return
+    descriptor = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+
+class JournalWriter:
+    """
+    Writes journal records from a background thread so callers (the Tk event loop)
+    never wait on disk.
+
+    Changes queue in a dict keyed by product_id, so a burst of clicks on the same
+    product becomes one record. The thread waits ``coalesce_seconds`` after the first
+    change of a burst, writes everything queued, then fsyncs once.
+
+    Args:
+        journal: An InventoryJournal already loaded.
+        coalesce_seconds: How long a burst is collected before writing it.
+        retry_seconds: Pause before retrying after a write error.
+    """
+
+    def __init__(self, journal, coalesce_seconds=0.05, retry_seconds=1.0):
+        self._journal = journal
+        self.coalesce_seconds = coalesce_seconds
+        self.retry_seconds = retry_seconds
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._pending = {}
+        self._writing = False
+        self._closing = False
+        self.error = None
+        self.batches = 0
+        self._thread = threading.Thread(target=self._run, name="journal-writer", daemon=True)
+        self._thread.start()
+
+    def record_set(self, product_id, name, quantity):
+        """Queue the new name and quantity of product_id."""
+        self._put(product_id, (name, quantity))
+
+    def record_delete(self, product_id):
+        """Queue the deletion of product_id."""
+        self._put(product_id, None)
+
+    def _put(self, product_id, item):
+        with self._lock:
+            # The latest change of a product replaces the queued one and moves to the end
+            self._pending.pop(product_id, None)
+            self._pending[product_id] = item
+            self._wake.notify()
+
+    def state(self):
+        """'saving' while changes are queued or being written, 'error' after a failed write, else 'saved' or 'idle'."""
+        with self._lock:
+            if self.error is not None:
+                return "error"
+            if self._pending or self._writing:
+                return "saving"
+            return "saved" if self.batches else "idle"
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._pending and not self._closing:
+                    self._wake.wait()
+                if not self._pending:
+                    return
+            if not self._closing:
+                time.sleep(self.coalesce_seconds)
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                self._writing = True
+            error = None
+            try:
+                for product_id, item in batch.items():
+                    if item is None:
+                        self._journal.record_delete(product_id)
+                    else:
+                        self._journal.record_set(product_id, *item)
+                self._journal.sync()
+            except OSError as e:
+                error = e
+            with self._lock:
+                self._writing = False
+                self.error = error
+                if error is None:
+                    self.batches += 1
+                else:
+                    # Records are idempotent: requeue the batch unless a newer change replaced it
+                    for product_id, item in batch.items():
+                        self._pending.setdefault(product_id, item)
+            if error is not None:
+                print(f"[Journal] Write failed, retrying: {error}")
+                time.sleep(self.retry_seconds)
+
+    def close(self, timeout=None):
+        """Write everything still queued and stop the thread. Returns False if it did not finish in time."""
+        with self._lock:
+            self._closing = True
+            self._wake.notify()
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
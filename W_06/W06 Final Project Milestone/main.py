@@ -3,22 +3,43 @@ W06 Final Project Milestone - Fons Inventory Management System (LOCAL / OFFLINE
 Note: This application runs locally using 'inventory.csv'. 
 It does NOT sync with the Web/Cloud version deployed on Vercel.
 """
+import re
+import threading
 import tkinter as tk
-from tkinter import Frame, Label, Button, Entry, messagebox
+from tkinter import Frame, Label, Button, Entry, messagebox, filedialog
 # Asegúrate de tener este archivo number_entry.py en tu carpeta local
 from number_entry import IntEntry 
 from core import (
-    load_inventory,
+    apply_batch,
+    load_delivery_note,
     update_stock,
-    save_inventory,
     add_product,
     delete_product,
     get_out_of_stock_requested,
+    load_request_list,
+    read_sales_log,
 )
+from journal import InventoryJournal, JournalWriter
+from product_browser import ProductBrowser
+import forecast
 
 INVENTORY_FILE = "inventory.csv"
-pedidos_clientes = ["P001", "P002", "P004"]
-lista_deseos = ["P002", "P004"]
+# Un ID de producto por línea; se leen al iniciar la app
+PEDIDOS_FILE = "pedidos_clientes.txt"
+DESEOS_FILE = "lista_deseos.txt"
+# Una venta por línea: "AAAA-MM-DD,product_id" (core.read_sales_log)
+SALES_LOG_FILE = "ventas.log"
+# Resumen del pronóstico que ai_service puede leer como contexto (PRONOSTICO_PATH)
+FORECAST_SUMMARY_FILE = "pronostico.json"
+FORECAST_DAYS = 90
+FORECAST_POLL_MS = 100
+# Estado de guardado que se agrega al final de lbl_status
+SAVE_STATES = {"saving": "guardando…", "saved": "guardado", "error": "error al guardar, reintentando…"}
+SAVE_SEPARATOR = "  ·  "
+SAVE_POLL_MS = 100
+# IDs que se pueden escribir en "ID del Producto" (P001-P999)
+PRODUCT_ID_PATTERN = re.compile(r"P(\d{3})")
+BROWSER_ROWS = 20
 
 
 def main():
@@ -26,12 +47,26 @@ def main():
     frm_main = Frame(root)
     frm_main.master.title("Fons Inventory (Local Offline)")
     frm_main.pack(padx=8, pady=6, fill=tk.BOTH, expand=1)
-    inventory = load_inventory(INVENTORY_FILE)
-    populate_main_window(frm_main, inventory)
+    # Each change is appended to inventory.csv.journal; the CSV is rewritten in the background
+    journal = InventoryJournal(INVENTORY_FILE)
+    inventory = journal.load()
+    # The handlers only queue changes: disk writes happen off the Tk event loop
+    writer = JournalWriter(journal)
+    pedidos_clientes = load_request_list(PEDIDOS_FILE)
+    lista_deseos = load_request_list(DESEOS_FILE)
+    populate_main_window(frm_main, inventory, writer, pedidos_clientes, lista_deseos)
+
+    def on_close():
+        if not writer.close(timeout=10):
+            messagebox.showwarning("Guardar", "No se pudieron guardar los últimos cambios.")
+        journal.close()
+        root.destroy()
+
+    root.protocol("WM_DELETE_WINDOW", on_close)
     root.mainloop()
 
 
-def populate_main_window(frm_main, inventory):
+def populate_main_window(frm_main, inventory, writer, pedidos_clientes, lista_deseos):
     # --- Labels and entries ---
     lbl_product_id = Label(frm_main, text="ID del Producto (1-999):")
     lbl_name = Label(frm_main, text="Nombre (solo para registrar):")
@@ -50,6 +85,8 @@ def populate_main_window(frm_main, inventory):
     btn_delete = Button(frm_main, text="Eliminar Producto")
     btn_report = Button(frm_main, text="Reporte de Faltantes Pedidos")
     btn_urgent = Button(frm_main, text="Ver Compras Urgentes")
+    btn_import = Button(frm_main, text="Importar Nota de Entrega (CSV)")
+    btn_forecast = Button(frm_main, text="Pronóstico de Reposición")
 
     # --- Grid layout ---
     lbl_product_id.grid(row=0, column=0, padx=4, pady=3, sticky="e")
@@ -68,7 +105,30 @@ def populate_main_window(frm_main, inventory):
     # Row 6–7: reports
     btn_report.grid(row=6, column=0, columnspan=2, padx=4, pady=3, sticky="w")
     btn_urgent.grid(row=7, column=0, columnspan=2, padx=4, pady=3, sticky="w")
-    lbl_status.grid(row=8, column=0, columnspan=2, padx=4, pady=4, sticky="ew")
+    btn_import.grid(row=8, column=0, columnspan=2, padx=4, pady=3, sticky="w")
+    btn_forecast.grid(row=9, column=0, columnspan=2, padx=4, pady=3, sticky="w")
+    lbl_status.grid(row=10, column=0, columnspan=2, padx=4, pady=4, sticky="ew")
+
+    def edit_quantity(product_id, quantity):
+        # Edición en la tabla: se guarda igual que "Actualizar Stock"
+        name, current = inventory[product_id]
+        update_stock(inventory, product_id, quantity - current)
+        writer.record_set(product_id, name, quantity)
+        set_success(f"Stock actualizado: {name} = {quantity}.")
+
+    def select_product(product_id):
+        name, qty = inventory[product_id]
+        match = PRODUCT_ID_PATTERN.fullmatch(product_id)
+        if match and int(match[1]) >= 1:
+            ent_product_id.clear()
+            ent_product_id.set(int(match[1]))
+        lbl_result.config(text=f"{name}: {qty}")
+
+    # --- Product table (column 2, all rows) ---
+    browser = ProductBrowser(frm_main, inventory, on_edit=edit_quantity, on_select=select_product,
+                             height=BROWSER_ROWS)
+    browser.grid(row=0, column=2, rowspan=11, padx=8, pady=3, sticky="nsew")
+    frm_main.columnconfigure(2, weight=1)
 
     def clear_fields_and_status():
         ent_product_id.clear()
@@ -93,8 +153,9 @@ def populate_main_window(frm_main, inventory):
         product_id = f"P{product_id_num:03d}"
         try:
             update_stock(inventory, product_id, change)
-            save_inventory(INVENTORY_FILE, inventory)
             name, qty = inventory[product_id]
+            writer.record_set(product_id, name, qty)
+            browser.refresh()
             lbl_result.config(text=f"{name}: {qty}")
             set_success("Stock actualizado.")
         except KeyError as e:
@@ -118,7 +179,8 @@ def populate_main_window(frm_main, inventory):
         product_id = f"P{product_id_num:03d}"
         try:
             add_product(inventory, product_id, name, quantity)
-            save_inventory(INVENTORY_FILE, inventory)
+            writer.record_set(product_id, *inventory[product_id])
+            browser.product_added(product_id)
             set_success("Producto registrado.")
         except ValueError as e:
             lbl_status.config(text=str(e), fg="red")
@@ -134,11 +196,35 @@ def populate_main_window(frm_main, inventory):
         product_id = f"P{product_id_num:03d}"
         try:
             delete_product(inventory, product_id)
-            save_inventory(INVENTORY_FILE, inventory)
+            writer.record_delete(product_id)
+            browser.product_removed(product_id)
             set_success("Producto eliminado.")
         except KeyError as e:
             lbl_status.config(text=str(e), fg="red")
 
+    def import_delivery_note():
+        filename = filedialog.askopenfilename(title="Nota de entrega", filetypes=[("CSV", "*.csv")])
+        if not filename:
+            return
+        try:
+            lines = load_delivery_note(filename)
+        except (OSError, UnicodeDecodeError) as e:
+            lbl_status.config(text=f"No se pudo leer la nota: {e}", fg="red")
+            return
+        # Todo o nada: si una línea falla no se cambia ningún producto
+        result = apply_batch(inventory, lines)
+        if not result.applied:
+            errores = sorted(result.errors.items())
+            detalle = "\n".join(f"Línea {n + 1} ({lines[n][0]}): {msg}" for n, msg in errores[:10])
+            if len(errores) > 10:
+                detalle += f"\n... y {len(errores) - 10} errores más"
+            messagebox.showerror("Nota de entrega", f"No se aplicó ningún cambio.\n\n{detalle}")
+            return
+        for product_id, qty in result.changed.items():
+            writer.record_set(product_id, inventory[product_id][0], qty)
+        browser.refresh()
+        set_success(f"Nota aplicada: {result.lines} líneas, {len(result.changed)} productos.")
+
     def clear():
         btn_clear.focus()
         clear_fields_and_status()
@@ -154,13 +240,73 @@ def populate_main_window(frm_main, inventory):
         msg = f"Lista de deseos agotada: {', '.join(faltantes)}" if faltantes else "Inventario al día"
         messagebox.showinfo("Compras Urgentes", msg)
 
+    def show_forecast():
+        if not forecast.numpy_available():
+            messagebox.showinfo("Pronóstico", "El pronóstico requiere NumPy instalado.")
+            return
+        # The sales log and the forecast run in a worker; it gets a copy of the rows so the
+        # handlers can keep editing the inventory meanwhile
+        rows = {product_id: (name, qty) for product_id, name, qty in inventory.rows()}
+        outcome = {}
+        worker = threading.Thread(target=run_forecast, args=(rows, outcome), name="pronostico", daemon=True)
+        btn_forecast.config(state=tk.DISABLED)
+        worker.start()
+        frm_main.after(FORECAST_POLL_MS, show_forecast_result, worker, outcome)
+
+    def show_forecast_result(worker, outcome):
+        # Tk is not thread-safe: poll the worker from the event loop, like show_save_state
+        if worker.is_alive():
+            frm_main.after(FORECAST_POLL_MS, show_forecast_result, worker, outcome)
+            return
+        btn_forecast.config(state=tk.NORMAL)
+        if "error" in outcome:
+            messagebox.showinfo("Pronóstico", outcome["error"])
+            return
+        report = outcome["report"]
+        lineas = [f"{p['product_name']}: {p['days_of_cover']:g} días, pedir {p['suggested_order']}" for p in report]
+        if not lineas:
+            lineas = ["Ningún producto necesita reposición."]
+        if "warning" in outcome:
+            lineas += ["", outcome["warning"]]
+        messagebox.showinfo("Pronóstico de Reposición", "\n".join(lineas))
+
     btn_update.config(command=do_update)
     btn_clear.config(command=clear)
     btn_add.config(command=do_add)
     btn_delete.config(command=do_delete)
     btn_report.config(command=show_missing_report)
     btn_urgent.config(command=show_urgent_purchases)
+    btn_import.config(command=import_delivery_note)
+    btn_forecast.config(command=show_forecast)
     ent_product_id.focus()
 
+    def show_save_state():
+        # Tk is not thread-safe: poll the writer from the event loop instead of calling back
+        text = lbl_status.cget("text")
+        message = text.split(SAVE_SEPARATOR)[0]
+        state = SAVE_STATES.get(writer.state())
+        updated = f"{message}{SAVE_SEPARATOR}{state}" if state and message else (message or state or "")
+        if updated != text:
+            lbl_status.config(text=updated)
+        frm_main.after(SAVE_POLL_MS, show_save_state)
+
+    show_save_state()
+
+def run_forecast(rows, outcome):
+    """
+    Forecast worker (no Tk calls): fills outcome with "report" (forecast.urgent_report) or
+    "error", plus "warning" if the summary for ai_service could not be written.
+    """
+    try:
+        ids, names, result = forecast.forecast_inventory(rows, read_sales_log(SALES_LOG_FILE), days=FORECAST_DAYS)
+    except (OSError, ValueError) as e:
+        outcome["error"] = f"No se pudo leer {SALES_LOG_FILE}: {e}"
+        return
+    outcome["report"] = report = forecast.urgent_report(ids, names, result, k=10)
+    try:
+        forecast.write_summary(FORECAST_SUMMARY_FILE, report)
+    except OSError as e:
+        outcome["warning"] = f"No se pudo guardar {FORECAST_SUMMARY_FILE}: {e}"
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,48 @@
+"""
+Contadores de métricas en memoria, exportados en formato de texto de Prometheus
+por el endpoint /metrics de server.py.
+"""
+
+import threading
+from collections import defaultdict
+
+_lock = threading.Lock()
+_contadores: "defaultdict[tuple, int]" = defaultdict(int)
+_ayudas: dict[str, str] = {}
+
+
+def registrar(nombre: str, ayuda: str):
+    """Declara un contador con su descripción (aparece en # HELP)."""
+    _ayudas[nombre] = ayuda
+
+
+def incrementar(nombre: str, cantidad: int = 1, **etiquetas: str):
+    """Suma cantidad al contador nombre con las etiquetas dadas."""
+    clave = (nombre, tuple(sorted(etiquetas.items())))
+    with _lock:
+        _contadores[clave] += cantidad
+
+
+def valor(nombre: str, **etiquetas: str) -> int:
+    with _lock:
+        return _contadores.get((nombre, tuple(sorted(etiquetas.items()))), 0)
+
+
+def exportar_prometheus() -> str:
+    """Devuelve todos los contadores en el formato de exposición de Prometheus."""
+    with _lock:
+        copia = sorted(_contadores.items())
+    lineas = []
+    vistos = set()
+    for (nombre, etiquetas), cantidad in copia:
+        if nombre not in vistos:
+            vistos.add(nombre)
+            if nombre in _ayudas:
+                lineas.append(f"# HELP {nombre} {_ayudas[nombre]}")
+            lineas.append(f"# TYPE {nombre} counter")
+        if etiquetas:
+            texto = ",".join(f'{k}="{v}"' for k, v in etiquetas)
+            lineas.append(f"{nombre}{{{texto}}} {cantidad}")
+        else:
+            lineas.append(f"{nombre} {cantidad}")
+    return "\n".join(lineas) + "\n"
@@ -0,0 +1,97 @@
+"""
+Script de migración a multi-tienda: agrega la columna store_id a products, asigna
+DEFAULT_STORE a las filas existentes y reemplaza el índice único de product_id por
+los índices compuestos (store_id, product_id) y (store_id, id).
+
+Con --particionar N (solo PostgreSQL) reconstruye la tabla particionada por
+HASH(store_id) en N particiones; las consultas filtran siempre por store_id,
+así que PostgreSQL lee solo la partición de la tienda.
+
+Ejecutar una vez: python migrate_multistore.py [--particionar 16]
+"""
+
+import re
+import sys
+
+from sqlalchemy import inspect, text
+
+from database import DEFAULT_STORE, engine
+
+
+def migrar_multistore(motor=engine, particiones: int = 0) -> list[str]:
+    """
+    Aplica la migración (es idempotente) y devuelve la lista de pasos ejecutados.
+    """
+    if not re.fullmatch(r"[A-Za-z0-9_-]{1,50}", DEFAULT_STORE):
+        raise ValueError(f"DEFAULT_STORE inválido: {DEFAULT_STORE!r}")
+    es_postgres = motor.dialect.name == "postgresql"
+    insp = inspect(motor)
+    columnas = {c["name"] for c in insp.get_columns("products")}
+    pasos = []
+
+    with motor.begin() as conn:
+        if "store_id" not in columnas:
+            pasos.append(
+                f"ALTER TABLE products ADD COLUMN store_id VARCHAR(50) NOT NULL DEFAULT '{DEFAULT_STORE}'"
+            )
+        for indice in insp.get_indexes("products"):
+            if indice["unique"] and indice["column_names"] == ["product_id"]:
+                pasos.append(f'DROP INDEX "{indice["name"]}"')
+        if es_postgres:
+            for restriccion in insp.get_unique_constraints("products"):
+                if restriccion["column_names"] == ["product_id"]:
+                    pasos.append(f'ALTER TABLE products DROP CONSTRAINT "{restriccion["name"]}"')
+        pasos.append(
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_products_store_product ON products (store_id, product_id)"
+        )
+        pasos.append("CREATE INDEX IF NOT EXISTS ix_products_store_id_id ON products (store_id, id)")
+        for paso in pasos:
+            conn.execute(text(paso))
+
+    if particiones:
+        if not es_postgres:
+            raise ValueError("El particionado declarativo solo está disponible en PostgreSQL")
+        pasos += _particionar_postgres(motor, particiones)
+    return pasos
+
+
+def _particionar_postgres(motor, particiones: int) -> list[str]:
+    """Reconstruye products como tabla particionada por HASH(store_id), copiando las filas."""
+    with motor.connect() as conn:
+        ya_particionada = conn.execute(text(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'products'::regclass"
+        )).first()
+        secuencia = conn.execute(text("SELECT pg_get_serial_sequence('products', 'id')")).scalar()
+    if ya_particionada:
+        return []
+
+    pasos = [
+        "ALTER TABLE products RENAME TO products_sin_particion",
+        "CREATE TABLE products (LIKE products_sin_particion INCLUDING DEFAULTS) PARTITION BY HASH (store_id)",
+    ]
+    pasos += [
+        f"CREATE TABLE products_p{i} PARTITION OF products FOR VALUES WITH (MODULUS {particiones}, REMAINDER {i})"
+        for i in range(particiones)
+    ]
+    pasos.append("INSERT INTO products SELECT * FROM products_sin_particion")
+    if secuencia:
+        # La secuencia del id es propiedad de la tabla vieja: la pasamos a la nueva antes de borrarla
+        pasos.append(f"ALTER SEQUENCE {secuencia} OWNED BY products.id")
+    pasos += [
+        "DROP TABLE products_sin_particion",
+        # La clave de partición debe formar parte de la clave primaria y de las restricciones únicas
+        "ALTER TABLE products ADD PRIMARY KEY (store_id, id)",
+        "ALTER TABLE products ADD CONSTRAINT uq_products_store_product UNIQUE (store_id, product_id)",
+    ]
+    with motor.begin() as conn:
+        for paso in pasos:
+            conn.execute(text(paso))
+    return pasos
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[sys.argv.index("--particionar") + 1]) if "--particionar" in sys.argv else 0
+    print(f"Migrando products a multi-tienda (tienda por defecto: {DEFAULT_STORE})...")
+    for paso in migrar_multistore(particiones=n):
+        print(f"  {paso}")
+    print("Listo.")
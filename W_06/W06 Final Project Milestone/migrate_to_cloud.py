@@ -7,7 +7,7 @@ Ejecutar una vez después de configurar DATABASE_URL en .env.
 import csv
 from pathlib import Path
 
-from database import Base, engine, get_session
+from database import DEFAULT_STORE, Base, engine, get_session, reconstruir_estadisticas, siguiente_version
 from models import Product
 
 
@@ -28,6 +28,8 @@ def migrate_csv_to_cloud(csv_path: str | Path | None = None) -> tuple[int, int]:
     omitidos = 0
 
     try:
+        # Todas las filas de la migración comparten una versión del feed de cambios
+        version = siguiente_version(session, DEFAULT_STORE)
         with open(csv_path, encoding="utf-8", newline="") as f:
             reader = csv.DictReader(f)
             for row in reader:
@@ -41,17 +43,23 @@ def migrate_csv_to_cloud(csv_path: str | Path | None = None) -> tuple[int, int]:
                 if not product_id:
                     continue
 
-                existing = session.query(Product).filter(Product.product_id == product_id).first()
+                existing = (
+                    session.query(Product)
+                    .filter(Product.store_id == DEFAULT_STORE, Product.product_id == product_id)
+                    .first()
+                )
                 if existing:
                     omitidos += 1
                     continue
 
                 session.add(
-                    Product(product_id=product_id, name=name, quantity=quantity)
+                    Product(product_id=product_id, name=name, quantity=quantity, version=version)
                 )
                 insertados += 1
 
         session.commit()
+        # Las filas se insertaron sin pasar por las funciones CRUD: recalcular el resumen
+        reconstruir_estadisticas(session, DEFAULT_STORE)
     finally:
         session.close()
 
@@ -0,0 +1,45 @@
+"""
+Script de migración para el feed de cambios: agrega a products las columnas version,
+deleted (tombstone) y updated_at con el índice (store_id, version), y deja todas las
+filas existentes en la versión 1 para que /productos/cambios?desde=0 las devuelva.
+Requiere haber ejecutado antes migrate_multistore.py.
+
+Ejecutar una vez: python migrate_versiones.py
+"""
+
+from sqlalchemy import inspect, text
+
+from database import Base, ahora_utc, engine
+
+
+def migrar_versiones(motor=engine) -> list[str]:
+    """Aplica la migración (es idempotente) y devuelve la lista de pasos ejecutados."""
+    Base.metadata.create_all(bind=motor)  # crea store_versions si falta
+    columnas = {c["name"] for c in inspect(motor).get_columns("products")}
+    pasos = []
+    if "version" not in columnas:
+        pasos += [
+            "ALTER TABLE products ADD COLUMN version BIGINT NOT NULL DEFAULT 0",
+            "UPDATE products SET version = 1",
+            "INSERT INTO store_versions (store_id, version, purged_version) "
+            "SELECT DISTINCT store_id, 1, 0 FROM products",
+        ]
+    if "deleted" not in columnas:
+        pasos.append("ALTER TABLE products ADD COLUMN deleted BOOLEAN NOT NULL DEFAULT false")
+    if "updated_at" not in columnas:
+        # SQLite no acepta un DEFAULT no constante en ADD COLUMN: usamos la hora de la migración
+        pasos.append(
+            f"ALTER TABLE products ADD COLUMN updated_at TIMESTAMP NOT NULL DEFAULT '{ahora_utc():%Y-%m-%d %H:%M:%S}'"
+        )
+    pasos.append("CREATE INDEX IF NOT EXISTS ix_products_store_version ON products (store_id, version)")
+    with motor.begin() as conn:
+        for paso in pasos:
+            conn.execute(text(paso))
+    return pasos
+
+
+if __name__ == "__main__":
+    print("Migrando products para el feed de cambios...")
+    for paso in migrar_versiones():
+        print(f"  {paso}")
+    print("Listo.")
@@ -2,22 +2,34 @@
 Modelos SQLAlchemy para la base de datos.
 """
 
-from sqlalchemy import Integer, String
+from datetime import datetime
+
+from sqlalchemy import BigInteger, Boolean, DateTime, Index, Integer, String, UniqueConstraint
 from sqlalchemy.orm import Mapped, mapped_column
 
-from database import Base
+from database import DEFAULT_STORE, Base, ahora_utc
 
 
 class Product(Base):
     """Tabla de productos del inventario (esquema público)."""
 
     __tablename__ = "products"
-    __table_args__ = {"schema": "public"}
+    __table_args__ = (
+        UniqueConstraint("store_id", "product_id", name="uq_products_store_product"),
+        Index("ix_products_store_id_id", "store_id", "id"),
+        Index("ix_products_store_version", "store_id", "version"),
+        {"schema": "public"},
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    product_id: Mapped[str] = mapped_column(String(20), unique=True, nullable=False, index=True)
+    store_id: Mapped[str] = mapped_column(String(50), nullable=False, default=DEFAULT_STORE)
+    product_id: Mapped[str] = mapped_column(String(20), nullable=False)
     name: Mapped[str] = mapped_column(String(255), nullable=False)
     quantity: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    version: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    deleted: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=ahora_utc, onupdate=ahora_utc)
 
     def __repr__(self) -> str:
-        return f"Product(product_id={self.product_id!r}, name={self.name!r}, quantity={self.quantity})"
+        return (f"Product(store_id={self.store_id!r}, product_id={self.product_id!r}, "
+                f"name={self.name!r}, quantity={self.quantity})")
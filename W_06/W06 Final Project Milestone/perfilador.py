@@ -0,0 +1,267 @@
+"""
+Perfilador por muestreo para peticiones de la API (opt-in).
+Mientras dura una petición perfilada, un hilo toma cada PROFILE_INTERVAL_MS las pilas
+(sys._current_frames()) de los hilos que están atendiendo esa petición: los del pool que
+corren algo enviado por ella (dependencias, endpoint, validación de la respuesta; ver
+_instalar_en_pool) y el del event loop mientras ejecuta su tarea (serialización, endpoints
+async). Los hilos de peticiones concurrentes no se muestrean. Al terminar guarda las pilas en
+PROFILE_DIR como pilas colapsadas (una línea "f1;f2;f3 n" por pila, para flamegraph.pl
+o speedscope) y como JSON de speedscope. Se activa con la cabecera X-Profile igual a
+PROFILE_TOKEN o para 1 de cada PROFILE_SAMPLE_N peticiones; apagado solo cuesta una
+comparación por petición.
+"""
+
+import hmac
+import inspect
+import itertools
+import json
+import os
+import re
+import sys
+import sysconfig
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+import anyio.to_thread
+
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_SAMPLE_N = int(os.getenv("PROFILE_SAMPLE_N", "0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "perfiles")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+
+_contador = itertools.count(1)
+# Un perfil a la vez: acota el costo del muestreo bajo carga
+_lock_perfil = threading.Lock()
+# Perfil de la petición en curso (lo fija MiddlewarePerfil); anyio copia el contexto a los hilos del pool
+perfil_actual: ContextVar["Perfil | None"] = ContextVar("perfil_actual", default=None)
+# Frames de la biblioteca estándar, del pool de hilos y del servidor: un hilo con solo
+# estos frames está ocioso esperando trabajo y no aporta a la pila de la petición
+_STDLIB = (sysconfig.get_paths()["stdlib"], "<frozen")
+_SITE_PACKAGES = sysconfig.get_paths()["purelib"]
+_PAQUETES_OCIOSOS = (f"{os.sep}anyio{os.sep}", f"{os.sep}uvicorn{os.sep}")
+# Hilos de fondo (purga, buffers) dormidos en una espera de la biblioteca estándar
+_ESPERAS = {("threading.py", "wait"), ("queue.py", "get"), ("selectors.py", "select")}
+
+
+def iniciar(token: str | None) -> "Perfil | None":
+    """Devuelve un Perfil ya muestreando si esta petición debe perfilarse, si no None."""
+    por_token = bool(PROFILE_TOKEN and token) and hmac.compare_digest(token, PROFILE_TOKEN)
+    por_muestreo = PROFILE_SAMPLE_N > 0 and next(_contador) % PROFILE_SAMPLE_N == 0
+    if not (por_token or por_muestreo):
+        return None
+    if not _lock_perfil.acquire(blocking=False):
+        return None
+    perfil = Perfil(PROFILE_INTERVAL_MS / 1000)
+    perfil.iniciar()
+    return perfil
+
+
+@contextmanager
+def hilo_de_peticion():
+    """Mientras dura el bloque, el hilo actual se muestrea si la petición se está perfilando."""
+    perfil = perfil_actual.get()
+    if perfil is None:
+        yield
+        return
+    id_hilo = threading.get_ident()
+    perfil.hilos.add(id_hilo)
+    try:
+        yield
+    finally:
+        perfil.hilos.discard(id_hilo)
+
+
+def _instalar_en_pool():
+    """
+    Envuelve anyio.to_thread.run_sync (por donde FastAPI y Starlette mandan al pool las
+    dependencias, los endpoints síncronos y la validación de la respuesta) para que lo que se
+    envía durante una petición perfilada corra dentro de hilo_de_peticion. Sin perfil activo
+    solo agrega una lectura de perfil_actual.
+    """
+    original = anyio.to_thread.run_sync
+    if getattr(original, "perfilador", False):
+        return
+
+    @wraps(original)
+    async def run_sync(func, *args, **kwargs):
+        if perfil_actual.get() is not None:
+            func = _marcar_hilo(func)
+        return await original(func, *args, **kwargs)
+
+    run_sync.perfilador = True
+    anyio.to_thread.run_sync = run_sync
+
+
+def _marcar_hilo(func):
+    @wraps(func)
+    def envoltura(*args, **kwargs):
+        with hilo_de_peticion():
+            return func(*args, **kwargs)
+    return envoltura
+
+
+class MiddlewarePerfil:
+    """
+    Middleware ASGI que perfila las peticiones HTTP elegidas por iniciar(). Debe quedar por
+    dentro de los middlewares que corren la app en otra tarea (BaseHTTPMiddleware): el hilo
+    del event loop solo se muestrea cuando el frame de este middleware está en su pila.
+    resolver_ruta(scope) da la plantilla de la ruta para nombrar los archivos.
+    """
+
+    def __init__(self, app, resolver_ruta=None):
+        self.app = app
+        self.resolver_ruta = resolver_ruta
+        _instalar_en_pool()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not (PROFILE_TOKEN or PROFILE_SAMPLE_N > 0):
+            return await self.app(scope, receive, send)
+        token = None
+        for nombre, valor in scope["headers"]:
+            if nombre == b"x-profile":
+                token = valor.decode("latin-1")
+                break
+        perfil = iniciar(token)
+        if perfil is None:
+            return await self.app(scope, receive, send)
+        perfil.hilo_loop = threading.get_ident()
+        perfil.frame_raiz = sys._getframe()
+        marca = perfil_actual.set(perfil)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            perfil_actual.reset(marca)
+            perfil.detener()
+            perfil.frame_raiz = None
+            ruta = (self.resolver_ruta(scope) if self.resolver_ruta else None) or "sin_ruta"
+            try:
+                await anyio.to_thread.run_sync(perfil.guardar, ruta)
+            except Exception as e:
+                # El perfil es diagnóstico: si no se puede escribir, la respuesta no cambia
+                print(f"[Perfil Error] {ruta}: {e}")
+
+
+def _es_ocioso(archivo: str) -> bool:
+    if archivo.startswith(_STDLIB) and not archivo.startswith(_SITE_PACKAGES):
+        return True
+    return any(p in archivo for p in _PAQUETES_OCIOSOS)
+
+
+def _pila(frame, raiz=None) -> tuple | None:
+    """
+    Pila raíz→hoja de (función, archivo, línea de definición), o None si el hilo está ocioso.
+    Con raiz, la pila empieza en ese frame y es None si raiz no está en ella.
+    """
+    pila = []
+    ocioso = True
+    while frame is not None:
+        codigo = frame.f_code
+        if ocioso and not _es_ocioso(codigo.co_filename):
+            ocioso = False
+        pila.append((codigo.co_name, codigo.co_filename, codigo.co_firstlineno))
+        if frame is raiz:
+            break
+        frame = frame.f_back
+    else:
+        if raiz is not None:
+            return None
+    hoja = pila[0]
+    if ocioso or (os.path.basename(hoja[1]), hoja[0]) in _ESPERAS:
+        return None
+    pila.reverse()
+    return tuple(pila)
+
+
+class Perfil:
+    """Muestreo de pilas de una petición; las pilas iguales se cuentan en un Counter."""
+
+    def __init__(self, intervalo_s: float):
+        self._intervalo = intervalo_s
+        self._parar = threading.Event()
+        self._hilo = threading.Thread(target=self._muestrear, name="perfilador", daemon=True)
+        self.muestras: Counter = Counter()
+        self.hilos: set[int] = set()   # hilos del pool atendiendo la petición ahora
+        self.hilo_loop: int | None = None   # hilo del event loop y frame del middleware:
+        self.frame_raiz = None              # el loop cuenta solo mientras corre esta petición
+        self.inicio = 0.0
+        self.duracion = 0.0
+
+    def iniciar(self):
+        self.inicio = time.perf_counter()
+        self._hilo.start()
+
+    def detener(self):
+        """Detiene el muestreo y libera el turno para el siguiente perfil."""
+        self._parar.set()
+        self._hilo.join()
+        self.duracion = time.perf_counter() - self.inicio
+        _lock_perfil.release()
+
+    def _muestrear(self):
+        while not self._parar.wait(self._intervalo):
+            hilos = tuple(self.hilos)
+            frames = sys._current_frames()
+            for id_hilo in hilos:
+                frame = frames.get(id_hilo)
+                if frame is None:
+                    continue
+                pila = _pila(frame)
+                if pila is not None:
+                    self.muestras[pila] += 1
+            frame = frames.get(self.hilo_loop)
+            if frame is not None and self.frame_raiz is not None:
+                pila = _pila(frame, self.frame_raiz)
+                if pila is not None:
+                    self.muestras[pila] += 1
+            del frames, frame
+
+    def guardar(self, ruta: str, directorio: str | None = None) -> str:
+        """
+        Agrega las pilas al archivo colapsado de la ruta y escribe un JSON de speedscope
+        de esta petición en directorio (PROFILE_DIR por defecto). Devuelve la ruta del JSON.
+        """
+        directorio = directorio or PROFILE_DIR
+        os.makedirs(directorio, exist_ok=True)
+        base = os.path.join(directorio, re.sub(r"[^A-Za-z0-9_-]+", "_", ruta).strip("_") or "raiz")
+        with open(base + ".collapsed", "a", encoding="utf-8") as archivo:
+            for pila, cantidad in self.muestras.items():
+                nombres = ";".join(f"{nombre} ({os.path.basename(archivo_py)}:{linea})"
+                                   for nombre, archivo_py, linea in pila)
+                archivo.write(f"{nombres} {cantidad}\n")
+        destino = f"{base}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{int(self.inicio * 1e6)}.speedscope.json"
+        with open(destino, "w", encoding="utf-8") as archivo:
+            json.dump(self._speedscope(ruta), archivo)
+        return destino
+
+    def _speedscope(self, ruta: str) -> dict:
+        indices: dict[tuple, int] = {}
+        frames, muestras, pesos = [], [], []
+        paso_ms = self._intervalo * 1000
+        for pila, cantidad in self.muestras.items():
+            muestra = []
+            for frame in pila:
+                if frame not in indices:
+                    indices[frame] = len(frames)
+                    frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+                muestra.append(indices[frame])
+            muestras.append(muestra)
+            pesos.append(cantidad * paso_ms)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": ruta,
+            "exporter": "perfilador.py",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": ruta,
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": max(self.duracion * 1000, sum(pesos)),
+                "samples": muestras,
+                "weights": pesos,
+            }],
+        }
@@ -0,0 +1,383 @@
+"""Virtualized product table with search-as-you-type for the local Tk app.
+
+A ttk.Treeview with one item per product becomes unusable long before 1M rows, so
+ProductBrowser keeps only `height` items and repaints them from a window of the
+current view (the whole catalog or the results of a search) whenever it scrolls.
+The catalog view is a list of product ids extended lazily from the inventory:
+scrolling pages in at most PAGE_ROWS ids at once and the rest follow in after()
+slices, with placeholder rows until they arrive, so even a jump to the end of a
+1M-product catalog never blocks the event loop.
+
+The name index (search_index.NameIndex) is built on the Tk thread in small slices
+scheduled with after(), so the window stays responsive while a large catalog is
+indexed; until it is ready a search scans only the first SCAN_LIMIT products.
+"""
+
+import tkinter as tk
+from itertools import islice
+from tkinter import Label, ttk
+
+from number_entry import IntEntry
+from search_index import NameIndex, normalize
+
+SEARCH_LIMIT = 1000     # results shown for a query
+SEARCH_DELAY_MS = 150   # wait for a pause in typing before searching
+SCAN_LIMIT = 20000      # products scanned per query while the index is being built
+INDEX_CHUNK = 2000      # names indexed per after() slice (~20 ms)
+PAGE_ROWS = 5000        # product ids paged in (or skipped) from the inventory per slice
+QUANTITY_MAX = 10 ** 9
+
+
+def _product_names(inventory):
+    """Yield (product_id, product_name) without building the [name, quantity] lists when possible."""
+    rows = getattr(inventory, "rows", None)
+    if rows is None:
+        return ((product_id, name) for product_id, (name, _) in inventory.items())
+    return ((product_id, name) for product_id, name, _ in rows())
+
+
+class ProductBrowser(ttk.Frame):
+    """
+    Scrollable product table with a search box and inline quantity edits.
+
+    Args:
+        parent: Tk container widget.
+        inventory: Mapping product_id -> [product_name, quantity] (core.Inventory or
+            snapshot.SnapshotInventory).
+        on_edit: Called as on_edit(product_id, new_quantity) when a quantity is edited
+            in the table; it applies and saves the change and may raise KeyError or
+            ValueError, whose message is shown under the table.
+        on_select: Optional, called with the product_id of the selected row.
+        height: Number of visible rows.
+    """
+
+    def __init__(self, parent, inventory, on_edit, on_select=None, height=20):
+        super().__init__(parent)
+        self._inventory = inventory
+        self._on_edit = on_edit
+        self._on_select = on_select
+        self._height = height
+        self._view = []          # product ids of the current view, in order
+        self._pending = None     # iterator paging in the rest of the catalog view (None once done)
+        self._skip = 0           # ids _pending must skip first (already in _view)
+        self._page_end = 0       # _view should reach this position
+        self._page_job = None
+        self._placeholders = False
+        self._offset = 0         # position in _view of the first visible row
+        self._selected = None
+        self._editor = None
+        self._search_job = None
+        self._index = None
+        self._index_rows = None  # iterator of (product_id, name) still to index
+        self._index_job = None
+
+        self._query = tk.StringVar()
+        ent_search = ttk.Entry(self, textvariable=self._query, width=32)
+        self._tree = ttk.Treeview(self, columns=("id", "name", "quantity"), show="headings",
+                                  height=height, selectmode="browse")
+        self._scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self._yview)
+        self._lbl_info = Label(self, text="", fg="gray", anchor="w")
+
+        self._tree.heading("id", text="ID")
+        self._tree.heading("name", text="Nombre")
+        self._tree.heading("quantity", text="Cantidad")
+        self._tree.column("id", width=80, stretch=False)
+        self._tree.column("name", width=260)
+        self._tree.column("quantity", width=80, stretch=False, anchor="e")
+        self._items = [self._tree.insert("", tk.END) for _ in range(height)]
+
+        Label(self, text="Buscar:").grid(row=0, column=0, padx=4, pady=3, sticky="w")
+        ent_search.grid(row=0, column=1, columnspan=2, padx=4, pady=3, sticky="ew")
+        self._tree.grid(row=1, column=0, columnspan=2, sticky="nsew")
+        self._scrollbar.grid(row=1, column=2, sticky="ns")
+        self._lbl_info.grid(row=2, column=0, columnspan=3, padx=4, pady=3, sticky="ew")
+        self.columnconfigure(1, weight=1)
+        self.rowconfigure(1, weight=1)
+
+        self._query.trace_add("write", lambda *_: self._schedule_search())
+        self._tree.bind("<<TreeviewSelect>>", self._selection_changed)
+        self._tree.bind("<Double-1>", self._start_edit)
+        self._tree.bind("<MouseWheel>", lambda e: self._scroll(-1 if e.delta > 0 else 1, "units"))
+        self._tree.bind("<Button-4>", lambda e: self._scroll(-1, "units"))
+        self._tree.bind("<Button-5>", lambda e: self._scroll(1, "units"))
+        self._tree.bind("<Up>", lambda e: self._step_selection(-1))
+        self._tree.bind("<Down>", lambda e: self._step_selection(1))
+        self._tree.bind("<Prior>", lambda e: self._scroll(-1, "pages") or "break")
+        self._tree.bind("<Next>", lambda e: self._scroll(1, "pages") or "break")
+
+        self._show_catalog()
+        self._repaint()
+        self._start_index()
+
+    # --- public ---
+
+    def refresh(self):
+        """Repaint the visible rows (after quantities or names changed)."""
+        self._repaint()
+
+    def product_added(self, product_id):
+        """Show a new product and add it to the name index."""
+        if self._index_rows is None:
+            self._index.add(product_id, self._inventory[product_id][0])
+        else:
+            # The iterator being indexed is invalid once the inventory changes size
+            self._start_index()
+        if self._query.get().strip():
+            self._search(keep_offset=True)
+            return
+        # New products come last in the inventory order: append it once the catalog is paged in
+        if self._pending is None:
+            self._view.append(product_id)
+        else:
+            self._resume_catalog()
+        self._set_info(f"{len(self._inventory)} productos")
+        self._repaint()
+
+    def product_removed(self, product_id):
+        """Stop showing a deleted product."""
+        if self._index_rows is None:
+            self._index.discard(product_id)
+        else:
+            self._start_index()
+        if self._query.get().strip():
+            self._search(keep_offset=True)
+            return
+        try:
+            self._view.remove(product_id)
+        except ValueError:
+            pass   # not paged in yet
+        if self._pending is not None:
+            self._resume_catalog()
+        self._set_info(f"{len(self._inventory)} productos")
+        self._repaint()
+
+    # --- view ---
+
+    def _show_catalog(self):
+        self._cancel_paging()
+        self._view = []
+        self._pending = iter(self._inventory)
+        self._set_info(f"{len(self._inventory)} productos")
+
+    def _show_results(self, product_ids, partial):
+        self._cancel_paging()
+        self._view = product_ids
+        self._pending = None
+        if partial:
+            text = f"{len(product_ids)} resultados en los primeros {SCAN_LIMIT} productos (indexando…)"
+        elif len(product_ids) >= SEARCH_LIMIT:
+            text = f"primeros {SEARCH_LIMIT} resultados"
+        else:
+            text = f"{len(product_ids)} resultados"
+        self._set_info(text)
+
+    def _total(self):
+        return len(self._inventory) if self._pending is not None else len(self._view)
+
+    def _cancel_paging(self):
+        if self._page_job is not None:
+            self.after_cancel(self._page_job)
+            self._page_job = None
+        self._skip = self._page_end = 0
+
+    def _resume_catalog(self):
+        """
+        Restart paging after the inventory changed size, which invalidates its iterator.
+        _view is always a prefix of the inventory order (added products go last and
+        deleted ones are removed from both), so the new iterator skips len(_view) ids.
+        """
+        self._pending = iter(self._inventory)
+        self._skip = len(self._view)
+        if self._page_job is None and len(self._view) < self._page_end:
+            self._page_job = self.after(1, self._page_step)
+
+    def _page_in(self, end):
+        """Page in one slice towards position end now; later slices run from after()."""
+        self._page_end = end
+        self._load_page()
+
+    def _load_page(self):
+        if self._pending is None or len(self._view) >= self._page_end:
+            return
+        if self._skip:
+            step = min(self._skip, PAGE_ROWS)
+            skipped = sum(1 for _ in islice(self._pending, step))
+            self._skip -= step
+            if skipped < step:
+                self._pending, self._skip = None, 0
+        else:
+            before = len(self._view)
+            self._view.extend(islice(self._pending, PAGE_ROWS))
+            if len(self._view) - before < PAGE_ROWS:
+                self._pending = None
+        if self._pending is not None and len(self._view) < self._page_end and self._page_job is None:
+            self._page_job = self.after(1, self._page_step)
+
+    def _page_step(self):
+        self._page_job = None
+        self._load_page()
+        # Only repaint while placeholders are visible: a repaint would close an open editor
+        if self._placeholders:
+            self._repaint(page=False)
+
+    def _repaint(self, page=True):
+        self._cancel_edit()
+        total = self._total()
+        self._offset = max(0, min(self._offset, total - self._height))
+        if page:
+            self._page_in(self._offset + self._height)
+        rows = min(self._height, total - self._offset)
+        visible = self._view[self._offset:self._offset + rows]
+        self._placeholders = len(visible) < rows
+        for position, item in enumerate(self._items):
+            if position >= rows:
+                self._tree.detach(item)
+                continue
+            if position >= len(visible):
+                values = ("", "cargando…", "")
+            else:
+                product_id = visible[position]
+                try:
+                    name, quantity = self._inventory[product_id]
+                except KeyError:
+                    name, quantity = "(eliminado)", ""
+                values = (product_id, name, quantity)
+            self._tree.item(item, values=values)
+            self._tree.move(item, "", position)
+        # The items are reused for other products: keep the selection on the product, not the row
+        if self._selected in visible:
+            item = self._items[visible.index(self._selected)]
+            self._tree.selection_set(item)
+            self._tree.focus(item)
+        elif self._tree.selection():
+            self._tree.selection_remove(*self._tree.selection())
+        total = max(self._total(), 1)
+        self._scrollbar.set(self._offset / total, min(1.0, (self._offset + self._height) / total))
+
+    def _yview(self, action, amount, what=None):
+        if action == "moveto":
+            self._offset = int(float(amount) * self._total())
+            self._repaint()
+        else:
+            self._scroll(int(amount), what)
+
+    def _scroll(self, amount, what):
+        step = self._height - 1 if what == "pages" else 1
+        self._offset += amount * step
+        self._repaint()
+
+    def _step_selection(self, step):
+        """Arrow keys: move the selection and scroll when it reaches the edge."""
+        selection = self._tree.selection()
+        if not selection:
+            return None
+        position = self._items.index(selection[0]) + step
+        if 0 <= position < self._height:
+            return None   # the Treeview moves the selection itself
+        if (step < 0 and self._offset > 0) or (step > 0 and self._offset + self._height < self._total()):
+            position = self._offset + step + (0 if step < 0 else self._height - 1)
+            if position >= len(self._view):
+                return "break"   # still paging in
+            self._offset += step
+            self._selected = self._view[position]
+            self._repaint()
+            if self._on_select:
+                self._on_select(self._selected)
+        return "break"
+
+    def _selection_changed(self, event=None):
+        selection = self._tree.selection()
+        if not selection:
+            return
+        position = self._offset + self._items.index(selection[0])
+        if position < len(self._view) and self._view[position] != self._selected:
+            self._selected = self._view[position]
+            if self._on_select:
+                self._on_select(self._selected)
+
+    def _set_info(self, text):
+        self._lbl_info.config(text=text, fg="gray")
+
+    # --- search ---
+
+    def _schedule_search(self):
+        if self._search_job is not None:
+            self.after_cancel(self._search_job)
+        self._search_job = self.after(SEARCH_DELAY_MS, self._search)
+
+    def _search(self, keep_offset=False):
+        self._search_job = None
+        query = self._query.get().strip()
+        if not query:
+            self._show_catalog()
+        elif self._index_rows is None:
+            self._show_results(self._index.search(query, limit=SEARCH_LIMIT), partial=False)
+        else:
+            needle = normalize(query)
+            matches = [product_id for product_id, name in islice(_product_names(self._inventory), SCAN_LIMIT)
+                       if needle in normalize(name)]
+            self._show_results(matches[:SEARCH_LIMIT], partial=len(self._inventory) > SCAN_LIMIT)
+        if not keep_offset:
+            self._offset = 0
+        self._repaint()
+
+    def _start_index(self):
+        if self._index_job is not None:
+            self.after_cancel(self._index_job)
+        self._index = NameIndex(lambda product_id: self._inventory[product_id][0])
+        self._index_rows = _product_names(self._inventory)
+        self._index_job = self.after_idle(self._index_step)
+
+    def _index_step(self):
+        chunk = list(islice(self._index_rows, INDEX_CHUNK))
+        self._index.add_many(chunk)
+        if len(chunk) == INDEX_CHUNK:
+            # after(1) rather than after_idle so pending input events run between slices
+            self._index_job = self.after(1, self._index_step)
+            return
+        self._index_rows = self._index_job = None
+        if self._query.get().strip():
+            self._search(keep_offset=True)
+
+    # --- inline edit ---
+
+    def _start_edit(self, event):
+        item = self._tree.identify_row(event.y)
+        if not item or self._tree.identify_column(event.x) != "#3":
+            return
+        product_id = self._tree.set(item, "id")
+        if product_id not in self._inventory:
+            return
+        x, y, width, height = self._tree.bbox(item, "quantity")
+        # Same validation as the quantity fields of the main window
+        editor = IntEntry(self._tree, lower_bound=0, upper_bound=QUANTITY_MAX)
+        quantity = self._inventory[product_id][1]
+        if 0 <= quantity <= QUANTITY_MAX:
+            editor.set(quantity)
+        editor.place(x=x, y=y, width=width, height=height)
+        editor.bind("<Return>", lambda e: self._commit_edit(product_id))
+        editor.bind("<KP_Enter>", lambda e: self._commit_edit(product_id))
+        editor.bind("<Escape>", lambda e: self._cancel_edit())
+        editor.bind("<FocusOut>", lambda e: self._cancel_edit())
+        editor.focus_set()
+        self._editor = editor
+
+    def _commit_edit(self, product_id):
+        try:
+            quantity = self._editor.get()
+        except ValueError:
+            self._lbl_info.config(text=f"La cantidad debe estar entre 0 y {QUANTITY_MAX}.", fg="red")
+            return "break"
+        try:
+            self._on_edit(product_id, quantity)
+        except (KeyError, ValueError) as e:
+            self._lbl_info.config(text=str(e), fg="red")
+            return "break"
+        self._repaint()
+        self._tree.focus_set()
+        return "break"
+
+    def _cancel_edit(self):
+        if self._editor is not None:
+            editor, self._editor = self._editor, None
+            editor.destroy()
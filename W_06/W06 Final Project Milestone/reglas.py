@@ -0,0 +1,152 @@
+"""
+Motor de reglas para el consejo de inventario.
+Las reglas se declaran como datos (nombre, condición sobre las estadísticas agregadas,
+plantilla) y se compilan una sola vez en una función de Python, así evaluar un
+inventario cuesta microsegundos. Responde la primera regla que se cumple; una
+plantilla IA indica un estado que las reglas no describen bien y se delega al modelo.
+"""
+
+import os
+from dataclasses import dataclass, field
+from typing import Iterable, List, Optional, Tuple
+
+UMBRAL_STOCK_BAJO = int(os.getenv("UMBRAL_STOCK_BAJO", "10"))
+UMBRAL_STOCK_MEDIO = int(os.getenv("UMBRAL_STOCK_MEDIO", "50"))
+# Hasta cuántos productos con problemas se describen con reglas aunque haya ceros y bajos mezclados
+MAX_PROBLEMAS_REGLAS = int(os.getenv("MAX_PROBLEMAS_REGLAS", "3"))
+# Si solo hay stock bajo (sin ceros), las reglas responden mientras afecte a esta fracción o menos
+FRACCION_BAJOS_REGLAS = float(os.getenv("FRACCION_BAJOS_REGLAS", "0.2"))
+# Caída de unidades respecto del análisis anterior que amerita una explicación del modelo
+CAIDA_BRUSCA = float(os.getenv("CAIDA_BRUSCA", "0.3"))
+MAX_NOMBRES = 3
+
+IA = None
+
+TEXTO_VACIO = "El inventario está vacío, agrega productos primero."
+TEXTO_SALUDABLE = "El inventario se ve saludable. ¡Buen trabajo manteniendo el stock!"
+TEXTO_COMBINADO = "{urgente}{poco_stock}{agotados}Revisa tu inventario completo."
+
+
+@dataclass
+class EstadisticasInventario:
+    """Resumen del inventario de una tienda por bandas de stock."""
+    total_skus: int = 0
+    total_unidades: int = 0
+    en_cero: int = 0
+    bajos: int = 0     # 1..UMBRAL_STOCK_BAJO
+    medios: int = 0    # UMBRAL_STOCK_BAJO+1..UMBRAL_STOCK_MEDIO
+    altos: int = 0
+    nombres_cero: List[str] = field(default_factory=list)
+    nombres_bajos: List[str] = field(default_factory=list)
+    # Del análisis anterior de la tienda, para las reglas de tendencia (None sin historial)
+    unidades_previas: Optional[int] = None
+    en_cero_previos: Optional[int] = None
+
+
+def banda(cantidad: int) -> str:
+    """Banda de stock de una cantidad: cero, bajo, medio o alto."""
+    if cantidad <= 0:
+        return "cero"
+    if cantidad <= UMBRAL_STOCK_BAJO:
+        return "bajo"
+    if cantidad <= UMBRAL_STOCK_MEDIO:
+        return "medio"
+    return "alto"
+
+
+def calcular_estadisticas(productos: Iterable[Tuple[str, int]]) -> EstadisticasInventario:
+    """Calcula las estadísticas en una pasada sobre pares (nombre, cantidad)."""
+    stats = EstadisticasInventario()
+    for nombre, cantidad in productos:
+        cantidad = cantidad or 0
+        stats.total_skus += 1
+        stats.total_unidades += cantidad
+        b = banda(cantidad)
+        if b == "cero":
+            stats.en_cero += 1
+            if len(stats.nombres_cero) < MAX_NOMBRES:
+                stats.nombres_cero.append(nombre)
+        elif b == "bajo":
+            stats.bajos += 1
+            if len(stats.nombres_bajos) < MAX_NOMBRES:
+                stats.nombres_bajos.append(nombre)
+        elif b == "medio":
+            stats.medios += 1
+        else:
+            stats.altos += 1
+    return stats
+
+
+# (nombre, condición, plantilla). Las condiciones ven los campos de EstadisticasInventario,
+# los derivados de _VARIABLES y las constantes de este módulo.
+REGLAS = (
+    ("vacio", "total_skus == 0", TEXTO_VACIO),
+    ("caida_brusca", "variacion <= -CAIDA_BRUSCA", IA),
+    ("saludable", "problemas == 0", TEXTO_SALUDABLE),
+    ("pocos_problemas", "problemas <= MAX_PROBLEMAS_REGLAS", TEXTO_COMBINADO),
+    ("solo_agotados", "bajos == 0", TEXTO_COMBINADO),
+    ("bajos_acotados", "en_cero == 0 and bajos <= FRACCION_BAJOS_REGLAS * total_skus", TEXTO_COMBINADO),
+    ("complejo", "True", IA),
+)
+
+_VARIABLES = {
+    "problemas": "s.en_cero + s.bajos",
+    "variacion": ("0.0 if not s.unidades_previas "
+                  "else (s.total_unidades - s.unidades_previas) / s.unidades_previas"),
+}
+
+
+def compilar(reglas=REGLAS):
+    """
+    Genera una función evaluar(stats) -> índice de la primera regla que se cumple
+    (o -1). Se compila una vez: evaluar solo ejecuta comparaciones de Python.
+    """
+    lineas = ["def evaluar(s):"]
+    for nombre in EstadisticasInventario.__dataclass_fields__:
+        lineas.append(f"    {nombre} = s.{nombre}")
+    for nombre, expresion in _VARIABLES.items():
+        lineas.append(f"    {nombre} = {expresion}")
+    for i, (_, condicion, _) in enumerate(reglas):
+        lineas.append(f"    if {condicion}: return {i}")
+    lineas.append("    return -1")
+    espacio = {k: v for k, v in globals().items() if k.isupper()}
+    exec(compile("\n".join(lineas), "<reglas>", "exec"), espacio)
+    return espacio["evaluar"]
+
+
+_evaluar = compilar()
+
+
+def _lista(nombres: List[str], total: int, resto: str) -> str:
+    texto = ", ".join(nombres)
+    return texto + resto.format(total - len(nombres)) if total > len(nombres) else texto
+
+
+def consejo_combinado(stats: EstadisticasInventario) -> str:
+    """Consejo por reglas para cualquier estado (también es el respaldo si el modelo falla)."""
+    if stats.total_skus == 0:
+        return TEXTO_VACIO
+    if stats.en_cero == 0 and stats.bajos == 0:
+        return TEXTO_SALUDABLE
+    urgente = f"URGENTE: {_lista(stats.nombres_cero, stats.en_cero, '...')} están en cero. " if stats.en_cero else ""
+    poco_stock = f"Poco stock: {_lista(stats.nombres_bajos, stats.bajos, ' y {} más')}. " if stats.bajos else ""
+    nuevos = 0 if stats.en_cero_previos is None else stats.en_cero - stats.en_cero_previos
+    if nuevos == 1:
+        agotados = "1 producto se agotó desde el último análisis. "
+    else:
+        agotados = f"{nuevos} productos se agotaron desde el último análisis. " if nuevos > 1 else ""
+    return TEXTO_COMBINADO.format(urgente=urgente, poco_stock=poco_stock, agotados=agotados)
+
+
+def resolver(stats: EstadisticasInventario, reglas=REGLAS, evaluar=None) -> Tuple[str, Optional[str]]:
+    """
+    Devuelve (nombre de la regla, consejo). El consejo es None cuando la regla
+    delega al modelo de IA.
+    """
+    i = (evaluar or _evaluar)(stats)
+    nombre, _, plantilla = reglas[i]
+    if plantilla is IA:
+        return nombre, None
+    if plantilla is TEXTO_COMBINADO:
+        return nombre, consejo_combinado(stats)
+    return nombre, plantilla
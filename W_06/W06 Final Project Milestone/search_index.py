@@ -0,0 +1,112 @@
+"""Search-as-you-type index over product names.
+
+Names are normalized (lowercase, accents removed) and indexed by trigrams; queries
+shorter than three characters use the prefixes of each word instead. Postings are
+array('I') of product codes in catalog order, so 1M names fit in tens of MB. A
+query scans the shortest posting list of its grams and verifies each candidate
+against the name, stopping after `limit` matches: common queries finish after a
+few rows and rare ones only touch their short posting list.
+"""
+
+import unicodedata
+from array import array
+
+GRAM = 3
+
+
+def normalize(text):
+    """Lowercase text without accents, so 'Azúcar' matches 'azucar'."""
+    if text.isascii():
+        return text.lower()
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def _grams(normalized):
+    grams = {normalized[i:i + GRAM] for i in range(len(normalized) - GRAM + 1)}
+    for word in normalized.split():
+        grams.add(word[:1])
+        grams.add(word[:2])
+    return grams
+
+
+class NameIndex:
+    """
+    Trigram and word-prefix index from product name to product_id.
+
+    Args:
+        name_of: Callable returning the current name of a product_id (used to verify matches).
+    """
+
+    def __init__(self, name_of):
+        self._name_of = name_of
+        self._ids = []        # code -> product_id (None once removed)
+        self._codes = {}      # product_id -> code
+        self._postings = {}   # gram -> array("I") of codes, ascending
+
+    def __len__(self):
+        return len(self._codes)
+
+    def add(self, product_id, name):
+        """Index product_id under name (re-indexes it if it was already there)."""
+        self.discard(product_id)
+        code = len(self._ids)
+        self._ids.append(product_id)
+        self._codes[product_id] = code
+        postings = self._postings
+        for gram in _grams(normalize(name)):
+            posting = postings.get(gram)
+            if posting is None:
+                posting = postings[gram] = array("I")
+            posting.append(code)
+
+    def add_many(self, rows):
+        """Index (product_id, name) pairs, e.g. a slice of Inventory.rows() without quantities."""
+        # Same as add() per row, with the lookups hoisted out of the loop for bulk loads
+        ids, codes, postings = self._ids, self._codes, self._postings
+        for product_id, name in rows:
+            if product_id in codes:
+                self.discard(product_id)
+            code = len(ids)
+            ids.append(product_id)
+            codes[product_id] = code
+            for gram in _grams(normalize(name)):
+                try:
+                    postings[gram].append(code)
+                except KeyError:
+                    postings[gram] = array("I", (code,))
+
+    def discard(self, product_id):
+        """Stop returning product_id; its postings are skipped until the index is rebuilt."""
+        code = self._codes.pop(product_id, None)
+        if code is not None:
+            self._ids[code] = None
+
+    def search(self, query, limit=200):
+        """
+        Product ids whose name contains query (or, for one or two characters,
+        has a word starting with it), in catalog order.
+        """
+        needle = normalize(query).strip()
+        if not needle:
+            return []
+        if len(needle) < GRAM:
+            grams = [needle] if " " not in needle else []
+        else:
+            grams = [needle[i:i + GRAM] for i in range(len(needle) - GRAM + 1)]
+        postings = [self._postings.get(gram) for gram in grams]
+        if not postings or any(posting is None for posting in postings):
+            return []
+        shortest = min(postings, key=len)
+        short_query = len(needle) < GRAM
+        results = []
+        for code in shortest:
+            product_id = self._ids[code]
+            if product_id is None:
+                continue
+            # Trigrams can all match without the whole query matching: check the name
+            if short_query or needle in normalize(self._name_of(product_id)):
+                results.append(product_id)
+                if len(results) >= limit:
+                    break
+        return results
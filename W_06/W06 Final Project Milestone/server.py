@@ -5,38 +5,75 @@ Configurada para despliegue en Render y conexión con Vercel.
 
 from dotenv import load_dotenv
 from pathlib import Path
+import asyncio
 import os
+import threading
+import time
+from datetime import datetime, timedelta
+from functools import lru_cache
 
 # Carga variables de entorno
 load_dotenv(dotenv_path=Path(__file__).resolve().parent / ".env")
 
-from fastapi import Depends, FastAPI, HTTPException, status
+from fastapi import Depends, FastAPI, File, Header, HTTPException, Query, Request, Response, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import List, Literal, Optional
 
 # Importaciones locales (Asegúrate de que estos archivos existan)
-from ai_service import generar_consejo_inventario
+from ai_service import analizar_inventario as analizar_con_ia
 from database import (
+    DEFAULT_STORE,
+    ERRORES_DE_PLAZO,
+    HistorialPurgado,
+    PlazoAgotado,
+    PoolTimeoutError,
+    adjust_stock,
+    calcular_estadisticas_inventario,
     create_product,
     delete_product,
+    get_read_session,
     get_session,
+    leer_estadisticas,
+    listar_cambios,
+    motor_lectura,
+    plazo_actual,
+    purgar_eliminados,
+    reconstruir_estadisticas,
+    ultima_version_escrita,
     update_product,
     validate_jwt,
+    verificar_estadisticas,
 )
+from exportador import exportar_csv, exportar_parquet, parquet_disponible
+from importador import estado_importacion, iniciar_importacion, tomar_upload
 from models import Product
+from sqlalchemy import bindparam, false, select
+from starlette.routing import Match
+import metricas
+import perfilador
+import trazas
+from write_buffer import StockWriteBuffer
 
 security = HTTPBearer(auto_error=False)
 
-def get_current_user(cred: HTTPAuthorizationCredentials | None = Depends(security)) -> dict:
+def get_usuario_opcional(cred: HTTPAuthorizationCredentials | None = Depends(security)) -> dict | None:
+    """Payload del JWT si la petición trae un token válido, si no None (FastAPI lo valida una vez por petición)."""
+    if cred is None or not cred.credentials:
+        return None
+    return validate_jwt(cred.credentials)
+
+def get_current_user(cred: HTTPAuthorizationCredentials | None = Depends(security),
+                     user: dict | None = Depends(get_usuario_opcional)) -> dict:
     """Valida el token JWT de Supabase."""
     if cred is None or not cred.credentials:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail={"message": "Falta token de autorización", "ok": False},
         )
-    user = validate_jwt(cred.credentials)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -44,12 +81,130 @@ def get_current_user(cred: HTTPAuthorizationCredentials | None = Depends(securit
         )
     return user
 
+def tiendas_autorizadas(user: dict) -> list[str]:
+    """
+    Tiendas que el token puede usar: claim app_metadata.stores de Supabase (solo lo escribe
+    el backend con la service key, el usuario no puede modificarlo).
+    """
+    tiendas = (user.get("app_metadata") or {}).get("stores") or []
+    return [tiendas] if isinstance(tiendas, str) else list(tiendas)
+
+def get_tienda(x_store_id: str | None = Header(None, pattern=r"^[A-Za-z0-9_-]{1,50}$"),
+               cred: HTTPAuthorizationCredentials | None = Depends(security),
+               user: dict | None = Depends(get_usuario_opcional)) -> str:
+    """
+    Tienda de la petición (cabecera X-Store-Id); sin cabecera se usa DEFAULT_STORE, abierta
+    como antes de haber tiendas. Cualquier otra tienda exige un token cuyo claim
+    app_metadata.stores la incluya: 401 sin token válido, 403 si no está autorizada.
+    """
+    tienda = x_store_id or DEFAULT_STORE
+    if tienda == DEFAULT_STORE:
+        return tienda
+    user = get_current_user(cred, user)
+    if tienda not in tiendas_autorizadas(user):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail={"message": "El token no tiene acceso a esta tienda", "ok": False},
+        )
+    return tienda
+
+def get_version_minima(x_min_version: int | None = Header(None, ge=0)) -> int | None:
+    """
+    Cabecera X-Min-Version: última X-Version que recibió el cliente al escribir.
+    Las lecturas con réplica usan el primario mientras la réplica no la alcance.
+    """
+    return x_min_version
+
 app = FastAPI(
     title="API Inventario + IA",
     description="Backend Fons Inventory - Render Deploy",
     version="1.1.0",
 )
 
+# --- BUFFER DE AJUSTES (opt-in) ---
+# STOCK_BUFFER_MS > 0 activa el buffer write-behind para /productos/{id}/ajuste
+STOCK_BUFFER_MS = float(os.getenv("STOCK_BUFFER_MS", "0"))
+STOCK_BUFFER_MAX_OPS = int(os.getenv("STOCK_BUFFER_MAX_OPS", "256"))
+stock_buffer = StockWriteBuffer(STOCK_BUFFER_MS, STOCK_BUFFER_MAX_OPS) if STOCK_BUFFER_MS > 0 else None
+
+# --- PURGA DE TOMBSTONES ---
+# Los productos eliminados se conservan TOMBSTONE_TTL_DIAS para el feed /productos/cambios
+TOMBSTONE_TTL_DIAS = float(os.getenv("TOMBSTONE_TTL_DIAS", "30"))
+PURGA_INTERVALO_S = float(os.getenv("PURGA_INTERVALO_S", "3600"))
+_parar_purga = threading.Event()
+
+def _bucle_purga():
+    while not _parar_purga.wait(PURGA_INTERVALO_S):
+        session = get_session()
+        try:
+            borradas = purgar_eliminados(session, timedelta(days=TOMBSTONE_TTL_DIAS))
+            if borradas:
+                print(f"[Purga] {borradas} tombstones eliminados")
+        except Exception as e:
+            print(f"[Purga Error] {e}")
+        finally:
+            session.close()
+
+@app.on_event("startup")
+def iniciar_purga():
+    threading.Thread(target=_bucle_purga, name="purga-tombstones", daemon=True).start()
+
+@app.on_event("shutdown")
+def apagar():
+    _parar_purga.set()
+    if stock_buffer is not None:
+        stock_buffer.cerrar()
+
+# --- PLAZOS POR PETICIÓN ---
+# Plazo en segundos por plantilla de ruta; REQUEST_DEADLINES="/ruta=segundos,..." los sobrescribe.
+# Las consultas que lo superan se cancelan y la petición responde 503 sin retener la conexión.
+PLAZO_POR_DEFECTO_S = float(os.getenv("REQUEST_DEADLINE_S", "5"))
+PLAZOS_POR_RUTA = {
+    "/analizar_inventario": 30.0,
+    "/productos/exportar": 600.0,
+}
+for _par in filter(None, os.getenv("REQUEST_DEADLINES", "").split(",")):
+    _ruta, _segundos = _par.rsplit("=", 1)
+    PLAZOS_POR_RUTA[_ruta.strip()] = float(_segundos)
+
+def _ruta_de(scope) -> str | None:
+    """Plantilla de la ruta que atenderá la petición (ej. /productos/{id}), o None."""
+    for ruta in app.router.routes:
+        coincidencia, _ = ruta.matches(scope)
+        if coincidencia == Match.FULL:
+            return ruta.path
+    return None
+
+# --- PERFILADO (opt-in) ---
+# Cabecera X-Profile con PROFILE_TOKEN, o PROFILE_SAMPLE_N > 0 para perfilar 1 de cada N.
+# Se registra antes que plazo_por_peticion para quedar por dentro de él (ver MiddlewarePerfil).
+app.add_middleware(perfilador.MiddlewarePerfil, resolver_ruta=_ruta_de)
+
+@app.middleware("http")
+async def plazo_por_peticion(request: Request, call_next):
+    ruta = _ruta_de(request.scope)
+    token = plazo_actual.set(time.monotonic() + PLAZOS_POR_RUTA.get(ruta, PLAZO_POR_DEFECTO_S))
+    try:
+        return await call_next(request)
+    finally:
+        plazo_actual.reset(token)
+
+@app.exception_handler(PlazoAgotado)
+@app.exception_handler(PoolTimeoutError)
+async def plazo_agotado(request: Request, exc: Exception):
+    if isinstance(exc, PoolTimeoutError):
+        metricas.incrementar("db_pool_timeouts_total")
+    metricas.incrementar("request_deadline_exceeded_total", ruta=_ruta_de(request.scope) or "desconocida")
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Servidor ocupado, intenta de nuevo", "ok": False},
+        headers={"Retry-After": "1"},
+    )
+
+# --- TRAZAS ---
+# Spans de auth, SQL e IA por petición; las que superan TRACE_SLOW_MS quedan en /debug/lento
+app.add_middleware(trazas.MiddlewareTrazas, resolver_ruta=_ruta_de)
+
 # --- CONFIGURACIÓN CORS ---
 # Esto permite que Vercel hable con este servidor
 origins = [
@@ -64,12 +219,15 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Version"],
 )
 
 # --- MODELOS PYDANTIC ---
 
 class RespuestaAnalisis(BaseModel):
     consejo: str
+    fuente: Literal["reglas", "ia", "respaldo"] = Field(..., description="Qué generó el consejo")
+    regla: str
     ok: bool = True
 
 class ProductoOut(BaseModel):
@@ -81,6 +239,16 @@ class ProductoOut(BaseModel):
     class Config:
         from_attributes = True
 
+class ProductoParcialOut(BaseModel):
+    """Producto con solo los campos pedidos en ?fields= (los demás se omiten del JSON)."""
+    id: Optional[int] = None
+    product_id: Optional[str] = None
+    name: Optional[str] = None
+    quantity: Optional[int] = None
+
+CAMPOS_PRODUCTO = ("id", "product_id", "name", "quantity")
+MAX_IDS_POR_CONSULTA = 500
+
 class ProductoCreate(BaseModel):
     nombre: str = Field(..., min_length=1, max_length=255)
     cantidad: int = Field(..., ge=0)
@@ -89,6 +257,53 @@ class ProductoUpdate(BaseModel):
     nombre: Optional[str] = Field(None, min_length=1, max_length=255)
     cantidad: Optional[int] = Field(None, ge=0)
 
+class AjusteStock(BaseModel):
+    delta: int = Field(..., description="Unidades a sumar (positivo) o restar (negativo)")
+
+class AjusteOut(BaseModel):
+    id: int
+    quantity: int
+    ok: bool = True
+
+class CambioOut(BaseModel):
+    id: int
+    product_id: str
+    name: str
+    quantity: int
+    version: int
+    eliminado: bool
+
+class CambiosOut(BaseModel):
+    version: int
+    desde_id: int = Field(0, description="Enviar junto con version en la próxima consulta (0 = versión completa)")
+    cambios: List[CambioOut]
+
+class ImportacionOut(BaseModel):
+    job_id: str
+    estado: str
+    bytes_total: int = 0
+    bytes_procesados: int = 0
+    filas_leidas: int = 0
+    insertadas: int = 0
+    actualizadas: int = 0
+    omitidas: int = 0
+    error: Optional[str] = None
+
+class EstadisticasOut(BaseModel):
+    total_skus: int
+    total_unidades: int
+    en_cero: int
+    bajos: int
+    medios: int
+    altos: int
+    updated_at: Optional[datetime] = None
+
+class VerificacionEstadisticasOut(BaseModel):
+    store_id: str
+    deriva: bool
+    diferencias: dict[str, tuple[Optional[int], int]]
+    corregido: bool = False
+
 class MensajeOut(BaseModel):
     message: str
     ok: bool = True
@@ -99,43 +314,210 @@ class MensajeOut(BaseModel):
 def health():
     return {"status": "ok", "service": "Fons Inventory Backend"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Contadores en formato Prometheus (timeouts de consultas, del pool y de peticiones)."""
+    return metricas.exportar_prometheus()
+
+@app.get("/debug/lento")
+def debug_lento(user: dict = Depends(get_current_user)):
+    """Cascada de spans de las últimas peticiones que superaron TRACE_SLOW_MS."""
+    return {"umbral_ms": trazas.TRACE_SLOW_MS, "peticiones": trazas.peticiones_lentas()}
+
 @app.get("/analizar_inventario", response_model=RespuestaAnalisis)
-def analizar_inventario():
+def analizar_inventario(tienda: str = Depends(get_tienda),
+                        min_version: int | None = Depends(get_version_minima)):
     try:
-        consejo = generar_consejo_inventario()
-        return RespuestaAnalisis(consejo=consejo)
+        return RespuestaAnalisis(**analizar_con_ia(tienda, min_version))
+    except ERRORES_DE_PLAZO:
+        raise
     except Exception as e:
         print(f"Error IA: {e}")
         raise HTTPException(status_code=500, detail=f"Error IA: {str(e)}")
 
-@app.get("/productos", response_model=List[ProductoOut])
-def listar_productos():
+def _lista_parametro(valor: Optional[str]) -> list[str]:
+    """Convierte "a, b,,a" en ["a", "b"] (sin vacíos ni duplicados, conservando el orden)."""
+    if not valor:
+        return []
+    return list(dict.fromkeys(v.strip() for v in valor.split(",") if v.strip()))
+
+@lru_cache(maxsize=64)
+def _consulta_listado(campos: tuple, con_ids: bool):
+    """Sentencia del listado construida una vez por combinación de campos (ver database.py)."""
+    consulta = (
+        select(*(getattr(Product, c) for c in campos))
+        .where(Product.store_id == bindparam("b_store"), Product.deleted == false())
+        .order_by(Product.id)
+    )
+    if con_ids:
+        consulta = consulta.where(Product.product_id.in_(bindparam("b_ids", expanding=True)))
+    return consulta
+
+@app.get("/estadisticas", response_model=EstadisticasOut)
+def estadisticas(tienda: str = Depends(get_tienda), min_version: int | None = Depends(get_version_minima)):
+    """Totales de la tienda y productos por banda de stock (cero, bajo, medio, alto), leídos en O(1)."""
+    session = get_read_session(tienda, min_version)
+    try:
+        return EstadisticasOut(
+            **(leer_estadisticas(session, tienda) or calcular_estadisticas_inventario(session, tienda))
+        )
+    finally:
+        session.close()
+
+@app.get("/estadisticas/verificar", response_model=VerificacionEstadisticasOut)
+def verificar_estadisticas_tienda(user: dict = Depends(get_current_user), tienda: str = Depends(get_tienda)):
+    """
+    Recalcula las estadísticas de la tienda desde los productos y reporta la deriva
+    respecto de las mantenidas, sin modificarlas (ver POST /estadisticas/reconstruir).
+    """
     session = get_session()
     try:
-        rows = session.query(Product).order_by(Product.id).all()
-        # Mapeamos la respuesta usando el modelo ProductoOut
-        return [ProductoOut(id=p.id, product_id=p.product_id, name=p.name, quantity=p.quantity) for p in rows]
+        derivas = verificar_estadisticas(session, tienda)
+        diferencias = derivas[0]["diferencias"] if derivas else {}
+        return VerificacionEstadisticasOut(store_id=tienda, deriva=bool(diferencias), diferencias=diferencias)
+    finally:
+        session.rollback()
+        session.close()
+
+@app.post("/estadisticas/reconstruir", response_model=VerificacionEstadisticasOut)
+def reconstruir_estadisticas_tienda(user: dict = Depends(get_current_user), tienda: str = Depends(get_tienda)):
+    """Si las estadísticas mantenidas de la tienda tienen deriva, las reescribe desde los productos."""
+    session = get_session()
+    try:
+        derivas = verificar_estadisticas(session, tienda)
+        session.rollback()
+        diferencias = derivas[0]["diferencias"] if derivas else {}
+        if diferencias:
+            reconstruir_estadisticas(session, tienda)
+        return VerificacionEstadisticasOut(
+            store_id=tienda, deriva=bool(diferencias), diferencias=diferencias, corregido=bool(diferencias),
+        )
+    finally:
+        session.close()
+
+@app.get("/productos", response_model=List[ProductoParcialOut], response_model_exclude_unset=True)
+def listar_productos(
+    tienda: str = Depends(get_tienda),
+    fields: Optional[str] = Query(None, description="Campos a devolver, ej. product_id,quantity"),
+    ids: Optional[str] = Query(None, description="product_id a traer, ej. P001,P007"),
+    min_version: int | None = Depends(get_version_minima),
+):
+    """
+    Lista los productos de la tienda. Con ?fields= solo se leen y devuelven esas columnas;
+    con ?ids= se traen solo esos productos en una única consulta IN.
+    """
+    campos = _lista_parametro(fields) or list(CAMPOS_PRODUCTO)
+    desconocidos = [c for c in campos if c not in CAMPOS_PRODUCTO]
+    if desconocidos:
+        raise HTTPException(status_code=400, detail=f"Campos desconocidos: {', '.join(desconocidos)}")
+    lista_ids = _lista_parametro(ids)
+    if len(lista_ids) > MAX_IDS_POR_CONSULTA:
+        raise HTTPException(status_code=400, detail=f"Máximo {MAX_IDS_POR_CONSULTA} ids por consulta")
+
+    params = {"b_store": tienda}
+    if lista_ids:
+        params["b_ids"] = lista_ids
+    session = get_read_session(tienda, min_version)
+    try:
+        rows = session.execute(_consulta_listado(tuple(campos), bool(lista_ids)), params).all()
+        return [ProductoParcialOut(**row._mapping) for row in rows]
+    except ERRORES_DE_PLAZO:
+        raise
     except Exception as e:
         print(f"Error DB: {e}")
         raise HTTPException(status_code=500, detail="Error al leer base de datos")
     finally:
         session.close()
 
+@app.get("/productos/cambios", response_model=CambiosOut)
+def cambios_productos(
+    desde: int = Query(0, ge=0, description="Versión recibida en la consulta anterior (0 = todo)"),
+    desde_id: int = Query(0, ge=0, description="desde_id recibido en la consulta anterior"),
+    limite: int = Query(1000, ge=1, le=10000),
+    tienda: str = Depends(get_tienda),
+    min_version: int | None = Depends(get_version_minima),
+):
+    """
+    Productos creados, modificados o eliminados después del cursor (desde, desde_id).
+    El cliente guarda version y desde_id devueltos y los envía en la próxima consulta
+    (desde_id distinto de 0 indica que quedan filas de esa versión); 410 indica que debe
+    volver a descargar el catálogo completo.
+    """
+    # Una réplica por detrás de desde devolvería una versión anterior a la que el cliente ya vio
+    session = get_read_session(tienda, max(desde, min_version or 0))
+    try:
+        version, siguiente_id, filas = listar_cambios(session, tienda, desde, limite, desde_id)
+        return CambiosOut(version=version, desde_id=siguiente_id, cambios=[
+            CambioOut(id=p.id, product_id=p.product_id, name=p.name, quantity=p.quantity,
+                      version=p.version, eliminado=p.deleted)
+            for p in filas
+        ])
+    except HistorialPurgado as e:
+        raise HTTPException(status_code=410, detail=str(e))
+    finally:
+        session.close()
+
+@app.get("/productos/exportar")
+def exportar_productos(formato: Literal["csv", "parquet"] = "csv", tienda: str = Depends(get_tienda),
+                       min_version: int | None = Depends(get_version_minima)):
+    """Descarga el catálogo completo en streaming (CSV compatible con inventory.csv, o Parquet)."""
+    motor = motor_lectura(tienda, min_version)
+    if formato == "parquet":
+        if not parquet_disponible():
+            raise HTTPException(status_code=501, detail="Parquet no disponible: instalar pyarrow")
+        return StreamingResponse(
+            exportar_parquet(tienda, motor),
+            media_type="application/vnd.apache.parquet",
+            headers={"Content-Disposition": 'attachment; filename="inventory.parquet"'},
+        )
+    return StreamingResponse(
+        exportar_csv(tienda, motor),
+        media_type="text/csv; charset=utf-8",
+        headers={"Content-Disposition": 'attachment; filename="inventory.csv"'},
+    )
+
 @app.post("/productos", response_model=ProductoOut, status_code=201)
-def crear_producto(body: ProductoCreate, user: dict = Depends(get_current_user)):
+def crear_producto(body: ProductoCreate, response: Response, user: dict = Depends(get_current_user),
+                   tienda: str = Depends(get_tienda)):
     session = get_session()
     try:
         # create_product en database.py debe manejar la creación del código "P00X"
-        product = create_product(session, body.nombre, body.cantidad)
+        product = create_product(session, body.nombre, body.cantidad, store_id=tienda)
+        response.headers["X-Version"] = str(product.version)
         return product
+    except ERRORES_DE_PLAZO:
+        raise
     except Exception as e:
         session.rollback()
         raise HTTPException(status_code=400, detail=f"Error al crear: {str(e)}")
     finally:
         session.close()
 
+@app.post("/productos/importar", response_model=ImportacionOut, status_code=202)
+def importar_productos(archivo: UploadFile = File(...), user: dict = Depends(get_current_user),
+                       tienda: str = Depends(get_tienda)):
+    """
+    Recibe un CSV con el formato de inventory.csv y lo importa en segundo plano
+    (upsert por product_id). Devuelve el job_id para consultar el progreso.
+    """
+    try:
+        fd = tomar_upload(archivo.file)
+    finally:
+        archivo.file.close()
+    job_id = iniciar_importacion(fd, tienda)
+    return ImportacionOut(**estado_importacion(job_id, tienda))
+
+@app.get("/productos/importar/{job_id}", response_model=ImportacionOut)
+def estado_importar_productos(job_id: str, user: dict = Depends(get_current_user),
+                              tienda: str = Depends(get_tienda)):
+    estado = estado_importacion(job_id, tienda)
+    if estado is None:
+        raise HTTPException(status_code=404, detail="Importación no encontrada")
+    return ImportacionOut(**estado)
+
 @app.put("/productos/{id}", response_model=ProductoOut)
-def actualizar_producto(id: int, body: ProductoUpdate, user: dict = Depends(get_current_user)):
+def actualizar_producto(id: int, body: ProductoUpdate, response: Response,
+                        user: dict = Depends(get_current_user), tienda: str = Depends(get_tienda)):
     """
     Actualiza por ID numérico (Primary Key). 
     Es más seguro usar el ID entero que el string 'P001' para evitar errores de URL.
@@ -146,30 +528,67 @@ def actualizar_producto(id: int, body: ProductoUpdate, user: dict = Depends(get_
     session = get_session()
     try:
         # Llama a la función de base de datos pasando el ID entero
-        product = update_product(session, id, name=body.nombre, quantity=body.cantidad)
+        product = update_product(session, id, name=body.nombre, quantity=body.cantidad, store_id=tienda)
         
         if not product:
             raise HTTPException(status_code=404, detail="Producto no encontrado")
             
+        response.headers["X-Version"] = str(product.version)
         return product
     except HTTPException:
         raise
+    except ERRORES_DE_PLAZO:
+        raise
     except Exception as e:
         session.rollback()
         raise HTTPException(status_code=400, detail=f"Error al actualizar: {str(e)}")
     finally:
         session.close()
 
+def _ajustar_directo(id: int, delta: int, tienda: str):
+    session = get_session()
+    try:
+        return adjust_stock(session, id, delta, store_id=tienda)
+    finally:
+        session.close()
+
+@app.post("/productos/{id}/ajuste", response_model=AjusteOut)
+async def ajustar_stock(id: int, body: AjusteStock, response: Response,
+                        user: dict = Depends(get_current_user), tienda: str = Depends(get_tienda)):
+    """
+    Suma o resta unidades al stock (pensado para ventas del punto de venta).
+    Con STOCK_BUFFER_MS activo, los ajustes se agrupan y se responde tras el commit del lote.
+    """
+    try:
+        if stock_buffer is not None:
+            cantidad = await asyncio.wrap_future(stock_buffer.enviar(id, body.delta, tienda))
+        else:
+            cantidad = await run_in_threadpool(_ajustar_directo, id, body.delta, tienda)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ERRORES_DE_PLAZO:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al ajustar: {str(e)}")
+    if cantidad is None:
+        raise HTTPException(status_code=404, detail="Producto no encontrado")
+    response.headers["X-Version"] = str(ultima_version_escrita(tienda))
+    return AjusteOut(id=id, quantity=cantidad)
+
 @app.delete("/productos/{id}", response_model=MensajeOut)
-def eliminar_producto(id: int, user: dict = Depends(get_current_user)):
+def eliminar_producto(id: int, response: Response, user: dict = Depends(get_current_user),
+                      tienda: str = Depends(get_tienda)):
     session = get_session()
     try:
-        deleted = delete_product(session, id)
+        deleted = delete_product(session, id, store_id=tienda)
         if not deleted:
             raise HTTPException(status_code=404, detail="Producto no encontrado")
+        response.headers["X-Version"] = str(ultima_version_escrita(tienda))
         return MensajeOut(message=f"Producto {id} eliminado")
     except HTTPException:
         raise
+    except ERRORES_DE_PLAZO:
+        raise
     except Exception as e:
         session.rollback()
         raise HTTPException(status_code=500, detail=str(e))
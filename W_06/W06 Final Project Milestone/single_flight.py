@@ -0,0 +1,56 @@
+"""
+Deduplicación de llamadas en vuelo (single-flight).
+Mientras una llamada con cierta clave se ejecuta, las llamadas concurrentes con la
+misma clave no repiten el trabajo: esperan el mismo Future y reciben su resultado
+o su excepción. La clave se libera al terminar (también si falla), así nada queda
+retenido y la próxima llamada vuelve a ejecutar.
+"""
+
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+
+class SingleFlight:
+    """Agrupa llamadas concurrentes por clave: una sola ejecuta, las demás esperan su Future."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._en_vuelo: dict = {}
+
+    def hacer(self, clave, funcion, *args, timeout: float | None = None, **kwargs):
+        """
+        Ejecuta funcion(*args, **kwargs), o espera la ejecución en curso con la misma clave.
+
+        Raises:
+            La excepción de la ejecución compartida, o TimeoutError si el que espera
+            supera timeout (la ejecución compartida sigue para los demás).
+        """
+        with self._lock:
+            futuro = self._en_vuelo.get(clave)
+            lider = futuro is None
+            if lider:
+                futuro = Future()
+                # En RUNNING, cancel() de un llamador no puede cancelar el Future compartido
+                futuro.set_running_or_notify_cancel()
+                self._en_vuelo[clave] = futuro
+        if not lider:
+            try:
+                return futuro.result(timeout)
+            except FutureTimeoutError:
+                raise TimeoutError(f"Tiempo agotado esperando la llamada en vuelo {clave!r}") from None
+        try:
+            resultado = funcion(*args, **kwargs)
+        except BaseException as e:
+            futuro.set_exception(e)
+            raise
+        else:
+            futuro.set_result(resultado)
+            return resultado
+        finally:
+            with self._lock:
+                self._en_vuelo.pop(clave, None)
+
+    def en_vuelo(self) -> int:
+        """Cantidad de claves con una ejecución en curso."""
+        with self._lock:
+            return len(self._en_vuelo)
@@ -0,0 +1,279 @@
+"""Memory-mapped binary snapshot of the local inventory CSV.
+
+The CSV stays the interchange format; ``<csv>.snap`` is a cache written next to it
+so the app can start without parsing the whole file. Layout (little endian):
+
+    header   magic, version, row count, CSV size and mtime, section offsets
+    records  one fixed-width record per row in CSV order:
+             id offset, name offset, id length, name length, quantity
+    index    row numbers (uint32) sorted by product_id bytes
+    zero     row numbers (uint32) of products with quantity 0
+    heap     UTF-8 product ids and names
+
+SnapshotInventory maps the file and looks rows up lazily with a binary search over
+the index; changes made after loading live in an in-memory overlay. A snapshot
+whose recorded CSV size or mtime no longer matches is stale and is not used.
+"""
+
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from collections.abc import MutableMapping
+
+from core import load_inventory
+
+MAGIC = b"FONSSNAP"
+VERSION = 2
+_HEADER = struct.Struct("<8sIQQqQQQQQ")
+_RECORD = struct.Struct("<QQIIq")
+_ROW = struct.Struct("<I")
+
+
+def snapshot_path_for(csv_path):
+    """Path of the binary snapshot kept next to csv_path."""
+    return os.fspath(csv_path) + ".snap"
+
+
+def write_snapshot(path, rows, csv_stat):
+    """
+    Write rows to a snapshot file atomically (temp file + rename).
+
+    Args:
+        path: Snapshot file to create or replace.
+        rows: Iterable of (product_id, product_name, quantity) in inventory order.
+        csv_stat: os.stat_result of the CSV the rows were read from.
+    """
+    ids, names, quantities = [], [], array("q")
+    for product_id, name, quantity in rows:
+        ids.append(product_id.encode("utf-8"))
+        names.append(name.encode("utf-8"))
+        quantities.append(quantity)
+    count = len(ids)
+    records_off = _HEADER.size
+    index_off = records_off + count * _RECORD.size
+    index = array("I", sorted(range(count), key=ids.__getitem__))
+    zero = array("I", (row for row, quantity in enumerate(quantities) if quantity == 0))
+    zero_off = index_off + count * _ROW.size
+    heap_off = zero_off + len(zero) * _ROW.size
+    if sys.byteorder == "big":
+        index.byteswap()
+        zero.byteswap()
+
+    directory = os.path.dirname(os.path.abspath(path))
+    descriptor, temp_path = tempfile.mkstemp(prefix=".inventory-", suffix=".snap", dir=directory)
+    try:
+        with os.fdopen(descriptor, "wb") as out:
+            out.write(_HEADER.pack(MAGIC, VERSION, count, csv_stat.st_size, csv_stat.st_mtime_ns,
+                                   records_off, index_off, zero_off, len(zero), heap_off))
+            offset = 0
+            for product_id, name, quantity in zip(ids, names, quantities):
+                out.write(_RECORD.pack(offset, offset + len(product_id), len(product_id), len(name), quantity))
+                offset += len(product_id) + len(name)
+            out.write(index.tobytes())
+            out.write(zero.tobytes())
+            for product_id, name in zip(ids, names):
+                out.write(product_id)
+                out.write(name)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def build_snapshot(csv_path):
+    """
+    Rebuild the snapshot of csv_path from the CSV. Returns False if the CSV changed
+    while it was being read (the snapshot would already be stale) or cannot be replaced.
+    """
+    path = snapshot_path_for(csv_path)
+    try:
+        before = os.stat(csv_path)
+        inventory = load_inventory(csv_path)
+        if _signature(os.stat(csv_path)) != _signature(before):
+            return False
+        write_snapshot(path, inventory.rows(), before)
+    except OSError as e:
+        # On Windows a snapshot that is still mapped cannot be replaced; the next start rebuilds it
+        print(f"[Snapshot] Could not write {path}: {e}")
+        return False
+    return True
+
+
+def open_snapshot(csv_path):
+    """SnapshotInventory for csv_path, or None if the snapshot is missing, invalid or stale."""
+    path = snapshot_path_for(csv_path)
+    try:
+        csv_stat = os.stat(csv_path)
+        with open(path, "rb") as handle:
+            mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    if len(mapped) < _HEADER.size:
+        mapped.close()
+        return None
+    magic, version, count, size, mtime_ns, *offsets = _HEADER.unpack_from(mapped)
+    if magic != MAGIC or version != VERSION or (size, mtime_ns) != _signature(csv_stat):
+        mapped.close()
+        return None
+    return SnapshotInventory(mapped, count, *offsets)
+
+
+def _signature(stat):
+    return stat.st_size, stat.st_mtime_ns
+
+
+class SnapshotInventory(MutableMapping):
+    """
+    Inventory backed by a mapped snapshot plus an overlay of later changes.
+
+    Behaves like core.Inventory: items are [product_name, quantity] lists built on
+    read, iteration follows the CSV order and new products come after it.
+    """
+
+    def __init__(self, mapped, count, records_off, index_off, zero_off, zero_count, heap_off):
+        self._map = mapped
+        self._count = count
+        self._records_off = records_off
+        self._index_off = index_off
+        self._zero_off = zero_off
+        self._zero_count = zero_count
+        self._heap_off = heap_off
+        self._zero = None         # live zero-stock index, built on first use
+        self._updated = {}       # snapshot products changed in place
+        self._deleted = set()    # snapshot products deleted (they may come back as added)
+        self._added = {}         # products not in the snapshot, in insertion order
+
+    # --- snapshot access ---
+
+    def _record(self, row):
+        return _RECORD.unpack_from(self._map, self._records_off + row * _RECORD.size)
+
+    def _base_id(self, row):
+        id_off, _, id_len, _, _ = self._record(row)
+        start = self._heap_off + id_off
+        return self._map[start:start + id_len]
+
+    def _base_item(self, row):
+        _, name_off, _, name_len, quantity = self._record(row)
+        start = self._heap_off + name_off
+        return [self._map[start:start + name_len].decode("utf-8"), quantity]
+
+    def _find(self, product_id):
+        """Row of product_id in the snapshot (ignoring the overlay), or -1."""
+        key = product_id.encode("utf-8")
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            row = _ROW.unpack_from(self._map, self._index_off + middle * _ROW.size)[0]
+            found = self._base_id(row)
+            if found < key:
+                low = middle + 1
+            elif found > key:
+                high = middle
+            else:
+                return row
+        return -1
+
+    # --- mapping ---
+
+    def __len__(self):
+        return self._count - len(self._deleted) + len(self._added)
+
+    def __iter__(self):
+        for row in range(self._count):
+            product_id = self._base_id(row).decode("utf-8")
+            if product_id not in self._deleted:
+                yield product_id
+        yield from self._added
+
+    def __contains__(self, product_id):
+        if product_id in self._added:
+            return True
+        return product_id not in self._deleted and self._find(product_id) >= 0
+
+    def __getitem__(self, product_id):
+        if product_id in self._added:
+            return list(self._added[product_id])
+        if product_id not in self._deleted:
+            if product_id in self._updated:
+                return list(self._updated[product_id])
+            row = self._find(product_id)
+            if row >= 0:
+                return self._base_item(row)
+        raise KeyError(product_id)
+
+    def __setitem__(self, product_id, value):
+        name, quantity = value
+        item = (name, quantity)
+        if product_id in self._added or product_id in self._deleted or self._find(product_id) < 0:
+            self._added[product_id] = item
+        else:
+            self._updated[product_id] = item
+        if self._zero is not None:
+            if quantity == 0:
+                self._zero.add(product_id)
+            else:
+                self._zero.discard(product_id)
+
+    def __delitem__(self, product_id):
+        if product_id in self._added:
+            del self._added[product_id]
+        elif product_id not in self._deleted and self._find(product_id) >= 0:
+            self._deleted.add(product_id)
+            self._updated.pop(product_id, None)
+        else:
+            raise KeyError(product_id)
+        if self._zero is not None:
+            self._zero.discard(product_id)
+
+    def __repr__(self):
+        return f"SnapshotInventory({len(self)} products)"
+
+    def quantity(self, product_id):
+        """Quantity of product_id."""
+        return self[product_id][1]
+
+    def name(self, product_id):
+        """Name of product_id."""
+        return self[product_id][0]
+
+    def zero_stock(self):
+        """
+        Set of product_ids with quantity 0. It is the live index: do not modify it.
+        The first call reads the snapshot's zero rows and applies the overlay; from then
+        on every write keeps it up to date, as in core.Inventory.
+        """
+        if self._zero is None:
+            zero = {
+                self._base_id(_ROW.unpack_from(self._map, self._zero_off + i * _ROW.size)[0]).decode("utf-8")
+                for i in range(self._zero_count)
+            }
+            zero -= self._deleted
+            for overlay in (self._updated, self._added):
+                for product_id, (_, quantity) in overlay.items():
+                    if quantity == 0:
+                        zero.add(product_id)
+                    else:
+                        zero.discard(product_id)
+            self._zero = zero
+        return self._zero
+
+    def rows(self):
+        """Yield (product_id, product_name, quantity) tuples in inventory order."""
+        for row in range(self._count):
+            product_id = self._base_id(row).decode("utf-8")
+            if product_id in self._deleted:
+                continue
+            item = self._updated.get(product_id)
+            yield (product_id, *(item or self._base_item(row)))
+        for product_id, item in self._added.items():
+            yield (product_id, *item)
+
+    def close(self):
+        """Unmap the snapshot file."""
+        self._map.close()
@@ -0,0 +1,76 @@
+# Forecast context and product read tests for ai_service.py — W06 Final Project Milestone
+
+import json
+import os
+import tempfile
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+# The database module connects on import: point it at a throwaway SQLite file first
+os.environ["DB_URL"] = f"sqlite:///{tempfile.mkdtemp()}/test_ai_service.db"
+
+import ai_service
+from database import DEFAULT_STORE, PlazoAgotado
+
+
+def _summary(path, products):
+    path.write_text(json.dumps({"generated_on": "2026-01-01", "products": products}), encoding="utf-8")
+
+
+# --- test_contexto_pronostico ---
+
+
+def test_forecast_context_is_per_store(tmp_path, monkeypatch):
+    """_contexto_pronostico: {store_id} selects each store's summary; a plain path only serves DEFAULT_STORE."""
+    row = {"product_name": "Arroz", "velocity": 2.0, "days_of_cover": 1.5, "reorder_point": 20.0, "suggested_order": 30}
+    _summary(tmp_path / "pronostico-norte.json", [row])
+    monkeypatch.setattr(ai_service, "_pronostico_cache", {})
+    monkeypatch.setattr(ai_service, "PRONOSTICO_PATH", str(tmp_path / "pronostico-{store_id}.json"))
+    assert "Arroz: 1.5 días de cobertura" in ai_service._contexto_pronostico("norte")
+    assert ai_service._contexto_pronostico("sur") == ""
+    assert ai_service._contexto_pronostico("../norte") == ""
+
+    monkeypatch.setattr(ai_service, "PRONOSTICO_PATH", str(tmp_path / "pronostico-norte.json"))
+    assert "Arroz" in ai_service._contexto_pronostico(DEFAULT_STORE)
+    assert ai_service._contexto_pronostico("otra-tienda") == ""
+
+
+def test_malformed_forecast_summary_is_ignored(tmp_path, monkeypatch):
+    """_contexto_pronostico: missing or mistyped fields give no context instead of an error."""
+    path = tmp_path / "pronostico.json"
+    monkeypatch.setattr(ai_service, "_pronostico_cache", {})
+    monkeypatch.setattr(ai_service, "PRONOSTICO_PATH", str(path))
+    _summary(path, [{"product_name": "Arroz"}])
+    assert ai_service._contexto_pronostico(DEFAULT_STORE) == ""
+    _summary(path, ["Arroz"])
+    os.utime(path, ns=(1, 1))
+    assert ai_service._contexto_pronostico(DEFAULT_STORE) == ""
+
+
+# --- test_obtener_productos_desde_db ---
+
+
+class _FailingSession:
+    def __init__(self, error):
+        self.error = error
+        self.closed = False
+
+    def query(self, *args):
+        raise self.error
+
+    def close(self):
+        self.closed = True
+
+
+def test_deadline_errors_propagate_and_outages_read_as_empty(monkeypatch):
+    """_obtener_productos_desde_db: PlazoAgotado reaches the caller; an unavailable database gives []."""
+    session = _FailingSession(PlazoAgotado("La consulta superó el plazo de la petición"))
+    monkeypatch.setattr(ai_service, "get_read_session", lambda store_id, min_version: session)
+    with pytest.raises(PlazoAgotado):
+        ai_service._obtener_productos_desde_db(DEFAULT_STORE)
+    assert session.closed
+
+    session = _FailingSession(OperationalError("SELECT", {}, Exception("could not connect")))
+    monkeypatch.setattr(ai_service, "get_read_session", lambda store_id, min_version: session)
+    assert ai_service._obtener_productos_desde_db(DEFAULT_STORE) == []
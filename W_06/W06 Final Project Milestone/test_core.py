@@ -2,11 +2,20 @@
 
 import pytest
 from core import (
+    Inventory,
     load_inventory,
     update_stock,
     add_product,
     delete_product,
     get_out_of_stock_requested,
+    load_request_list,
+    apply_batch,
+    BatchResult,
+    load_delivery_note,
+    get_high_rotation_products,
+    top_selling_products,
+    read_sales_log,
+    RotationWindow,
 )
 
 
@@ -70,6 +79,27 @@ def test_load_inventory():
     assert result2 == expected
 
 
+def test_load_inventory_parallel_matches_sequential(tmp_path, monkeypatch):
+    """load_inventory: chunked worker processes give the same rows, order and parsing rules."""
+    import core
+
+    path = tmp_path / "inventory.csv"
+    lines = ["quantity,product_name,product_id"]
+    for i in range(300):
+        lines.append(f"{'n/a' if i % 7 == 0 else i},\" Producto, {i} \",{'' if i % 11 == 0 else f'P{i % 250:03d}'}")
+    lines.append("5,solo nombre")
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    expected = load_inventory(str(path), workers=1)
+
+    monkeypatch.setattr(core, "LOAD_PARALLEL_MIN_BYTES", 0)
+    parallel = load_inventory(str(path), workers=3)
+    assert list(parallel.rows()) == list(expected.rows())
+    # Later rows win, rows without product_id are skipped and bad quantities read as 0
+    assert expected["P007"] == ["Producto, 257", 257]
+    assert expected["P014"] == ["Producto, 14", 0]
+    assert "P055" not in expected and len(expected) == 232
+
+
 # --- test_add_product ---
 
 
@@ -98,3 +128,107 @@ def test_delete_product():
     assert inv["P003"] == ["Milo", 25]
     with pytest.raises(KeyError, match="Product not found"):
         delete_product(inv, "P999")
+
+
+# --- test_inventory ---
+
+
+def test_inventory_behaves_like_dict_of_lists():
+    """Inventory: core functions work on it and it compares equal to the equivalent dict."""
+    inv = Inventory({"P001": ["Arroz", 50], "P004": ["Sal", 0]})
+    update_stock(inv, "P001", -20)
+    add_product(inv, "P002", "Leche", 45)
+    delete_product(inv, "P004")
+    assert inv == {"P001": ["Arroz", 30], "P002": ["Leche", 45]}
+    assert list(inv) == ["P001", "P002"]
+    assert inv.quantity("P001") == 30 and inv.name("P002") == "Leche"
+    with pytest.raises(KeyError):
+        inv["P004"]
+
+
+def test_inventory_reuses_rows_and_compacts_names():
+    """Inventory: deleted rows are reused and renamed products keep their new names after compaction."""
+    inv = Inventory()
+    for i in range(10):
+        inv[f"P{i:03d}"] = [f"Producto {i}", i]
+    del inv["P003"]
+    inv["P100"] = ["Nuevo", 7]
+    inv["P001"] = ["Renombrado ñ", 1]
+    inv.compact()
+    assert inv["P100"] == ["Nuevo", 7]
+    assert inv["P001"] == ["Renombrado ñ", 1]
+    assert list(inv.rows())[-1] == ("P100", "Nuevo", 7)
+    assert len(inv) == 10
+
+
+def test_inventory_zero_stock_index_and_request_files(tmp_path):
+    """Inventory: the zero-stock set follows every write; reports match the plain dict result."""
+    inv = Inventory({"P001": ["Arroz", 5], "P002": ["Leche", 0], "P003": ["Milo", 0]})
+    update_stock(inv, "P001", -5)
+    update_stock(inv, "P002", 3)
+    add_product(inv, "P004", "Sal", 0)
+    delete_product(inv, "P003")
+    assert inv.zero_stock() == {"P001", "P004"}
+
+    requests_file = tmp_path / "pedidos.txt"
+    requests_file.write_text("# pedidos\nP004\nP009\nP002  # sin stock?\nP001\nP004\n", encoding="utf-8")
+    requested = load_request_list(str(requests_file))
+    assert list(requested) == ["P004", "P009", "P002", "P001"]
+    expected = get_out_of_stock_requested(dict(inv), list(requested))
+    assert expected == ["Sal", "Arroz"]
+    assert get_out_of_stock_requested(inv, requested) == expected
+    assert get_out_of_stock_requested(inv, list(requested)) == expected
+    assert load_request_list(str(tmp_path / "missing.txt")) == {}
+
+
+# --- test_apply_batch ---
+
+
+def test_apply_batch_is_all_or_nothing():
+    """apply_batch: one bad line leaves the inventory untouched and is reported by line number."""
+    inv = Inventory({"P001": ["Arroz", 5], "P002": ["Leche", 1]})
+    result = apply_batch(inv, [("P001", 3), ("P002", -2), ("P009", 1), ("P001", "x")])
+    assert not result.applied and result.lines == 4
+    assert result.errors == {1: "Insufficient stock", 2: "Product not found: P009", 3: "Invalid change: 'x'"}
+    assert result.statuses() == [BatchResult.NOT_APPLIED, "Insufficient stock",
+                                 "Product not found: P009", "Invalid change: 'x'"]
+    assert inv == {"P001": ["Arroz", 5], "P002": ["Leche", 1]}
+
+
+def test_apply_batch_aggregates_duplicates(tmp_path):
+    """apply_batch: changes per product are netted before validation; a delivery note CSV loads in order."""
+    note = tmp_path / "nota.csv"
+    note.write_text("product_id,quantity,comment\nP002,5,entrega\nP002,-6,pedido\n,3,\nP001,-5\n", encoding="utf-8")
+    lines = load_delivery_note(str(note))
+    assert lines == [("P002", "5"), ("P002", "-6"), ("P001", "-5")]
+    inv = Inventory({"P001": ["Arroz", 5], "P002": ["Leche", 1]})
+    result = apply_batch(inv, lines)
+    assert result.applied and result.errors == {}
+    assert result.changed == {"P002": 0, "P001": 0}
+    assert result.statuses() == [BatchResult.APPLIED] * 3
+    assert inv.zero_stock() == {"P001", "P002"}
+
+
+# --- test_rotation ---
+
+
+def test_high_rotation_streams_any_iterable():
+    """get_high_rotation_products / top_selling_products: count a generator once, first-sale order."""
+    sales = ["P002", "P001", "P002", "P003", "P001", "P002"]
+    assert get_high_rotation_products(iter(sales), 1) == ["P002", "P001"]
+    assert top_selling_products(sales, 2) == [("P002", 3), ("P001", 2)]
+
+
+def test_rotation_window_from_sales_log(tmp_path):
+    """RotationWindow: only the last N days count; older days are subtracted as the window moves; bad dates are skipped."""
+    log = tmp_path / "sales.log"
+    log.write_text(
+        "2024-03-01,P001\n2024-03-01,P001\n2024-03-05,P002\n\n2024-13-05,P002\nayer,P001\n"
+        "2024-03-07T10:15:00,P001\n2024-03-06,P002\nP009\n",
+        encoding="utf-8",
+    )
+    window = RotationWindow(days=5)
+    window.add_all(read_sales_log(str(log)))
+    assert window.counts() == {"P001": 1, "P002": 2}
+    assert window.high_rotation(1) == ["P002"]
+    assert window.top(1) == [("P002", 2)]
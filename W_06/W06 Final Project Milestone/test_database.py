@@ -0,0 +1,273 @@
+# Concurrent write tests for database.py — W06 Final Project Milestone
+
+import os
+import random
+import tempfile
+import threading
+import time
+
+import pytest
+from sqlalchemy import event, text
+from sqlalchemy.pool import QueuePool
+
+# The database module connects on import: point it at a throwaway SQLite file first
+os.environ["DB_URL"] = f"sqlite:///{tempfile.mkdtemp()}/test_database.db"
+
+import database
+from write_buffer import StockWriteBuffer
+
+WRITERS = 8
+WRITES_PER_WRITER = 40
+
+
+# --- test_inventory_stats ---
+
+
+def test_concurrent_writes_keep_inventory_stats_exact():
+    """inventory_stats: mixed concurrent updates, adjustments and upserts leave no drift."""
+    store = "estadisticas-concurrentes"
+    session = database.get_session()
+    try:
+        database.upsert_products(session, [(f"S{i:02d}", f"Producto {i}", i % 3) for i in range(20)], store)
+        ids = [p.id for p in session.query(database.Product).filter(database.Product.store_id == store)]
+    finally:
+        session.close()
+
+    barrier = threading.Barrier(WRITERS)
+    errors = []
+
+    def writer(seed):
+        rng = random.Random(seed)
+        barrier.wait()
+        for _ in range(WRITES_PER_WRITER):
+            session = database.get_session()
+            try:
+                choice = rng.random()
+                if choice < 0.4:
+                    database.update_product(session, rng.choice(ids), quantity=rng.randrange(0, 60), store_id=store)
+                elif choice < 0.8:
+                    try:
+                        database.adjust_stock(session, rng.choice(ids), rng.randrange(-5, 6), store_id=store)
+                    except ValueError:
+                        pass   # insufficient stock is an expected outcome here
+                else:
+                    n = rng.randrange(20)
+                    database.upsert_products(session, [(f"S{n:02d}", f"Producto {n}", rng.randrange(0, 60))], store)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                session.close()
+
+    threads = [threading.Thread(target=writer, args=(seed,)) for seed in range(WRITERS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    session = database.get_session()
+    try:
+        assert database.verificar_estadisticas(session, store) == []
+    finally:
+        session.close()
+
+
+# --- test_crear_engine ---
+
+
+def test_sqlite_profile_pools_connections_with_wal_pragmas():
+    """crear_engine: a SQLite file gets a shared QueuePool and the WAL pragmas on every connection."""
+    pool = database.engine.pool
+    assert isinstance(pool, QueuePool) and pool.size() == database.SQLITE_POOL_SIZE
+    with database.engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar().lower() == "wal"
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1      # NORMAL
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == database.SQLITE_BUSY_TIMEOUT_MS
+
+    # Connections are checked in by one thread and reused by another
+    results = []
+
+    def query():
+        with database.engine.connect() as conn:
+            results.append(conn.exec_driver_sql("SELECT 1").scalar())
+
+    worker = threading.Thread(target=query)
+    worker.start()
+    worker.join()
+    assert results == [1]
+
+    memory = database.crear_engine("sqlite://")
+    assert not isinstance(memory.pool, QueuePool)
+    memory.dispose()
+
+
+# --- test_escritor ---
+
+
+def test_writer_lock_wait_is_bounded_by_pool_timeout(monkeypatch):
+    """escritor: inside a request, waiting for the SQLite writer gives up after DB_POOL_TIMEOUT_S."""
+    monkeypatch.setattr(database, "DB_POOL_TIMEOUT_S", 0.1)
+    token = database.plazo_actual.set(time.monotonic() + 30)
+    database._lock_escritor.acquire()
+    try:
+        started = time.monotonic()
+        with pytest.raises(database.PlazoAgotado):
+            with database.escritor():
+                pass
+        assert time.monotonic() - started < 5
+    finally:
+        database._lock_escritor.release()
+        database.plazo_actual.reset(token)
+
+
+# --- test_listar_cambios ---
+
+
+def test_change_feed_pages_within_a_single_version():
+    """listar_cambios: a bulk upsert under one version is paged by (version, id) and honours limite."""
+    store = "cambios-paginados"
+    session = database.get_session()
+    try:
+        database.upsert_products(session, [(f"C{i:02d}", f"Producto {i}", i) for i in range(25)], store)
+        seen, cursor, pages = [], (0, 0), 0
+        while True:
+            version, desde_id, filas = database.listar_cambios(session, store, cursor[0], limite=10, desde_id=cursor[1])
+            assert len(filas) <= 10
+            seen += [p.product_id for p in filas]
+            pages += 1
+            cursor = (version, desde_id)
+            if desde_id == 0:
+                break
+        assert sorted(seen) == [f"C{i:02d}" for i in range(25)] and len(seen) == 25
+        assert pages == 3
+        assert database.listar_cambios(session, store, cursor[0], desde_id=cursor[1])[2] == []
+    finally:
+        session.close()
+
+
+# --- test_motor_lectura ---
+
+
+def _replica_with(tmp_path, store, version, name):
+    """A second SQLite file standing in for the read replica, holding one product of the store."""
+    replica = database.crear_engine(f"sqlite:///{tmp_path}/replica.db")
+    # models.py maps "public.products" on the same Base: create only database.py's tables
+    tables = [database.Product.__table__, database.StoreVersion.__table__]
+    database.Base.metadata.create_all(bind=replica, tables=tables)
+    session = database.SessionLocal(bind=replica)
+    try:
+        session.merge(database.StoreVersion(store_id=store, version=version, purged_version=0))
+        session.add(database.Product(store_id=store, product_id="R01", name=name, quantity=1, version=version))
+        session.commit()
+    finally:
+        session.close()
+    return replica
+
+
+def _names(store, min_version=None):
+    session = database.get_read_session(store, min_version)
+    try:
+        return [p.name for p in session.query(database.Product).filter(database.Product.store_id == store)]
+    finally:
+        session.close()
+
+
+def test_reads_use_the_replica_and_fall_back_to_the_primary(tmp_path, monkeypatch):
+    """motor_lectura: an up-to-date replica serves reads; lag, client versions and outages go to the primary."""
+    store = "replicada"
+    session = database.get_session()
+    try:
+        database.upsert_products(session, [("R01", "en el primario", 1)], store)
+        version = database._version_tienda(database.engine, store)
+    finally:
+        session.close()
+    monkeypatch.setattr(database, "REPLICA_CHECK_S", -1)   # re-check on every read
+    monkeypatch.setattr(database, "_revisiones_replica", {})
+
+    # Up to date: reads come from the replica file
+    replica = _replica_with(tmp_path, store, version, "en la réplica")
+    monkeypatch.setattr(database, "engine_lectura", replica)
+    assert database.motor_lectura(store) is replica
+    assert _names(store) == ["en la réplica"]
+    # The client already wrote a newer version than the replica has
+    assert _names(store, min_version=version + 1) == ["en el primario"]
+
+    # Lagging: the primary moves on, the replica does not
+    session = database.get_session()
+    try:
+        database.upsert_products(session, [("R01", "en el primario", 2)], store)
+    finally:
+        session.close()
+    assert database.motor_lectura(store) is database.engine
+    assert _names(store) == ["en el primario"]
+
+    # Unavailable: the replica file cannot be opened
+    caida = database.crear_engine(f"sqlite:///{tmp_path}/no-existe/replica.db")
+    monkeypatch.setattr(database, "engine_lectura", caida)
+    assert database.motor_lectura(store) is database.engine
+    assert _names(store) == ["en el primario"]
+    replica.dispose()
+
+
+# --- test_stock_write_buffer ---
+
+
+def _buffered_product(store, quantity):
+    session = database.get_session()
+    try:
+        database.upsert_products(session, [("B01", "Producto buffer", quantity)], store)
+        return session.query(database.Product).filter_by(store_id=store, product_id="B01").one().id
+    finally:
+        session.close()
+
+
+def _quantity(product_id):
+    session = database.get_session()
+    try:
+        return session.get(database.Product, product_id).quantity
+    finally:
+        session.close()
+
+
+def test_buffered_deltas_for_one_product_coalesce_into_one_write():
+    """StockWriteBuffer: a batch of deltas on the same product is a single UPDATE of products."""
+    store = "buffer-agrupado"
+    product_id = _buffered_product(store, 10)
+    updates = []
+
+    def count_updates(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("UPDATE PRODUCTS"):
+            updates.append(statement)
+
+    event.listen(database.engine, "before_cursor_execute", count_updates)
+    buffer = StockWriteBuffer(ventana_ms=5000, max_ops=5)
+    try:
+        futures = [buffer.enviar(product_id, delta, store) for delta in (-1, -2, 3, -4, -1)]
+        assert [f.result(timeout=10) for f in futures] == [9, 7, 10, 6, 5]
+    finally:
+        buffer.cerrar()
+        event.remove(database.engine, "before_cursor_execute", count_updates)
+    assert len(updates) == 1
+    assert _quantity(product_id) == 5
+
+
+def test_rejected_buffered_delta_never_drives_stock_negative():
+    """StockWriteBuffer: a delta below zero fails alone; the rest of the batch still applies."""
+    store = "buffer-rechazo"
+    product_id = _buffered_product(store, 3)
+    buffer = StockWriteBuffer(ventana_ms=5000, max_ops=5)
+    try:
+        futures = [buffer.enviar(product_id, delta, store) for delta in (-2, -2, 1, -2, -1)]
+        assert futures[0].result(timeout=10) == 1
+        assert [f.result(timeout=10) for f in futures[2:4]] == [2, 0]
+        for rejected in (futures[1], futures[4]):
+            with pytest.raises(ValueError):
+                rejected.result(timeout=10)
+    finally:
+        buffer.cerrar()
+    assert _quantity(product_id) == 0
+    session = database.get_session()
+    try:
+        assert database.verificar_estadisticas(session, store) == []
+    finally:
+        session.close()
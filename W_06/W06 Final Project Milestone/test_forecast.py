@@ -0,0 +1,90 @@
+# Reorder forecasting tests for forecast.py — W06 Final Project Milestone
+
+import tracemalloc
+from datetime import date, timedelta
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import forecast
+from core import Inventory, read_sales_log
+
+
+# --- test_forecast ---
+
+
+def test_forecast_velocity_cover_and_reorder():
+    """forecast: steady sellers below the reorder point get an order; unsold products never do."""
+    daily = np.array([[2, 2, 2, 2], [0, 0, 0, 0], [0, 4, 0, 4]], dtype=np.int32)
+    result = forecast.forecast(daily, [10, 3, 30], lead_time_days=7, review_days=7, service_z=1.65)
+    assert result.velocity.tolist() == [2.0, 0.0, 2.0]
+    assert result.days_of_cover.tolist() == [5.0, float("inf"), 15.0]
+    assert result.reorder_point[0] == 14.0
+    assert result.reorder_point[2] == pytest.approx(14 + 1.65 * 2 * 7 ** 0.5)
+    assert result.suggested_order.tolist() == [18, 0, 0]
+    assert forecast.most_urgent(result, 5).tolist() == [0]
+
+
+def test_forecast_inventory_from_sales_log(tmp_path):
+    """forecast_inventory: counts log sales per product and day inside the window only."""
+    log = tmp_path / "ventas.log"
+    log.write_text(
+        "2024-01-01,P001\n2024-03-09,P001\n2024-03-10,P001\n2024-03-10,P001\n"
+        "2024-03-10,P002\n2024-03-10,P999\nP001\n",
+        encoding="utf-8",
+    )
+    inv = Inventory({"P001": ["Arroz", 1], "P002": ["Leche", 40]})
+    ids, names, result = forecast.forecast_inventory(inv, read_sales_log(str(log)), end_day=date(2024, 3, 10), days=10)
+    assert ids == ["P001", "P002"]
+    assert result.velocity.tolist() == [0.3, 0.1]
+    report = forecast.urgent_report(ids, names, result, k=3)
+    assert [row["product_id"] for row in report] == ["P001"]
+    assert report[0]["days_of_cover"] == pytest.approx(3.3)
+
+
+# --- test_daily_sales_totals ---
+
+
+def test_sparse_totals_match_the_dense_matrix(monkeypatch):
+    """daily_sales_totals: per-product totals and squares equal those of the products x days matrix."""
+    monkeypatch.setattr(forecast, "EVENT_BATCH", 64)
+    rng = np.random.default_rng(7)
+    products, days, end_day = 30, 20, date(2024, 3, 10)
+    codes = {f"P{i:03d}": i for i in range(products)}
+    rows = rng.integers(0, products, 2000)
+    offsets = rng.integers(0, days + 5, 2000)
+    sales = [(end_day - timedelta(days=int(o)), f"P{r:03d}") for r, o in zip(rows, offsets)]
+
+    dense = np.zeros((products, days), dtype=np.int32)
+    for r, o in zip(rows, offsets):
+        if o < days:
+            dense[r, days - 1 - o] += 1
+    totals, squares = forecast.daily_sales_totals(sales, codes, end_day, days)
+    assert totals.tolist() == dense.sum(axis=1).tolist()
+    assert squares.tolist() == (dense.astype(np.int64) ** 2).sum(axis=1).tolist()
+
+    quantities = rng.integers(0, 50, products)
+    sparse = forecast.forecast_from_totals(totals, squares, days, quantities)
+    expected = forecast.forecast(dense, quantities)
+    assert np.allclose(sparse.reorder_point, expected.reorder_point)
+    assert np.allclose(sparse.reorder_point, dense.mean(axis=1) * forecast.LEAD_TIME_DAYS
+                       + forecast.SERVICE_Z * dense.std(axis=1) * forecast.LEAD_TIME_DAYS ** 0.5)
+    assert sparse.suggested_order.tolist() == expected.suggested_order.tolist()
+
+
+def test_memory_follows_sales_not_products_times_days():
+    """daily_sales_totals: 1M products x 365 days stays far below the 1.4 GB of a dense matrix."""
+    products, days, end_day = 1_000_000, 365, date(2024, 12, 31)
+    codes = {f"P{i:07d}": i for i in range(products)}
+    rng = np.random.default_rng(0)
+    sales = [(end_day - timedelta(days=int(o)), f"P{int(r):07d}")
+             for r, o in zip(rng.integers(0, products, 200_000), rng.integers(0, days, 200_000))]
+    tracemalloc.start()
+    try:
+        totals, squares = forecast.daily_sales_totals(sales, codes, end_day, days)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert totals.sum() == 200_000 and len(squares) == products
+    assert peak < 100 * 2 ** 20
@@ -0,0 +1,120 @@
+# Write-ahead journal tests for journal.py — W06 Final Project Milestone
+
+import journal as journal_module
+from core import load_inventory, save_inventory, update_stock
+from journal import InventoryJournal, JournalWriter, read_records
+
+
+def _snapshot(tmp_path):
+    path = tmp_path / "inventory.csv"
+    save_inventory(str(path), {"P001": ["Arroz", 50], "P002": ["Frijol", 0], "P003": ["Aceite", 8]})
+    return path
+
+
+# --- test_replay ---
+
+
+def test_journal_replays_over_snapshot_without_rewriting_it(tmp_path):
+    """InventoryJournal: changes survive a crash (no close) and the snapshot is left untouched."""
+    path = _snapshot(tmp_path)
+    before = path.read_bytes()
+    journal = InventoryJournal(path)
+    inventory = journal.load()
+    update_stock(inventory, "P001", 5)
+    journal.record_set("P001", *inventory["P001"])
+    journal.record_set("P004", "Sal, fina", 3)
+    journal.record_delete("P002")
+    journal.sync()
+
+    assert path.read_bytes() == before
+    reloaded = InventoryJournal(path).load()
+    assert dict(reloaded) == {"P001": ["Arroz", 55], "P003": ["Aceite", 8], "P004": ["Sal, fina", 3]}
+
+
+def test_journal_ignores_torn_tail(tmp_path):
+    """InventoryJournal: a half-written last record is dropped and later appends still replay."""
+    path = _snapshot(tmp_path)
+    journal = InventoryJournal(path)
+    journal.load()
+    journal.record_set("P003", "Aceite", 1)
+    journal.close()
+    with open(str(path) + ".journal", "a", encoding="utf-8") as handle:
+        handle.write("S,P001,Arroz,99")
+
+    journal = InventoryJournal(path)
+    inventory = journal.load()
+    assert inventory["P001"] == ["Arroz", 50]
+    journal.record_set("P001", "Arroz", 7)
+    journal.close()
+    assert InventoryJournal(path).load()["P001"] == ["Arroz", 7]
+
+
+# --- test_compaction ---
+
+
+def test_journal_compaction_writes_snapshot_and_empties_journal(tmp_path):
+    """InventoryJournal: compaction folds the journal into the CSV, atomically and in order."""
+    path = _snapshot(tmp_path)
+    journal = InventoryJournal(path, compact_bytes=200)
+    journal.load()
+    for i in range(20):
+        journal.record_set("P003", "Aceite", i)
+    journal.record_delete("P002")
+    journal.record_set("P005", "Azúcar", 12)
+    journal.compact(wait=True)
+    journal.close()
+
+    assert journal.compactions >= 1
+    assert dict(load_inventory(str(path))) == {"P001": ["Arroz", 50], "P003": ["Aceite", 19], "P005": ["Azúcar", 12]}
+    assert list(load_inventory(str(path))) == ["P001", "P003", "P005"]
+    assert not (tmp_path / "inventory.csv.journal.compacting").exists()
+    assert (tmp_path / "inventory.csv.journal").stat().st_size == 0
+
+
+def test_failed_compaction_is_merged_before_the_next_rotation(tmp_path, monkeypatch):
+    """InventoryJournal: a failed merge keeps its rotated journal and no temp file; the next rotation merges it first."""
+    path = _snapshot(tmp_path)
+    journal = InventoryJournal(path, binary_snapshot=False)
+    journal.load()
+    journal.record_set("P003", "Aceite", 1)
+
+    def failing_rows(snapshot_path):
+        raise OSError("disk full")
+        yield
+
+    with monkeypatch.context() as patch:
+        patch.setattr(journal_module, "_snapshot_rows", failing_rows)
+        journal.compact(wait=True)
+    assert journal.compactions == 0
+    assert (tmp_path / "inventory.csv.journal.compacting").exists()
+    assert not list(tmp_path.glob(".inventory-*.csv"))
+
+    journal.record_set("P001", "Arroz", 7)
+    journal.compact(wait=True)
+    journal.close()
+
+    assert journal.compactions == 2
+    assert dict(load_inventory(str(path))) == {"P001": ["Arroz", 7], "P002": ["Frijol", 0], "P003": ["Aceite", 1]}
+    assert not (tmp_path / "inventory.csv.journal.compacting").exists()
+
+
+# --- test_journal_writer ---
+
+
+def test_journal_writer_coalesces_bursts_and_flushes_on_close(tmp_path):
+    """JournalWriter: a burst on one product becomes one record; close writes what is still queued."""
+    path = _snapshot(tmp_path)
+    journal = InventoryJournal(path)
+    journal.load()
+    writer = JournalWriter(journal, coalesce_seconds=0.2)
+    for quantity in range(500):
+        writer.record_set("P001", "Arroz", quantity)
+    writer.record_delete("P002")
+    assert writer.state() == "saving"
+    assert writer.close(timeout=5)
+    assert writer.state() == "saved"
+    journal.close()
+
+    records = list(read_records(str(path) + ".journal"))
+    assert records == [("S", "P001", "Arroz", 499), ("D", "P002", "", 0)]
+    assert dict(InventoryJournal(path).load()) == {"P001": ["Arroz", 499], "P003": ["Aceite", 8]}
@@ -0,0 +1,79 @@
+# Request profiler tests for perfilador.py — W06 Final Project Milestone
+
+import time
+
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+import perfilador
+
+BUSY_S = 0.3
+
+
+def _spin():
+    end = time.perf_counter() + BUSY_S
+    while time.perf_counter() < end:
+        pass
+
+
+def slow_sync_dependency():
+    _spin()
+    return "ok"
+
+
+def slow_async_work():
+    _spin()
+
+
+def _client(tmp_path, monkeypatch):
+    monkeypatch.setattr(perfilador, "PROFILE_TOKEN", "secreto")
+    monkeypatch.setattr(perfilador, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(perfilador, "PROFILE_INTERVAL_MS", 2)
+    app = FastAPI()
+
+    @app.get("/sync")
+    def sync_endpoint(value: str = Depends(slow_sync_dependency)):
+        return {"value": value}
+
+    @app.get("/async")
+    async def async_endpoint():
+        slow_async_work()
+        return {"value": "ok"}
+
+    app.add_middleware(perfilador.MiddlewarePerfil, resolver_ruta=lambda scope: scope["path"])
+    return TestClient(app)
+
+
+def _collapsed(tmp_path, name):
+    return (tmp_path / f"{name}.collapsed").read_text(encoding="utf-8")
+
+
+# --- test_profiled_request ---
+
+
+def test_sync_dependencies_are_sampled(tmp_path, monkeypatch):
+    """MiddlewarePerfil: a sync dependency run in the threadpool shows up in the collapsed stacks."""
+    with _client(tmp_path, monkeypatch) as client:
+        response = client.get("/sync", headers={"X-Profile": "secreto"})
+    assert response.status_code == 200
+    assert "slow_sync_dependency" in _collapsed(tmp_path, "sync")
+
+
+def test_event_loop_work_of_the_request_is_sampled(tmp_path, monkeypatch):
+    """MiddlewarePerfil: code the request runs on the event loop thread is sampled too."""
+    with _client(tmp_path, monkeypatch) as client:
+        client.get("/async", headers={"X-Profile": "secreto"})
+    assert "slow_async_work" in _collapsed(tmp_path, "async")
+
+
+def test_unprofiled_requests_and_save_errors_keep_the_response(tmp_path, monkeypatch):
+    """MiddlewarePerfil: no header means no files; a failing guardar still returns the response."""
+    with _client(tmp_path, monkeypatch) as client:
+        assert client.get("/async").status_code == 200
+        assert list(tmp_path.iterdir()) == []
+
+        def broken(self, ruta, directorio=None):
+            raise OSError("disco lleno")
+
+        monkeypatch.setattr(perfilador.Perfil, "guardar", broken)
+        assert client.get("/async", headers={"X-Profile": "secreto"}).status_code == 200
@@ -0,0 +1,47 @@
+# Rule engine tests for reglas.py — W06 Final Project Milestone
+
+from reglas import calcular_estadisticas, consejo_combinado, resolver
+
+
+def _stats(*cantidades, **previas):
+    stats = calcular_estadisticas((f"Prod{i}", q) for i, q in enumerate(cantidades))
+    for campo, valor in previas.items():
+        setattr(stats, campo, valor)
+    return stats
+
+
+# --- test_calcular_estadisticas ---
+
+
+def test_calcular_estadisticas_bands():
+    """calcular_estadisticas: counts SKUs, units and stock bands; keeps at most 3 names per band."""
+    stats = _stats(0, 0, 0, 0, 5, 30, 100)
+    assert (stats.total_skus, stats.total_unidades) == (7, 135)
+    assert (stats.en_cero, stats.bajos, stats.medios, stats.altos) == (4, 1, 1, 1)
+    assert stats.nombres_cero == ["Prod0", "Prod1", "Prod2"]
+    assert stats.nombres_bajos == ["Prod4"]
+
+
+# --- test_resolver ---
+
+
+def test_resolver_trivial_states_answered_by_rules():
+    """resolver: empty, healthy and zero-stock-only inventories never reach the model."""
+    assert resolver(_stats())[0] == "vacio"
+    assert resolver(_stats(50, 80))[0] == "saludable"
+    regla, consejo = resolver(_stats(0, 0, 0, 0, 0, 80))
+    assert regla == "solo_agotados"
+    assert consejo == "URGENTE: Prod0, Prod1, Prod2... están en cero. Revisa tu inventario completo."
+
+
+def test_resolver_delegates_complex_states_and_sharp_drops():
+    """resolver: many mixed problems or a sharp drop in units return None for the model."""
+    assert resolver(_stats(0, 0, 3, 3, 3, 80)) == ("complejo", None)
+    assert resolver(_stats(50, 50, unidades_previas=500)) == ("caida_brusca", None)
+
+
+def test_consejo_combinado_matches_previous_fallback_text():
+    """consejo_combinado: zero and low stock are reported as in the original fallback."""
+    assert consejo_combinado(_stats(0, 5, 80)) == (
+        "URGENTE: Prod0 están en cero. Poco stock: Prod1. Revisa tu inventario completo."
+    )
@@ -0,0 +1,53 @@
+# Name search tests for search_index.py — W06 Final Project Milestone
+
+from core import Inventory
+from search_index import NameIndex, normalize
+
+
+def _index(inventory):
+    index = NameIndex(inventory.name)
+    index.add_many((product_id, name) for product_id, name, _ in inventory.rows())
+    return index
+
+
+# --- test_search ---
+
+
+def test_search_ignores_case_and_accents():
+    """NameIndex.search: substring matches in catalog order, without case or accents."""
+    inventory = Inventory({
+        "P001": ["Azúcar Refinada", 5],
+        "P002": ["Arroz Blanco", 3],
+        "P003": ["AZUCAR morena", 0],
+        "P004": ["Café de Olla", 2],
+    })
+    index = _index(inventory)
+    assert normalize("Azúcar CAFÉ") == "azucar cafe"
+    assert index.search("azucar") == ["P001", "P003"]
+    assert index.search("CAFÉ") == ["P004"]
+    assert index.search("car ref") == ["P001"]
+    assert index.search("leche") == [] and index.search("  ") == []
+
+
+def test_short_queries_match_word_prefixes():
+    """NameIndex.search: one or two characters match the start of any word."""
+    inventory = Inventory({"P001": ["Arroz Blanco", 1], "P002": ["Pan blanco", 1], "P003": ["Harina", 1]})
+    index = _index(inventory)
+    assert index.search("b") == ["P001", "P002"]
+    assert index.search("ar") == ["P001"]
+    assert index.search("rr") == []
+
+
+def test_discard_add_and_limit():
+    """NameIndex: deleted products disappear, renamed ones are found by the new name; limit stops early."""
+    inventory = Inventory({f"P{i:03d}": [f"Leche {i}", i] for i in range(1, 21)})
+    index = _index(inventory)
+    assert index.search("leche", limit=5) == ["P001", "P002", "P003", "P004", "P005"]
+
+    del inventory["P002"]
+    index.discard("P002")
+    inventory["P003"] = ["Yogur", 3]
+    index.add("P003", "Yogur")
+    assert index.search("leche", limit=3) == ["P001", "P004", "P005"]
+    assert index.search("yog") == ["P003"]
+    assert len(index) == 19
@@ -0,0 +1,259 @@
+# API tests for server.py — W06 Final Project Milestone
+
+import io
+import os
+import re
+import tempfile
+import time
+from collections import deque
+
+import pytest
+
+# The database module connects on import: point it at a throwaway SQLite file first
+os.environ["DB_URL"] = f"sqlite:///{tempfile.mkdtemp()}/test_server.py.db"
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+import database
+import exportador
+import server
+import trazas
+from core import load_inventory
+
+TOKENS = {
+    "token-norte": {"sub": "u1", "app_metadata": {"stores": ["norte"]}},
+    "token-sur": {"sub": "u2", "app_metadata": {"stores": ["sur"]}},
+    "token-centro": {"sub": "u3", "app_metadata": {"stores": ["centro"]}},
+    "token-importada": {"sub": "u4", "app_metadata": {"stores": ["importada"]}},
+    "token-exportada": {"sub": "u5", "app_metadata": {"stores": ["exportada"]}},
+}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(server, "validate_jwt", TOKENS.get)
+    return TestClient(server.app)
+
+
+def _headers(store, token=None):
+    headers = {"X-Store-Id": store}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    return headers
+
+
+def _product(store):
+    session = database.get_session()
+    try:
+        return database.create_product(session, "Arroz", 10, store_id=store).id
+    finally:
+        session.close()
+
+
+# --- test_get_tienda ---
+
+
+def test_reads_of_another_store_need_an_authorized_token(client):
+    """get_tienda: /estadisticas and /productos/exportar refuse stores the caller is not authorized for."""
+    _product("norte")
+    for path in ("/estadisticas", "/productos/exportar"):
+        assert client.get(path, headers=_headers("norte")).status_code == 401
+        assert client.get(path, headers=_headers("norte", "token-invalido")).status_code == 401
+        assert client.get(path, headers=_headers("norte", "token-sur")).status_code == 403
+        assert client.get(path, headers=_headers("norte", "token-norte")).status_code == 200
+    assert client.get("/estadisticas").status_code == 200
+
+
+def test_writes_to_another_store_are_forbidden(client):
+    """get_tienda: a token for one store cannot create or update products of another."""
+    product_id = _product("norte")
+    session = database.get_session()
+    try:
+        skus = database.calcular_estadisticas_inventario(session, "norte")["total_skus"]
+    finally:
+        session.close()
+
+    response = client.put(f"/productos/{product_id}", json={"cantidad": 0},
+                          headers=_headers("norte", "token-sur"))
+    assert response.status_code == 403
+    response = client.post("/productos", json={"nombre": "Frijol", "cantidad": 1},
+                           headers=_headers("norte", "token-sur"))
+    assert response.status_code == 403
+
+    session = database.get_session()
+    try:
+        assert session.get(database.Product, product_id).quantity == 10
+        assert database.calcular_estadisticas_inventario(session, "norte")["total_skus"] == skus
+    finally:
+        session.close()
+
+    response = client.put(f"/productos/{product_id}", json={"cantidad": 4},
+                          headers=_headers("norte", "token-norte"))
+    assert response.status_code == 200 and response.json()["quantity"] == 4
+
+
+# --- test_estadisticas_verificar ---
+
+
+def test_verification_is_read_only_and_rebuild_needs_a_post(client):
+    """/estadisticas/verificar only reports drift; POST /estadisticas/reconstruir fixes it."""
+    _product("centro")
+    session = database.get_session()
+    try:
+        session.query(database.InventoryStats).filter_by(store_id="centro").update({"total_unidades": 999})
+        session.commit()
+    finally:
+        session.close()
+    headers = _headers("centro", "token-centro")
+
+    for _ in range(2):
+        response = client.get("/estadisticas/verificar", params={"corregir": "true"}, headers=headers)
+        assert response.status_code == 200
+        assert response.json()["deriva"] and not response.json()["corregido"]
+
+    assert client.post("/estadisticas/reconstruir", headers=_headers("centro")).status_code == 401
+    response = client.post("/estadisticas/reconstruir", headers=headers)
+    assert response.status_code == 200 and response.json()["corregido"]
+    assert not client.get("/estadisticas/verificar", headers=headers).json()["deriva"]
+
+
+# --- test_importar ---
+
+
+def _wait_for_import(client, job_id, headers):
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        job = client.get(f"/productos/importar/{job_id}", headers=headers).json()
+        if job["estado"] in ("completado", "error"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"import {job_id} did not finish")
+
+
+def test_import_endpoint_reads_the_upload_in_the_background(client):
+    """POST /productos/importar: small (in-memory) and large (spooled to disk) uploads are imported."""
+    headers = _headers("importada", "token-importada")
+    small = "product_id,product_name,quantity\nI001,Arroz,5\n,Sin id,1\nI002,Leche,x\n"
+    response = client.post("/productos/importar", headers=headers,
+                           files={"archivo": ("catalogo.csv", small.encode("utf-8-sig"), "text/csv")})
+    assert response.status_code == 202
+    job = _wait_for_import(client, response.json()["job_id"], headers)
+    assert (job["estado"], job["insertadas"], job["omitidas"]) == ("completado", 2, 1)
+
+    large = "product_id,product_name,quantity\n" + "".join(f"L{i:06d},Producto {i},{i % 7}\n" for i in range(60_000))
+    assert len(large) > 1024 * 1024
+    response = client.post("/productos/importar", headers=headers,
+                           files={"archivo": ("catalogo.csv", large.encode(), "text/csv")})
+    job = _wait_for_import(client, response.json()["job_id"], headers)
+    assert (job["estado"], job["insertadas"], job["bytes_total"]) == ("completado", 60_000, len(large))
+
+    session = database.get_session()
+    try:
+        products = session.query(database.Product).filter_by(store_id="importada")
+        assert products.count() == 60_002
+        assert products.filter_by(product_id="I002").one().quantity == 0
+    finally:
+        session.close()
+
+
+# --- test_exportar ---
+
+
+@pytest.fixture
+def exported_store():
+    """Store "exportada" with 12 live products (one name needs CSV quoting) and one deleted."""
+    session = database.get_session()
+    try:
+        rows = [(f"E{i:03d}", f"Producto {i}", i) for i in range(12)] + [("E999", 'Salsa "picante", 1L', 4)]
+        database.upsert_products(session, rows, "exportada")
+        deleted = session.query(database.Product).filter_by(store_id="exportada", product_id="E000").one()
+        database.delete_product(session, deleted.id, store_id="exportada")
+    finally:
+        session.close()
+    expected = {product_id: [name, qty] for product_id, name, qty in rows if product_id != "E000"}
+    return expected
+
+
+def test_csv_export_streams_the_store_and_loads_back(client, exported_store, monkeypatch, tmp_path):
+    """GET /productos/exportar: the CSV streams in batches and core.load_inventory reads it back."""
+    monkeypatch.setattr(exportador, "TAMANO_LOTE", 5)
+    response = client.get("/productos/exportar", headers=_headers("exportada", "token-exportada"))
+    assert response.status_code == 200 and response.headers["content-type"].startswith("text/csv")
+    path = tmp_path / "inventory.csv"
+    path.write_bytes(response.content)
+    assert dict(load_inventory(str(path))) == exported_store
+
+
+def test_parquet_export_has_the_same_rows(client, exported_store, monkeypatch):
+    """GET /productos/exportar?formato=parquet: same rows as the CSV, in one Parquet file."""
+    pq = pytest.importorskip("pyarrow.parquet")
+    monkeypatch.setattr(exportador, "TAMANO_LOTE", 5)
+    response = client.get("/productos/exportar", params={"formato": "parquet"},
+                          headers=_headers("exportada", "token-exportada"))
+    assert response.status_code == 200
+    table = pq.read_table(io.BytesIO(response.content)).to_pydict()
+    assert {p: [n, q] for p, n, q in zip(table["product_id"], table["product_name"], table["quantity"])} == exported_store
+
+
+# --- test_listar_productos ---
+
+
+def test_fields_and_ids_project_the_listing(client):
+    """GET /productos: ?fields= selects only those columns and ?ids= fetches those products in one IN query."""
+    session = database.get_session()
+    try:
+        database.upsert_products(session, [("V001", "Vela", 3), ("V002", "Vinagre", 0), ("V003", "Vaso", 8)],
+                                 database.DEFAULT_STORE)
+    finally:
+        session.close()
+    selects = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        # "main.products" on SQLite: the listing uses the models.py table in schema "public"
+        if statement.lstrip().upper().startswith("SELECT") and re.search(r"FROM (\w+\.)?products\b", statement):
+            selects.append(statement)
+
+    event.listen(database.engine, "before_cursor_execute", record)
+    try:
+        response = client.get("/productos", params={"fields": "product_id, quantity", "ids": "V003,V001,V003"})
+    finally:
+        event.remove(database.engine, "before_cursor_execute", record)
+    assert response.status_code == 200
+    assert response.json() == [{"product_id": "V001", "quantity": 3}, {"product_id": "V003", "quantity": 8}]
+    assert len(selects) == 1
+    columns = selects[0].split("FROM")[0]
+    assert "quantity" in columns and "name" not in columns and " IN " in selects[0]
+
+    assert client.get("/productos", params={"fields": "product_id,precio"}).status_code == 400
+    too_many = ",".join(f"X{i}" for i in range(server.MAX_IDS_POR_CONSULTA + 1))
+    assert client.get("/productos", params={"ids": too_many}).status_code == 400
+
+
+# --- test_trazas ---
+
+
+def test_slow_requests_keep_their_sql_spans(client, monkeypatch):
+    """MiddlewareTrazas: requests over TRACE_SLOW_MS land in /debug/lento with their SQL spans."""
+    monkeypatch.setattr(trazas, "_lentas", deque(maxlen=10))
+    monkeypatch.setattr(trazas, "TRACE_SLOW_MS", 60_000)
+    assert client.get("/productos", params={"fields": "product_id"}).status_code == 200
+    assert trazas.peticiones_lentas() == []
+
+    monkeypatch.setattr(trazas, "TRACE_SLOW_MS", 0)
+    assert client.get("/productos", params={"fields": "product_id"}).status_code == 200
+    slow = client.get("/debug/lento", headers={"Authorization": "Bearer token-norte"}).json()["peticiones"]
+    request = next(r for r in slow if r["ruta"] == "/productos")
+    assert request["metodo"] == "GET" and request["estado"] == 200
+    sql = [s for s in request["spans"] if s["nombre"] == "sql"]
+    assert sql and "SELECT" in sql[0]["detalle"] and sql[0]["duracion_ms"] is not None
+
+
+def test_spans_beyond_the_preallocated_slots_are_counted():
+    """Traza: once its fixed slots are full, further spans are only counted as discarded."""
+    traza = trazas.Traza(max_spans=2)
+    for name in ("a", "b", "c"):
+        traza.cerrar(traza.abrir(name))
+    exported = traza.exportar(200, 0.01)
+    assert [s["nombre"] for s in exported["spans"]] == ["a", "b"]
+    assert exported["spans_descartados"] == 1
@@ -0,0 +1,114 @@
+# Single-flight tests for single_flight.py and ai_service.analizar_inventario — W06 Final Project Milestone
+
+import os
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+# The database module connects on import: point it at a throwaway SQLite file first
+os.environ["DB_URL"] = f"sqlite:///{tempfile.mkdtemp()}/test_single_flight.db"
+
+import ai_service
+import database
+from single_flight import SingleFlight
+
+CALLERS = 50
+
+
+def _run_concurrently(func, n=CALLERS):
+    """Start n threads together on func and return the list of results or exceptions."""
+    barrier = threading.Barrier(n)
+    results = [None] * n
+
+    def worker(i):
+        barrier.wait()
+        try:
+            results[i] = func()
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+# --- test_single_flight ---
+
+
+def test_single_flight_propagates_errors_and_releases_key():
+    """SingleFlight: every waiter gets the shared exception and the key is released afterwards."""
+    flight = SingleFlight()
+    calls = []
+
+    def failing():
+        calls.append(1)
+        time.sleep(0.3)
+        raise ValueError("upstream down")
+
+    results = _run_concurrently(lambda: flight.hacer("k", failing))
+    assert len(calls) == 1
+    assert all(isinstance(r, ValueError) for r in results)
+    assert flight.en_vuelo() == 0
+    assert flight.hacer("k", lambda: "again") == "again"
+
+
+def test_single_flight_waiter_timeout_does_not_cancel_shared_call():
+    """SingleFlight: a waiter that times out leaves; the shared call still completes."""
+    flight = SingleFlight()
+    started = threading.Event()
+
+    def slow():
+        started.set()
+        time.sleep(0.3)
+        return 42
+
+    leader = threading.Thread(target=lambda: flight.hacer("k", slow))
+    leader.start()
+    started.wait()
+    with pytest.raises(TimeoutError):
+        flight.hacer("k", slow, timeout=0.01)
+    leader.join()
+    assert flight.en_vuelo() == 0
+
+
+# --- test_analizar_inventario ---
+
+
+def test_analizar_inventario_coalesces_concurrent_callers(monkeypatch):
+    """analizar_inventario: 50 concurrent callers on the same inventory make exactly one model call."""
+    store = "single-flight"
+    session = database.get_session()
+    try:
+        # Mixed zero and low stock: the rules delegate this state to the model
+        filas = [(f"C{i}", f"Cero{i}", 0) for i in range(3)]
+        filas += [(f"B{i}", f"Bajo{i}", 2) for i in range(3)]
+        filas += [(f"A{i}", f"Alto{i}", 80) for i in range(4)]
+        database.upsert_products(session, filas, store)
+    finally:
+        session.close()
+
+    calls = []
+
+    class FakeModel:
+        def __init__(self, name):
+            self.name = name
+
+        def generate_content(self, prompt):
+            calls.append(self.name)
+            time.sleep(0.5)
+            return SimpleNamespace(text="Repón Cero0 primero.")
+
+    monkeypatch.setenv("GEMINI_API_KEY", "test")
+    monkeypatch.setattr(ai_service, "genai", SimpleNamespace(configure=lambda **_: None, GenerativeModel=FakeModel))
+
+    results = _run_concurrently(lambda: ai_service.analizar_inventario(store))
+
+    assert len(calls) == 1
+    assert all(r == {"consejo": "Repón Cero0 primero.", "fuente": "ia", "regla": "complejo"} for r in results)
+    assert ai_service._analisis_en_vuelo.en_vuelo() == 0
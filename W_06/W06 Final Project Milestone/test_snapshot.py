@@ -0,0 +1,81 @@
+# Binary snapshot tests for snapshot.py — W06 Final Project Milestone
+
+import os
+
+import pytest
+from core import load_inventory, save_inventory
+from journal import InventoryJournal
+from snapshot import SnapshotInventory, build_snapshot, open_snapshot
+
+
+def _csv(tmp_path, inventory):
+    path = tmp_path / "inventory.csv"
+    save_inventory(str(path), inventory)
+    return str(path)
+
+
+# --- test_open_snapshot ---
+
+
+def test_snapshot_matches_csv_and_overlays_changes(tmp_path):
+    """SnapshotInventory: same items and order as the CSV; changes stay in memory in dict order."""
+    rows = {f"P{i:03d}": [f"Producto ñ {i}", i % 4] for i in range(50, 0, -1)}
+    path = _csv(tmp_path, rows)
+    assert build_snapshot(path)
+    snap = open_snapshot(path)
+    assert isinstance(snap, SnapshotInventory)
+    assert list(snap.rows()) == list(load_inventory(path).rows())
+    assert snap["P007"] == ["Producto ñ 7", 3] and "P999" not in snap
+
+    snap["P007"] = ["Renombrado", 9]
+    del snap["P010"]
+    snap["P100"] = ["Nuevo", 1]
+    snap["P010"] = ["Vuelve", 2]
+    rows["P007"] = ["Renombrado", 9]
+    del rows["P010"]
+    rows["P100"] = ["Nuevo", 1]
+    rows["P010"] = ["Vuelve", 2]
+    assert list(snap.rows()) == [(k, *v) for k, v in rows.items()]
+    assert len(snap) == len(rows)
+    assert snap.zero_stock() == {k for k, (_, q) in rows.items() if q == 0}
+    with pytest.raises(KeyError):
+        del snap["P999"]
+
+    # Once built, the zero-stock index is the same set, updated by every write
+    zero = snap.zero_stock()
+    snap["P004"] = ["Producto ñ 4", 5]
+    snap["P100"] = ["Nuevo", 0]
+    del snap["P008"]
+    assert snap.zero_stock() is zero
+    assert zero == {k for k, (_, q) in snap.items() if q == 0}
+    assert "P004" not in zero and "P100" in zero and "P008" not in zero
+    snap.close()
+
+
+def test_snapshot_is_ignored_when_csv_changes(tmp_path):
+    """open_snapshot: returns None once the CSV no longer matches the recorded size and mtime."""
+    path = _csv(tmp_path, {"P001": ["Arroz", 50]})
+    build_snapshot(path)
+    assert open_snapshot(path) is not None
+    save_inventory(path, {"P001": ["Arroz", 50], "P002": ["Leche", 4]})
+    assert open_snapshot(path) is None
+    assert open_snapshot(str(tmp_path / "missing.csv")) is None
+
+
+# --- test_journal_snapshot ---
+
+
+def test_journal_loads_snapshot_and_replays_journal(tmp_path):
+    """InventoryJournal: a stale snapshot is rebuilt, then used on the next load with the journal on top."""
+    path = _csv(tmp_path, {"P001": ["Arroz", 50], "P002": ["Leche", 0]})
+    journal = InventoryJournal(path)
+    assert not isinstance(journal.load(), SnapshotInventory)
+    journal.record_set("P002", "Leche", 8)
+    journal.close()
+    assert os.path.exists(path + ".snap")
+
+    journal = InventoryJournal(path)
+    inventory = journal.load()
+    journal.close()
+    assert isinstance(inventory, SnapshotInventory)
+    assert dict(inventory) == {"P001": ["Arroz", 50], "P002": ["Leche", 8]}
@@ -0,0 +1,227 @@
+"""
+Trazas por petición con registro de peticiones lentas.
+Cada petición toma una Traza de un pool preasignado (listas de tamaño fijo para
+nombre, detalle, inicio y duración de cada span) y la deja en la variable de
+contexto traza_actual, que también ven los hilos del threadpool. Registrar un span
+solo escribe en esas listas; si la petición supera TRACE_SLOW_MS, su cascada de
+spans se copia al anillo que expone /debug/lento.
+"""
+
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from functools import wraps
+
+from sqlalchemy import event
+
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "500"))
+TRACE_RING_SIZE = int(os.getenv("TRACE_RING_SIZE", "100"))
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "256"))
+TRACE_POOL_SIZE = int(os.getenv("TRACE_POOL_SIZE", "64"))
+
+traza_actual: ContextVar["Traza | None"] = ContextVar("traza_actual", default=None)
+
+_lentas: deque = deque(maxlen=TRACE_RING_SIZE)
+_libres: list["Traza"] = []
+_lock = threading.Lock()
+
+
+class Traza:
+    """Spans de una petición en listas paralelas preasignadas de TRACE_MAX_SPANS posiciones."""
+
+    __slots__ = ("metodo", "ruta", "inicio", "nombres", "detalles", "inicios", "duraciones",
+                 "_indices", "n", "descartados")
+
+    def __init__(self, max_spans: int = TRACE_MAX_SPANS):
+        self.nombres = [None] * max_spans
+        self.detalles = [None] * max_spans
+        self.inicios = [0.0] * max_spans
+        self.duraciones = [0.0] * max_spans
+        self.metodo = self.ruta = None
+        self.inicio = 0.0
+        self._indices = itertools.count()
+        self.n = 0
+        self.descartados = 0
+
+    def abrir(self, nombre: str, detalle=None) -> int:
+        """Registra el inicio de un span y devuelve su índice (-1 si no hay lugar)."""
+        # next() sobre itertools.count es atómico: los hilos de una misma petición no se pisan
+        i = next(self._indices)
+        if i >= len(self.nombres):
+            self.descartados += 1
+            return -1
+        self.nombres[i] = nombre
+        self.detalles[i] = detalle
+        self.inicios[i] = time.perf_counter()
+        self.duraciones[i] = -1.0
+        if i >= self.n:
+            self.n = i + 1
+        return i
+
+    def cerrar(self, i: int):
+        if i >= 0:
+            self.duraciones[i] = time.perf_counter() - self.inicios[i]
+
+    def exportar(self, estado: int, duracion: float) -> dict:
+        """Copia la cascada de spans a un dict (solo para las peticiones lentas)."""
+        spans = []
+        for i in range(self.n):
+            detalle = self.detalles[i]
+            spans.append({
+                "nombre": self.nombres[i],
+                "detalle": None if detalle is None else str(detalle)[:300],
+                "inicio_ms": round((self.inicios[i] - self.inicio) * 1000, 3),
+                "duracion_ms": round(self.duraciones[i] * 1000, 3) if self.duraciones[i] >= 0 else None,
+            })
+        return {
+            "metodo": self.metodo,
+            "ruta": self.ruta,
+            "estado": estado,
+            "fecha": datetime.now(timezone.utc).isoformat(),
+            "duracion_ms": round(duracion * 1000, 3),
+            "spans": spans,
+            "spans_descartados": self.descartados,
+        }
+
+
+def iniciar(metodo: str, ruta: str) -> Traza:
+    """Toma una Traza del pool para la petición (o crea una si el pool está vacío)."""
+    with _lock:
+        traza = _libres.pop() if _libres else None
+    if traza is None:
+        traza = Traza()
+    traza.metodo = metodo
+    traza.ruta = ruta
+    traza.n = 0
+    traza.descartados = 0
+    traza._indices = itertools.count()
+    traza.inicio = time.perf_counter()
+    return traza
+
+
+def terminar(traza: Traza, estado: int, reciclar: bool = True) -> float:
+    """
+    Cierra la traza y la guarda en el anillo si fue lenta. Con reciclar vuelve al pool;
+    no debe reciclarse si algún hilo aún puede escribir en ella. Devuelve segundos.
+    """
+    duracion = time.perf_counter() - traza.inicio
+    if duracion * 1000 >= TRACE_SLOW_MS:
+        _lentas.append(traza.exportar(estado, duracion))
+    if not reciclar:
+        return duracion
+    # Se sueltan las referencias (sentencias SQL, modelos) antes de volver al pool
+    for i in range(traza.n):
+        traza.detalles[i] = None
+    with _lock:
+        if len(_libres) < TRACE_POOL_SIZE:
+            _libres.append(traza)
+    return duracion
+
+
+def peticiones_lentas() -> list[dict]:
+    """Peticiones lentas registradas, de la más reciente a la más vieja."""
+    return list(reversed(_lentas))
+
+
+class span:
+    """Context manager que registra un span en la traza de la petición actual (si hay una)."""
+
+    __slots__ = ("_traza", "_i", "nombre", "detalle")
+
+    def __init__(self, nombre: str, detalle=None):
+        self.nombre = nombre
+        self.detalle = detalle
+
+    def __enter__(self):
+        self._traza = traza_actual.get()
+        self._i = self._traza.abrir(self.nombre, self.detalle) if self._traza is not None else -1
+        return self
+
+    def __exit__(self, *exc):
+        if self._traza is not None:
+            self._traza.cerrar(self._i)
+        return False
+
+
+def trazar(nombre: str):
+    """Decorador: registra cada llamada a la función como un span."""
+    def decorador(func):
+        @wraps(func)
+        def envoltura(*args, **kwargs):
+            traza = traza_actual.get()
+            if traza is None:
+                return func(*args, **kwargs)
+            i = traza.abrir(nombre)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                traza.cerrar(i)
+        return envoltura
+    return decorador
+
+
+class MiddlewareTrazas:
+    """
+    Middleware ASGI que abre una traza por petición HTTP. La traza termina al enviarse el
+    último bloque del cuerpo, así las respuestas en streaming quedan cubiertas completas.
+    resolver_ruta(scope) da la plantilla de la ruta para agrupar (ej. /productos/{id}).
+    """
+
+    def __init__(self, app, resolver_ruta=None):
+        self.app = app
+        self.resolver_ruta = resolver_ruta
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        ruta = self.resolver_ruta(scope) if self.resolver_ruta else None
+        traza = iniciar(scope["method"], ruta or scope["path"])
+        estado = 500
+        completa = False
+
+        async def enviar(mensaje):
+            nonlocal estado, completa
+            if mensaje["type"] == "http.response.start":
+                estado = mensaje["status"]
+            elif mensaje["type"] == "http.response.body" and not mensaje.get("more_body", False):
+                completa = True
+            await send(mensaje)
+
+        token = traza_actual.set(traza)
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            traza_actual.reset(token)
+            # Si el cliente cortó un streaming, el generador aún puede escribir: no se recicla
+            terminar(traza, estado, reciclar=completa)
+
+
+def instrumentar_engine(motor):
+    """
+    Registra un span "sql" (con la sentencia como detalle) por cada ejecución del engine.
+    Instalar después de los eventos que puedan cancelar la sentencia antes de ejecutarla.
+    """
+    @event.listens_for(motor, "before_cursor_execute")
+    def _antes(conn, cursor, statement, parameters, context, executemany):
+        traza = traza_actual.get()
+        if traza is not None:
+            conn.info.setdefault("spans_sql", []).append((traza, traza.abrir("sql", statement)))
+
+    @event.listens_for(motor, "after_cursor_execute")
+    def _despues(conn, cursor, statement, parameters, context, executemany):
+        pendientes = conn.info.get("spans_sql")
+        if pendientes:
+            traza, i = pendientes.pop()
+            traza.cerrar(i)
+
+    # insert=True: corre antes de los manejadores que traducen el error lanzando otro
+    @event.listens_for(motor, "handle_error", insert=True)
+    def _error(contexto):
+        pendientes = contexto.connection.info.get("spans_sql") if contexto.connection is not None else None
+        if pendientes:
+            traza, i = pendientes.pop()
+            traza.cerrar(i)
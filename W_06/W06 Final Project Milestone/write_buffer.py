@@ -0,0 +1,89 @@
+"""
+Buffer write-behind para ajustes de stock de alta frecuencia.
+Las ráfagas del punto de venta envían muchos decrementos pequeños sobre pocos
+productos; en lugar de una transacción por ajuste, el buffer los acumula durante
+una ventana corta (o hasta N operaciones) y los escribe en un solo lote con
+database.apply_stock_deltas. Cada llamador recibe su respuesta solo después
+de que el lote hizo commit.
+"""
+
+import threading
+import time
+from concurrent.futures import Future
+
+from database import DEFAULT_STORE, apply_stock_deltas, get_session
+
+
+class StockWriteBuffer:
+    """Acumula ajustes (store_id, id_interno, delta) y los vacía en lotes desde un hilo propio."""
+
+    def __init__(self, ventana_ms: float = 20, max_ops: int = 256, session_factory=get_session):
+        self._ventana = ventana_ms / 1000
+        self._max_ops = max_ops
+        self._session_factory = session_factory
+        self._pendientes: list[tuple[str, int, int, Future]] = []
+        self._cond = threading.Condition()
+        self._cerrado = False
+        self._hilo = threading.Thread(target=self._bucle, name="stock-write-buffer", daemon=True)
+        self._hilo.start()
+
+    def enviar(self, id_interno: int, delta: int, store_id: str = DEFAULT_STORE) -> Future:
+        """
+        Encola un ajuste y devuelve un Future que se resuelve tras el commit con
+        la nueva cantidad (int), None si el producto no existe, o ValueError.
+        """
+        futuro: Future = Future()
+        with self._cond:
+            if self._cerrado:
+                raise RuntimeError("El buffer de escritura está cerrado")
+            self._pendientes.append((store_id, id_interno, delta, futuro))
+            # Despertamos al hilo al abrir una ventana nueva o al llenar el lote
+            if len(self._pendientes) == 1 or len(self._pendientes) >= self._max_ops:
+                self._cond.notify()
+        return futuro
+
+    def ajustar(self, id_interno: int, delta: int, store_id: str = DEFAULT_STORE,
+                timeout: float | None = None):
+        """Versión bloqueante de enviar(): espera el commit y devuelve la nueva cantidad."""
+        return self.enviar(id_interno, delta, store_id).result(timeout)
+
+    def cerrar(self):
+        """Vacía lo pendiente y detiene el hilo (llamar al apagar el servidor)."""
+        with self._cond:
+            self._cerrado = True
+            self._cond.notify()
+        self._hilo.join()
+
+    def _bucle(self):
+        while True:
+            with self._cond:
+                while not self._pendientes and not self._cerrado:
+                    self._cond.wait()
+                if not self._pendientes:
+                    return
+                limite = time.monotonic() + self._ventana
+                while len(self._pendientes) < self._max_ops and not self._cerrado:
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        break
+                    self._cond.wait(restante)
+                lote = self._pendientes[:self._max_ops]
+                del self._pendientes[:self._max_ops]
+            self._vaciar(lote)
+
+    def _vaciar(self, lote):
+        session = self._session_factory()
+        try:
+            resultados = apply_stock_deltas(session, [(s, i, d) for s, i, d, _ in lote])
+        except Exception as e:
+            session.rollback()
+            for *_, futuro in lote:
+                futuro.set_exception(e)
+            return
+        finally:
+            session.close()
+        for (*_, futuro), resultado in zip(lote, resultados):
+            if isinstance(resultado, Exception):
+                futuro.set_exception(resultado)
+            else:
+                futuro.set_result(resultado)